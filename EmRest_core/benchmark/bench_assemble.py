@@ -0,0 +1,141 @@
+"""
+Time to assemble the requests of test cases: walking the factor tree of each parameter for every case, as WeightAlgorithm.assemble did,
+vs. filling the request template compiled once per operation. Both give the same requests, which is checked on the benchmarked cases.
+
+    python benchmark/bench_assemble.py --spec_dir ../api-suts/specifications/v3 --cases 200
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import logging
+import random
+import time
+from typing import Any
+
+import click
+import pandas as pd
+
+from src.equivalence import Binding
+from src.factor import ArrayFactor, ObjectFactor
+from src.manager import Manager
+from src.rest import RestOp, PathParam, QueryParam, HeaderParam, BodyParam
+
+_logger = logging.getLogger(__name__)
+
+
+def walk_assemble(op: RestOp, values: dict[str, Any], content_type=None):
+    """the request of a case built by walking the factor trees, the previous WeightAlgorithm.assemble"""
+    def get_value_by_factor(_f):
+        if isinstance(_f, ArrayFactor):
+            if _f.global_name in values.keys():
+                return values[_f.global_name]
+            item = get_value_by_factor(_f.item)
+            return [item] if item is not None else []
+        elif isinstance(_f, ObjectFactor):
+            if _f.global_name in values.keys():
+                return values[_f.global_name]
+            obj = {}
+            for fp in _f.properties:
+                val = get_value_by_factor(fp)
+                if val is not None:
+                    obj[fp.name] = val
+            return obj
+        return values[_f.global_name] if values.get(_f.global_name, None) not in ("__null__", None) else None
+
+    path = ""
+    for e in op.path.elements:
+        path += "/"
+        for t in e.tokens:
+            if not t.is_parameter:
+                path += t.name
+                continue
+            p = next((p for p in op.parameters if isinstance(p, PathParam) and p.factor.name == t.name), None)
+            value = values.get(p.factor.global_name, "__null__")
+            if value is None or not str(value).strip() or value == "__null__":
+                value = "1"
+            path += str(value)
+    if op.path.end_with_slash:
+        path += "/"
+    uri = f"{op._host.strip('/')}/{path.lstrip('/')}"
+
+    query_pairs, header_pairs, body = {}, {}, None
+    for p in op.parameters:
+        value = get_value_by_factor(p.factor)
+        if value is None:
+            continue
+        if isinstance(p, QueryParam):
+            query_pairs[p.factor.name] = value
+        elif isinstance(p, HeaderParam):
+            header_pairs[p.factor.name] = value
+        elif isinstance(p, BodyParam):
+            body = value
+            if content_type is None:
+                content_type = p.content_type
+    return uri, query_pairs, header_pairs, content_type, body
+
+
+def sample_values(manager: Manager, op: RestOp, num: int) -> list[dict[str, Any]]:
+    """values of the leaf factors of num cases sampled from the equivalences of op, bindings are replaced by ids"""
+    equiv_manager = manager.equiv_manager[op.id]
+    equiv_manager.initialize(manager)
+    cases = []
+    for _ in range(num):
+        case = equiv_manager.sample()
+        cases.append({g: random.randint(1, 100) if isinstance(e, Binding) else e.generate() for g, e in case.items()})
+    return cases
+
+
+@click.command()
+@click.option('--spec_dir', type=str, required=True, help='Directory of the specifications')
+@click.option('--cases', type=int, default=200, help='Number of test cases per operation')
+@click.option('--seed', type=int, default=0, help='Random seed')
+@click.option('--output', type=str, required=False, help='Path to the CSV file of the results')
+def command(spec_dir: str, cases: int, seed: int, output: str):
+    logging.basicConfig(level=logging.WARNING)
+    random.seed(seed)
+
+    rows = []
+    mismatches = 0
+    for spec in sorted(os.listdir(spec_dir)):
+        try:
+            manager = Manager.from_spec(os.path.join(spec_dir, spec))
+        except Exception as e:
+            _logger.warning(f"Skip {spec}: {e}")
+            continue
+        walk_time = template_time = 0.0
+        num_cases = 0
+        for op in manager.unique:
+            try:
+                op.template
+            except ValueError as e:
+                _logger.warning(f"Skip {op.id}: {e}")
+                continue
+            values = sample_values(manager, op, cases)
+            num_cases += len(values)
+
+            start = time.perf_counter()
+            expected = [walk_assemble(op, v) for v in values]
+            walk_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            filled = [op.template.fill(v) for v in values]
+            template_time += time.perf_counter() - start
+            mismatches += sum(1 for a, b in zip(expected, filled) if a != b)
+
+        rows.append({"spec": spec, "operations": len(manager.unique), "cases": num_cases,
+                     "walk_us": walk_time / max(num_cases, 1) * 1e6, "template_us": template_time / max(num_cases, 1) * 1e6})
+
+    df = pd.DataFrame(rows)
+    df["speedup"] = df["walk_us"] / df["template_us"]
+    print(df.to_string(index=False))
+    total_walk = (df["walk_us"] * df["cases"]).sum()
+    total_template = (df["template_us"] * df["cases"]).sum()
+    print(f"\nOverall: walk {total_walk / 1e6:.3f}s, template {total_template / 1e6:.3f}s, speedup {total_walk / total_template:.1f}x, "
+          f"{mismatches} different requests")
+    if output is not None:
+        df.to_csv(output, index=False)
+
+
+if __name__ == '__main__':
+    command()
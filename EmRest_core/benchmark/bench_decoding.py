@@ -0,0 +1,63 @@
+"""
+Time spent on decoding and parsing the output of PICT per covering array:
+chardet detection + text parsing (previous pipeline) vs. parsing the raw bytes line by line.
+
+    python benchmark/bench_decoding.py --factors 30 --rows 60
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import random
+import timeit
+
+import chardet
+import click
+
+from src.generator import PICT
+
+
+def fake_output(num_factors: int, num_rows: int, domain: int) -> bytes:
+    lines = ["\t".join(f"P{i}" for i in range(num_factors))]
+    for _ in range(num_rows):
+        lines.append("\t".join(str(random.randrange(domain)) for _ in range(num_factors)))
+    lines.append("")
+    lines.append(f"Used seed: {random.randint(1, 1000)}")
+    return "\n".join(lines).encode("ascii")
+
+
+def detect_and_parse(name_mappings, value_mappings, stdout: bytes, stderr: bytes):
+    encoding = chardet.detect(stdout)["encoding"]
+    stdout = stdout.decode(encoding if encoding is not None else "utf-8")
+    encoding = chardet.detect(stderr)["encoding"]
+    stderr = stderr.decode(encoding if encoding is not None else "utf-8")
+    return PICT._parse_output(name_mappings, value_mappings, stdout=stdout, stderr=stderr)
+
+
+def parse_bytes(name_mappings, value_mappings, stdout: bytes, stderr: bytes):
+    return list(PICT._iter_rows(name_mappings, value_mappings, stdout.splitlines()))
+
+
+@click.command()
+@click.option('--factors', type=int, default=30, help='Number of factors')
+@click.option('--rows', type=int, default=60, help='Number of rows of the covering array')
+@click.option('--domain', type=int, default=20, help='Domain size of each factor')
+@click.option('--number', type=int, default=200, help='Number of calls to time')
+def command(factors: int, rows: int, domain: int, number: int):
+    name_mappings = {f"P{i}": f"factor_{i}" for i in range(factors)}
+    value_mappings = {f"factor_{i}": {v: f"E: Equivalence ({v})" for v in range(domain)} for i in range(factors)}
+    stdout = fake_output(factors, rows, domain)
+    stderr = b""
+
+    assert detect_and_parse(name_mappings, value_mappings, stdout, stderr) == parse_bytes(name_mappings, value_mappings, stdout, stderr)
+
+    before = timeit.timeit(lambda: detect_and_parse(name_mappings, value_mappings, stdout, stderr), number=number) / number
+    after = timeit.timeit(lambda: parse_bytes(name_mappings, value_mappings, stdout, stderr), number=number) / number
+    print(f"output: {len(stdout)} bytes, {rows} rows x {factors} factors")
+    print(f"chardet + text parsing: {before * 1000:.3f} ms/call")
+    print(f"bytes parsing:          {after * 1000:.3f} ms/call")
+    print(f"saved:                  {(before - after) * 1000:.3f} ms/call ({before / after:.1f}x)")
+
+
+if __name__ == '__main__':
+    command()
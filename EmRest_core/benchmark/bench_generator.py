@@ -0,0 +1,84 @@
+"""
+Compare the in-process IPOG generator with the PICT tool on the operations of the given specifications.
+
+    python benchmark/bench_generator.py --spec_dir ../api-suts/specifications/v3 --pict ./lib/pict-linux
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import logging
+import tempfile
+import time
+
+import click
+import pandas as pd
+
+from src.generator import Generator, PICT, IPOG
+from src.manager import Manager
+
+_logger = logging.getLogger(__name__)
+
+
+def collect_domains(spec_file: str) -> list[tuple[str, list[str], list[list[int]]]]:
+    """factors and equivalence domains of each operation, the same as the ones sampled by EquivalenceManager"""
+    manager = Manager.from_spec(spec_file)
+    inputs = []
+    for op in manager.unique:
+        equiv_manager = manager.equiv_manager[op.id]
+        equiv_manager.initialize(manager)
+        factors = list(equiv_manager.initialized_equivalences.keys())
+        domains = [[equiv_manager.table.code(e) for e, _ in equiv_manager.initialized_equivalences[f][:20]] for f in factors]
+        inputs.append((op.id, factors, domains))
+    return inputs
+
+
+def measure(generator: Generator, op_id: str, factors: list[str], domains: list[list[int]], strength: int, repeat: int) -> tuple[float, int]:
+    size = 0
+    start = time.perf_counter()
+    for _ in range(repeat):
+        size = len(generator.handle(op_id=op_id, factors=factors, domains=domains, forbidden_tuples=[], strength=strength))
+    return (time.perf_counter() - start) / repeat, size
+
+
+@click.command()
+@click.option('--spec_dir', type=str, required=True, help='Directory of the specifications')
+@click.option('--pict', type=str, required=True, help='Path to the PICT tool')
+@click.option('--strength', type=int, default=2, help='Strength of covering arrays')
+@click.option('--repeat', type=int, default=3, help='Number of generations per operation')
+@click.option('--output', type=str, required=False, help='Path to the CSV file of the results')
+def command(spec_dir: str, pict: str, strength: int, repeat: int, output: str):
+    logging.basicConfig(level=logging.WARNING)
+    tmp = tempfile.mkdtemp()
+    pict_generator = PICT("bench", tmp, pict, strength)
+    ipog_generator = IPOG(strength)
+
+    rows = []
+    for spec in sorted(os.listdir(spec_dir)):
+        try:
+            inputs = collect_domains(os.path.join(spec_dir, spec))
+        except Exception as e:
+            _logger.warning(f"Skip {spec}: {e}")
+            continue
+        for op_id, factors, domains in inputs:
+            pict_time, pict_size = measure(pict_generator, op_id, factors, domains, strength, repeat)
+            ipog_time, ipog_size = measure(ipog_generator, op_id, factors, domains, strength, repeat)
+            rows.append({
+                "spec": spec, "op": op_id, "factors": len(factors),
+                "pict_time": pict_time, "pict_size": pict_size,
+                "ipog_time": ipog_time, "ipog_size": ipog_size,
+            })
+
+    df = pd.DataFrame(rows)
+    summary = df.groupby("spec")[["factors", "pict_time", "ipog_time", "pict_size", "ipog_size"]].mean()
+    summary["speedup"] = summary["pict_time"] / summary["ipog_time"]
+    print(summary.to_string())
+    print(f"\nOverall: PICT {df['pict_time'].sum():.3f}s, IPOG {df['ipog_time'].sum():.3f}s, "
+          f"speedup {df['pict_time'].sum() / df['ipog_time'].sum():.1f}x, "
+          f"size ratio {df['ipog_size'].sum() / max(df['pict_size'].sum(), 1):.2f}")
+    if output is not None:
+        df.to_csv(output, index=False)
+
+
+if __name__ == '__main__':
+    command()
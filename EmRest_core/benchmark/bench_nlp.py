@@ -0,0 +1,62 @@
+"""
+Start-up time and per-message time of the NLP analysis of error messages: full vs. fast pipeline mode.
+The parse cache is disabled so that every message is parsed.
+
+    python benchmark/bench_nlp.py --messages 2000
+"""
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import random
+import time
+
+import click
+
+from src import nlp
+
+_WORDS = ["name", "must", "not", "be", "null", "invalid", "value", "of", "the", "user", "id", "is", "required",
+          "size", "should", "between", "and", "field", "missing", "format", "date", "expected", "string"]
+
+
+def fake_messages(num: int) -> list[str]:
+    return [" ".join(random.choice(_WORDS) for _ in range(random.randint(3, 12))) for _ in range(num)]
+
+
+def run(mode: str, messages: list[str], names: list[str]) -> tuple[float, float, float]:
+    nlp.configure(cache_mb=0, mode=mode)
+    start = time.perf_counter()
+    nlp.missing_subjects(messages)
+    subjects = time.perf_counter() - start
+    start = time.perf_counter()
+    for n in names:
+        nlp.lemmatize(n)
+    lemmas = time.perf_counter() - start
+    start = time.perf_counter()
+    nlp.remove_values(messages, {"name": "user", "id": "12"})
+    matching = time.perf_counter() - start
+    return subjects, lemmas, matching
+
+
+@click.command()
+@click.option('--messages', type=int, default=2000, help='Number of error messages')
+@click.option('--names', type=int, default=500, help='Number of parameter names to lemmatize')
+@click.option('--seed', type=int, default=0, help='Random seed')
+def command(messages: int, names: int, seed: int):
+    random.seed(seed)
+    texts = fake_messages(messages)
+    words = [random.choice(_WORDS) + random.choice(_WORDS).capitalize() for _ in range(names)]
+
+    start = time.perf_counter()
+    nlp.get_nlp()
+    print(f"model loading: {(time.perf_counter() - start) * 1000:.1f} ms, pipes: {nlp.get_nlp().pipe_names}")
+
+    for mode in ("full", "fast"):
+        subjects, lemmas, matching = run(mode, texts, words)
+        print(f"{mode}: subjects {subjects / messages * 1e6:.1f} us/message, "
+              f"lemmas {lemmas / names * 1e6:.1f} us/name, "
+              f"value matching {matching / messages * 1e6:.1f} us/message")
+
+
+if __name__ == '__main__':
+    command()
@@ -8,15 +8,19 @@ import time
 from typing import Optional, Any, Callable
 import click
 from functools import lru_cache, wraps
+from requests.exceptions import ConnectionError
 
 from src.log import setup_logger
 from src.equivalence import Binding, AbstractEquivalence
 from src.executor import RestRequest, Auth
-from src.factor import ArrayFactor, ObjectFactor
-from src.generator import PICT
+from src.generator import PICT, PICTPool, IPOG, CachedGenerator
 from src.manager import Manager
 from src.monitor import Statistics
-from src.rest import RestOp, QueryParam, HeaderParam, BodyParam, ContentType
+from src.reporter import StreamReporter
+from src.snapshot import Snapshot
+from src.nlp import configure as configure_nlp
+from src.similarity import configure as configure_similarity
+from src.rest import RestOp, ContentType
 
 _logger = logging.getLogger(__name__)
 
@@ -34,6 +38,13 @@ class GlobalTimer:
     def set_timeout(self, timeout: float):
         self.budget = timeout
 
+    def used(self) -> float:
+        return time.time() - self.elapsed
+
+    def resume(self, used: float):
+        """continue a run that has already used some of the budget"""
+        self.elapsed = time.time() - used
+
     def __call__(self, func):
         """as decorator"""
 
@@ -69,26 +80,28 @@ class CaseManager:
             assignments=self.assignments,
             status_codes=self.status_codes,
             responses=self.responses,
-            with_error=with_error
+            with_error=with_error,
+            table=manager.equiv_manager[op.id].table
         )
 
         manager.add_resources(op.path.computed_to_string, self.response_20X)
 
+    def add_case(self, equivalences: dict, assignments: dict, status_code: int, response: Any):
+        self.equivalences.append(equivalences)
+        self.assignments.append(assignments)
+        self.status_codes.append(status_code)
+        self.responses.append(response)
+
+        if status_code // 100 == 2:
+            if str(response).strip() == '':
+                self.response_20X.append(dict(assignments))
+            else:
+                self.response_20X.append(response)
+
     def __call__(self, func):
         @wraps(func)
         def wrapper(*args, **kwargs):
-            equivalences, assignments, status_code, response = func(*args, **kwargs)
-
-            self.equivalences.append(equivalences)
-            self.assignments.append(assignments)
-            self.status_codes.append(status_code)
-            self.responses.append(response)
-
-            if status_code // 100 == 2:
-                if str(response).strip() == '':
-                    self.response_20X.append(dict(assignments))
-                else:
-                    self.response_20X.append(response)
+            self.add_case(*func(*args, **kwargs))
 
         return wrapper
 
@@ -103,14 +116,47 @@ class WeightAlgorithm:
                  manager: Manager,
                  pict_path: str,
                  output_dir: str,
-                 auth: Auth = None):
+                 auth: Auth = None,
+                 pool_size: int = 10,
+                 max_retries: int = 2,
+                 concurrency: int = 1,
+                 generator: str = "pict",
+                 ca_cache_size: int = 128,
+                 pict_workers: int = 2,
+                 window_retention: int = 0,
+                 spill_windows: bool = False,
+                 checkpoint_every: int = 50,
+                 snapshot_every: float = 600):
         self._manager = manager
-        self._manager.equiv_generator = PICT(exp_name, output_dir, pict_path, 1)
-        self._executor = RestRequest(auth)
-        self._statistics = Statistics([op.id for op in self._manager.unique])
-
+        if generator == "ipog":
+            self._manager.equiv_generator = IPOG(1)
+        elif generator == "pict_pool":
+            self._manager.equiv_generator = PICTPool(exp_name, output_dir, pict_path, 1, workers=pict_workers)
+        else:
+            self._manager.equiv_generator = PICT(exp_name, output_dir, pict_path, 1)
+        if ca_cache_size > 0:
+            self._manager.equiv_generator = CachedGenerator(self._manager.equiv_generator, ca_cache_size)
+        # number of requests of one covering array in flight at the same time, 1 means sequential execution
+        self._concurrency = max(1, concurrency)
+        self._executor = RestRequest(auth, pool_size=max(pool_size, self._concurrency), max_retries=max_retries)
         self._output: str = os.path.join(output_dir, exp_name)
 
+        # windows beyond the retention are only kept in the spilled files, if any
+        self._statistics = Statistics([op.id for op in self._manager.unique],
+                                      window_retention=window_retention if window_retention > 0 else None,
+                                      spill_dir=os.path.join(self._output, 'data', 'windows') if spill_windows else None)
+        # results of each batch are appended to data/batches.jsonl as the run proceeds
+        self._reporter = StreamReporter(os.path.join(self._output, 'data'), checkpoint_every=checkpoint_every)
+
+        # the state of the run is saved every snapshot_every seconds to be resumed with --resume, 0 disables snapshots
+        self._snapshot_every = snapshot_every
+        self._snapshot_file = os.path.join(self._output, Snapshot.FILE)
+        self._last_snapshot = time.time()
+        self._resumed = False
+        # statistics of the connection pools and of the covering array cache, set at the end of main
+        self.transport_stats: Optional[dict[str, dict[str, int]]] = None
+        self.generator_stats: Optional[dict[str, int]] = None
+
     def select_operation(self) -> tuple[RestOp, Callable]:
         def select_buggy_operation():
             op_list = list(self._manager.unique)
@@ -138,78 +184,45 @@ class WeightAlgorithm:
         return tokens
 
     def select_equivalence(self, op: RestOp, strength: int = None) -> list[dict[str, AbstractEquivalence]]:
-        constraints = self._statistics.error_monitors[op.id].get_forbidden_tuples(0.7)
+        # maintained incrementally by the monitor, not copied: the list is replaced when the forbidden tuples change
+        _, constraints = self._statistics.error_monitors[op.id].get_constraints(0.7)
         cases = self._manager.sample_equivalences(op.id, constraints, strength)
+        # the next covering array of this operation often has the same constraints, generate it while the cases are executed
+        if self._manager.equiv_generator.supports_prefetch:
+            self._manager.prefetch_equivalences(op.id, constraints, strength)
         return cases
 
-    def generate_values(self, equivalences: dict[str, AbstractEquivalence], history_values: dict[str, dict[tuple, Any]]) -> dict[str, Any]:
-        bindings = [eq for eq in equivalences.values() if isinstance(eq, Binding)]
-        to_retrieve = []
-        for eq in bindings:
-            if eq.resource_node in history_values.keys() and eq.field in history_values[eq.resource_node].keys():
-                continue
-            else:
-                to_retrieve.append(eq)
-
-        if len(to_retrieve) > 0:
-            results = self._manager.retrieve_bound_value(to_retrieve)
-            for node, node_d in results.items():
-                if node not in history_values.keys():
-                    history_values[node] = dict()
-                for field, value in node_d.items():
-                    history_values[node][field] = value
+    def sample_bound_values(self, cases: list[dict[str, AbstractEquivalence]], history_values: dict[str, dict[tuple, Any]]):
+        """retrieve the values of all the bindings of a covering array in one pass, the values are shared by its rows"""
+        self._manager.retrieve_bound_value((eq for c in cases if c is not None for eq in c.values() if isinstance(eq, Binding)), history_values)
 
+    def generate_values(self, equivalences: dict[str, AbstractEquivalence], history_values: dict[str, dict[tuple, Any]]) -> dict[str, Any]:
         values = dict()
+        missing = []
         for op, eq in equivalences.items():
             if isinstance(eq, Binding):
-                values[op] = history_values[eq.resource_node][eq.field]
-                # _logger.debug(f"Retrieved {eq} for {op}: {values[op]}")
+                node_values = history_values.get(eq.resource_node)
+                if node_values is not None and eq.field in node_values:
+                    values[op] = node_values[eq.field]
+                else:
+                    missing.append((op, eq))
             else:
                 values[op] = eq.generate()
+
+        # bindings introduced by mutations are not sampled with the covering array
+        if len(missing) > 0:
+            self._manager.retrieve_bound_value((eq for _, eq in missing), history_values)
+            for op, eq in missing:
+                values[op] = history_values[eq.resource_node][eq.field]
+            values = {op: values[op] for op in equivalences.keys()}
         return values
 
     @staticmethod
     def assemble(op: RestOp, values: dict[str, Any], **kwargs) -> tuple[str, dict[str, list[Any]], dict[str, list[Any]], Optional[ContentType], Optional[list[Any]]]:
-        def get_value_by_factor(_f):
-            if isinstance(_f, ArrayFactor):
-                if _f.global_name in values.keys():
-                    return values[_f.global_name]
-                else:
-                    item = get_value_by_factor(_f.item)
-                    return [item] if item is not None else []
-            elif isinstance(_f, ObjectFactor):
-                if _f.global_name in values.keys():
-                    return values[_f.global_name]
-                else:
-                    obj = {}
-                    for fp in _f.properties:
-                        val = get_value_by_factor(fp)
-                        if val is not None:
-                            obj[fp.name] = val
-                    return obj
-            else:
-                return values[_f.global_name] if values.get(_f.global_name, None) not in ("__null__", None) else None
-
-        uri = op.resolve_url(values)
-        query_pairs = {}
-        header_pairs = {}
-        body = None
-        content_type = kwargs.get("content_type", None)
-        for p in op.parameters:
-            value = get_value_by_factor(p.factor)
-            if value is None:
-                continue
-            if isinstance(p, QueryParam):
-                query_pairs[p.factor.name] = value
-            elif isinstance(p, HeaderParam):
-                header_pairs[p.factor.name] = value
-            elif isinstance(p, BodyParam):
-                body = value
-                if content_type is None:
-                    content_type = p.content_type
-        return uri, query_pairs, header_pairs, content_type, body
+        # the request of op is compiled once into a template, see RestOp.template
+        return op.template.fill(values, kwargs.get("content_type", None))
 
-    def mutate_and_execute(self, op: RestOp, equivalences: dict[str, AbstractEquivalence], retrieved_values: dict[str, dict[tuple, str]]):
+    def mutate_equivalences(self, op: RestOp, equivalences: dict[str, AbstractEquivalence]) -> tuple[dict[str, AbstractEquivalence], dict[str, Any]]:
         content_type = random.choice(list(ContentType.__members__.values())) if random.uniform(0, 1) < 0.5 else None
 
         new_equiv = dict()
@@ -221,54 +234,128 @@ class WeightAlgorithm:
             else:
                 pass
 
-        return self.generate_and_execute(op, new_equiv, retrieved_values=retrieved_values, content_type=content_type)
+        return new_equiv, {"content_type": content_type}
+
+    def mutate_and_execute(self, op: RestOp, equivalences: dict[str, AbstractEquivalence], retrieved_values: dict[str, dict[tuple, str]]):
+        new_equiv, kwargs = self.mutate_equivalences(op, equivalences)
+        return self.generate_and_execute(op, new_equiv, retrieved_values=retrieved_values, **kwargs)
+
+    def generate_request(self, op: RestOp, equivalences: dict[str, AbstractEquivalence], retrieved_values: dict[str, dict[tuple, str]], **kwargs) -> tuple[dict[str, Any], dict[str, Any]]:
+        values = self.generate_values(equivalences, retrieved_values)
+        uri, query_pairs, header_pairs, content_type, body = self.assemble(op, values, **kwargs)
+        request = {
+            "verb": op.verb,
+            "url": uri,
+            "headers": header_pairs,
+            "query": query_pairs,
+            "body": body,
+            "ContentType": content_type
+        }
+        return values, request
 
     @case_manager
     def generate_and_execute(self, op: RestOp, equivalences: dict[str, AbstractEquivalence], retrieved_values: dict[str, dict[tuple, str]], **kwargs):
         if equivalences is None:
             return {}, {}, None, None
-        values = self.generate_values(equivalences, retrieved_values)
-        uri, query_pairs, header_pairs, content_type, body = self.assemble(op, values, **kwargs)
-
-        status_code, response = self._executor.send(
-            verb=op.verb,
-            url=uri,
-            headers=header_pairs,
-            query=query_pairs,
-            body=body,
-            ContentType=content_type
-        )
+        values, request = self.generate_request(op, equivalences, retrieved_values, **kwargs)
+        status_code, response = self._executor.send(**request)
 
         return equivalences, values, status_code, response
 
+    def execute_concurrently(self, op: RestOp, exec_func: Callable, cases: list[dict[str, AbstractEquivalence]], retrieved_values: dict[str, dict[tuple, str]]):
+        """
+        execute all rows of a covering array at the same time, at most {self._concurrency} requests are in flight.
+        Values are generated sequentially, and results are collected into case_manager in row order.
+        """
+        prepared = []
+        for c in cases:
+            if c is None:
+                continue
+            if exec_func.__name__ == "mutate_and_execute":
+                c, kwargs = self.mutate_equivalences(op, c)
+            else:
+                kwargs = dict()
+            values, request = self.generate_request(op, c, retrieved_values, **kwargs)
+            prepared.append((c, values, request))
+
+        results = self._executor.send_batch([r for _, _, r in prepared], self._concurrency)
+        for (c, values, _), (status_code, response) in zip(prepared, results):
+            case_manager.add_case(c, values, status_code, response)
+
+    @property
+    def statistics(self) -> Statistics:
+        return self._statistics
+
+    @property
+    def reporter(self) -> StreamReporter:
+        return self._reporter
+
+    def save_snapshot(self):
+        Snapshot(self._manager, self._statistics, globalTimer.used(), self._reporter.num_batches).save(self._snapshot_file)
+        self._last_snapshot = time.time()
+
+    def restore(self, snapshot: Snapshot):
+        """continue the run saved in snapshot, its manager is the one this algorithm was created with"""
+        self._statistics = snapshot.statistics
+        for w in self._statistics.windows.values():
+            w.truncate_spill()
+        self._reporter.resume(snapshot.reported_batches)
+        globalTimer.resume(snapshot.used_budget)
+        snapshot.restore_random_states()
+        self._resumed = True
+
     def main(self):
+        if not self._resumed:
+            self._reporter.start(list(self._statistics.status_code.keys()))
+        try:
+            self._run()
+        finally:
+            # also reached when the server goes down, so that the results collected so far are saved
+            if self._snapshot_every > 0 and not globalTimer.reach_time_limit():
+                self.save_snapshot()
+            self.transport_stats = self._executor.pool_stats()
+            self.generator_stats = self._manager.equiv_generator.stats if isinstance(self._manager.equiv_generator, CachedGenerator) else None
+            self._statistics.report(os.path.join(self._output, 'data'), transport=self.transport_stats, generator=self.generator_stats)
+            self._reporter.close(self._statistics)
+            self._executor.close()
+            self._manager.equiv_generator.close()
+
+    def _run(self):
         while not globalTimer.reach_time_limit():
             op, exec_func = self.select_operation()
             self._statistics.reset(op.id)
+            # resources created by the other workers of a parallel run
+            self._manager.sync_resources()
 
             if exec_func.__name__ == "generate_and_execute":
                 self._manager.initialize_equiv(op.id)
 
             while True:
+                self._manager.sync_resources()
                 if exec_func.__name__ == "generate_and_execute" and self._statistics.status_code[op.id]["20X"] == 0 and self._statistics.error_monitors[op.id].since_last_discover > 0:
                     strength = 2
                 else:
                     strength = None
                 cases = self.select_equivalence(op, strength)
-                retrieved_value: dict[tuple, Any] = {}
-                for c in cases:
-                    exec_func(op, c, retrieved_value)
+                retrieved_value: dict[str, dict[tuple, Any]] = {}
+                self.sample_bound_values(cases, retrieved_value)
+                if self._concurrency > 1 and len(cases) > 1:
+                    self.execute_concurrently(op, exec_func, cases, retrieved_value)
+                else:
+                    for c in cases:
+                        exec_func(op, c, retrieved_value)
 
                 case_manager.upload_info(self._statistics, self._manager, op, self.get_matching_tokens(op), exec_func.__name__ == "generate_and_execute")
                 case_manager.reset()
+                self._reporter.record(self._statistics, op.id, exec_func.__name__)
+                if self._snapshot_every > 0 and time.time() - self._last_snapshot >= self._snapshot_every:
+                    self.save_snapshot()
 
                 if self._statistics.should_stop(op.id, exec_func.__name__) or globalTimer.reach_time_limit():
                     break
 
             if self._statistics.status_code[op.id]["20X"] == 0:
                 self._manager.op_selector.failed(op)
-                
-        self._statistics.report(os.path.join(self._output, 'data'))
 
 
 @click.command()
@@ -276,39 +363,134 @@ class WeightAlgorithm:
 @click.option('--spec_file', type=str, required=True, help='Path to the spec file')
 @click.option('--budget', type=float, required=True, help='Budget for the experiment, in seconds')
 @click.option('--output_path', type=str, required=True, help='Path to the output directory')
-@click.option('--pict', type=str, required=True, help='Path to the PICT tool')
+@click.option('--pict', type=str, required=False, help='Path to the PICT tool, required if the generator is pict')
+@click.option('--generator', type=click.Choice(['pict', 'pict_pool', 'ipog']), required=False, default='pict', help='Covering array generator: the PICT tool, PICT in background workers, or the in-process IPOG implementation')
+@click.option('--pict_workers', type=int, required=False, default=2, help='Number of background PICT workers of pict_pool')
+@click.option('--ca_cache_size', type=int, required=False, default=128, help='Number of covering arrays kept in the LRU cache, 0 disables the cache')
 @click.option('--server', type=str, required=False, help='URL of the server, e.g. http://localhost:5000. If not provided, the server will be inferred from the spec file')
 @click.option('--auth_key', type=str, required=False, help='Key for authentication')
 @click.option('--auth_value', type=str, required=False, help='Value for authentication')
 @click.option('--level', type=int, required=False, help='Logging level: INFO(20), DEBUG(10), WARNING(30), ERROR(40), CRITICAL(50)')
-def command(exp_name, spec_file, budget, output_path, pict, server, auth_key, auth_value, level):
-    main(exp_name, spec_file, budget, output_path, pict, server, auth_key=auth_key, auth_value=auth_value, level=level)
-
-
-def main(exp_name: str, spec_file: str, budget: float, output_path: str, pict: str, server: str = None, **kwargs):
+@click.option('--pool_size', type=int, required=False, default=10, help='Max number of keep-alive connections per host')
+@click.option('--max_retries', type=int, required=False, default=2, help='Retries with backoff when connecting to the server fails')
+@click.option('--concurrency', type=int, required=False, default=1, help='Max number of requests of one covering array sent concurrently, 1 means sequential execution')
+@click.option('--nlp_batch_size', type=int, required=False, default=256, help='Batch size of spaCy when parsing the responses of a covering array')
+@click.option('--nlp_processes', type=int, required=False, default=1, help='Number of processes of spaCy when parsing large batches of responses')
+@click.option('--nlp_cache_mb', type=int, required=False, default=64, help='Memory limit of the cache of parsed error messages, in MB')
+@click.option('--nlp_mode', type=click.Choice(['fast', 'full']), required=False, default='fast', help='fast only runs the spaCy components each analysis needs, full runs the whole pipeline')
+@click.option('--window_retention', type=int, required=False, default=0, help='Number of windows of each operation kept in memory, 0 keeps all of them')
+@click.option('--spill_windows', is_flag=True, default=False, help='Append the windows of each operation to files on disk, the report is made from them')
+@click.option('--checkpoint_every', type=int, required=False, default=50, help='Number of batches between two syncs of data/batches.jsonl and rewrites of data/progress.json')
+@click.option('--snapshot_every', type=float, required=False, default=600, help='Seconds between two snapshots of the state of the run, 0 disables snapshots')
+@click.option('--resume', is_flag=True, default=False, help='Resume the run of the same experiment from its last snapshot, with the remaining budget')
+@click.option('--resource_capacity', type=int, required=False, default=100, help='Number of resources kept by each resource node, the oldest ones are evicted first')
+@click.option('--node_capacity', type=str, multiple=True, help='Capacity of a specific resource node, e.g. /users=500, can be repeated')
+@click.option('--dedup_resources', is_flag=True, default=False, help='Also skip the resources without id whose content is already stored')
+@click.option('--similarity_workers', type=int, required=False, default=1, help='Threads of rapidfuzz computing the similarities of names, -1 uses all cores')
+@click.option('--full_binding_search', is_flag=True, default=False, help='Search the binding sources of an operation in all resource nodes instead of its plausible producers in the resource graph')
+@click.option('--workers', type=int, required=False, default=1, help='Number of processes testing disjoint shards of the operations, sharing their resources')
+@click.option('--listen', type=str, required=False, help='Run as the coordinator of a distributed run serving --workers shards at host:port, e.g. 0.0.0.0:7070')
+@click.option('--coordinator', type=str, required=False, help='Run as a worker of the distributed run of the coordinator at host:port')
+@click.option('--cluster_key', type=str, required=False, help='Secret shared by the coordinator and the workers of a distributed run')
+def command(exp_name, spec_file, budget, output_path, pict, generator, pict_workers, ca_cache_size, server, auth_key, auth_value, level, pool_size, max_retries, concurrency,
+            nlp_batch_size, nlp_processes, nlp_cache_mb, nlp_mode, window_retention, spill_windows,
+            checkpoint_every, snapshot_every, resume, resource_capacity, node_capacity, dedup_resources,
+            similarity_workers, full_binding_search, workers, listen, coordinator, cluster_key):
+    main(exp_name, spec_file, budget, output_path, pict, server, auth_key=auth_key, auth_value=auth_value, level=level,
+         pool_size=pool_size, max_retries=max_retries, concurrency=concurrency, generator=generator, ca_cache_size=ca_cache_size, pict_workers=pict_workers,
+         nlp_batch_size=nlp_batch_size, nlp_processes=nlp_processes, nlp_cache_mb=nlp_cache_mb, nlp_mode=nlp_mode,
+         window_retention=window_retention, spill_windows=spill_windows, checkpoint_every=checkpoint_every,
+         snapshot_every=snapshot_every, resume=resume, resource_capacity=resource_capacity,
+         node_capacities=dict((n.rsplit('=', 1)[0], int(n.rsplit('=', 1)[1])) for n in node_capacity), dedup_resources=dedup_resources,
+         similarity_workers=similarity_workers, full_binding_search=full_binding_search, workers=workers,
+         listen=listen, coordinator=coordinator, cluster_key=cluster_key)
+
+
+def configure(exp_name: str, output_path: str, **kwargs) -> logging.Logger:
+    """set up the logger, the NLP and the similarity components of a run, or of a worker of a parallel run"""
     level = kwargs.get('level')
     if level is None:
         level = logging.DEBUG
     global _logger
     _logger = setup_logger(exp_name, os.path.join(output_path, exp_name, 'log'), level=level)
 
+    configure_nlp(batch_size=kwargs.get('nlp_batch_size'), n_process=kwargs.get('nlp_processes'), cache_mb=kwargs.get('nlp_cache_mb'),
+                  mode=kwargs.get('nlp_mode'))
+    configure_similarity(workers=kwargs.get('similarity_workers'))
+    return _logger
+
+
+def create_algorithm(exp_name: str, manager: Manager, pict: str, output_path: str, **kwargs) -> WeightAlgorithm:
+    auth = None
+    if kwargs.get('auth_key') and kwargs.get('auth_value'):
+        auth = Auth({kwargs.get('auth_key'): kwargs.get('auth_value')})
+
+    manager.configure_resources(capacity=kwargs.get('resource_capacity'), node_capacities=kwargs.get('node_capacities'),
+                                dedup_content=kwargs.get('dedup_resources'))
+    manager.restrict_bindings = not kwargs.get('full_binding_search', False)
+    return WeightAlgorithm(exp_name, manager, pict, output_dir=output_path, auth=auth,
+                           pool_size=kwargs.get('pool_size') or 10,
+                           max_retries=kwargs.get('max_retries') if kwargs.get('max_retries') is not None else 2,
+                           concurrency=kwargs.get('concurrency') or 1,
+                           generator=kwargs.get('generator') or 'pict',
+                           ca_cache_size=kwargs.get('ca_cache_size') if kwargs.get('ca_cache_size') is not None else 128,
+                           pict_workers=kwargs.get('pict_workers') or 2,
+                           window_retention=kwargs.get('window_retention') or 0,
+                           spill_windows=kwargs.get('spill_windows') or False,
+                           checkpoint_every=kwargs.get('checkpoint_every') or 50,
+                           snapshot_every=kwargs.get('snapshot_every') if kwargs.get('snapshot_every') is not None else 600)
+
+
+def main(exp_name: str, spec_file: str, budget: float, output_path: str, pict: str, server: str = None, **kwargs):
+    if (kwargs.get('listen') or kwargs.get('coordinator')) and not kwargs.get('cluster_key'):
+        raise click.UsageError("--cluster_key is required by --listen and --coordinator")
+    if kwargs.get('coordinator'):
+        # the logger of a worker is named after the id given by the coordinator, the budget is the one of the coordinator
+        from src.distributed import run_worker
+        run_worker(exp_name, spec_file, output_path, pict, server, **kwargs)
+        return
+
+    configure(exp_name, output_path, **kwargs)
+
     if not os.path.exists(spec_file):
         _logger.error(f"Spec file {spec_file} does not exist.")
         return
-    if not os.path.exists(pict):
+    if kwargs.get('listen'):
+        from src.distributed import run_coordinator
+        run_coordinator(exp_name, spec_file, budget, output_path, server, **kwargs)
+        return
+    generator = kwargs.get('generator') or 'pict'
+    if generator in ('pict', 'pict_pool') and (pict is None or not os.path.exists(pict)):
         _logger.error(f"Pict file {pict} does not exist.")
         return
     if not os.path.exists(output_path):
         os.makedirs(output_path)
 
-    auth = None
-    if kwargs.get('auth_key') and kwargs.get('auth_value'):
-        auth = Auth({kwargs.get('auth_key'): kwargs.get('auth_value')})
+    if (kwargs.get('workers') or 1) > 1:
+        from src.parallel import run_parallel
+        if kwargs.get('resume'):
+            _logger.warning("Snapshots are not supported by parallel runs, --resume is ignored")
+        if not run_parallel(exp_name, spec_file, budget, output_path, pict, server, **kwargs):
+            sys.exit(1)
+        return
 
     globalTimer.set_timeout(budget)
-    manager = Manager.from_spec(spec_file, server=server)
-    alg = WeightAlgorithm(exp_name, manager, pict, output_dir=output_path, auth=auth)
-    alg.main()
+    snapshot = None
+    snapshot_file = os.path.join(output_path, exp_name, Snapshot.FILE)
+    if kwargs.get('resume'):
+        if os.path.exists(snapshot_file):
+            snapshot = Snapshot.load(snapshot_file)
+        else:
+            _logger.warning(f"No snapshot at {snapshot_file}, starting a new run")
+    manager = snapshot.manager if snapshot is not None else Manager.from_spec(spec_file, server=server)
+    alg = create_algorithm(exp_name, manager, pict, output_path, **kwargs)
+    if snapshot is not None:
+        alg.restore(snapshot)
+    try:
+        alg.main()
+    except ConnectionError as e:
+        _logger.error(f"Stopped, the server is not reachable: {e}")
+        sys.exit(1)
 
 
 if __name__ == '__main__':
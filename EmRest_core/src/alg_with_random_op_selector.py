@@ -8,6 +8,7 @@ import time
 from typing import Optional, Any, Callable
 import click
 from functools import lru_cache, wraps
+from requests.exceptions import ConnectionError
 
 from src.log import setup_logger
 from src.equivalence import Binding, AbstractEquivalence
@@ -308,7 +309,11 @@ def main(exp_name: str, spec_file: str, budget: float, output_path: str, pict: s
     globalTimer.set_timeout(budget)
     manager = Manager.from_spec(spec_file, server=server)
     alg = WeightAlgorithm(exp_name, manager, pict, output_dir=output_path, auth=auth)
-    alg.main()
+    try:
+        alg.main()
+    except ConnectionError as e:
+        _logger.error(f"Stopped, the server is not reachable: {e}")
+        sys.exit(1)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,277 @@
+import os
+import socket
+import threading
+import time
+from collections import deque
+from logging import getLogger
+from multiprocessing.connection import Listener, Client, Connection
+from multiprocessing import AuthenticationError
+from typing import Any, Optional
+
+from requests.exceptions import ConnectionError
+
+from src.manager import Manager, OperationManager
+from src.monitor import Statistics
+from src.parallel import WORKERS_DIR, shard_operations
+from src.reporter import StreamReporter
+
+_logger = getLogger(__name__)
+
+
+def parse_address(address: str) -> tuple[str, int]:
+    """host:port, an empty host listens on all interfaces"""
+    host, _, port = address.rpartition(':')
+    return host or '0.0.0.0', int(port)
+
+
+class Coordinator:
+    """
+    Coordinator of a distributed run: owns the shards of the operations, the global resource pool and the report of the run.
+    Remote workers (see run_worker) lease a shard, exchange the 2xx resources they store with the pool and stream the entries of their
+    batches (status codes, new fragments, forbidden tuples), which are appended to the batches.jsonl of the coordinator.
+
+    Each connection of a worker sends tuples (method, args) answered by the result of the method of the same name, as pickled messages
+    over TCP authenticated with the cluster key (multiprocessing.connection), so only trusted machines must know the key.
+    """
+    METHODS = ("join", "exchange", "record", "finish")
+    # seconds the coordinator waits for the results of the workers after the budget
+    GRACE = 60
+
+    def __init__(self, exp_name: str, manager: Manager, budget: float, output_path: str, shards: list[list[str]]):
+        self.exp_name = exp_name
+        self.shards = shards
+        self._manager = manager
+        self._budget = budget
+        self._started = time.time()
+        self._directory = os.path.join(output_path, exp_name, 'data')
+        self._reporter = StreamReporter(self._directory)
+        self._reporter.start([op.id for op in manager.unique])
+
+        # indexes of the shards not leased yet, a shard released by a worker that stopped is leased first
+        self._pending: deque[int] = deque(range(len(shards)))
+        # worker id -> leased shard, and the resources published by the other workers since its last exchange
+        self._leases: dict[int, int] = dict()
+        self._outboxes: dict[int, list[tuple[str, list[Any]]]] = dict()
+        self._next_id = 0
+        # shard -> statistics of the worker that tested it until the end of the budget
+        self.statistics: dict[int, Statistics] = dict()
+
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._listener: Optional[Listener] = None
+
+    @property
+    def remaining(self) -> float:
+        return self._budget - (time.time() - self._started)
+
+    def join(self, host: str) -> tuple[Optional[int], list[str], float, list[tuple[str, list[Any]]]]:
+        """
+        lease the next shard to a new worker
+        @return: id of the worker (None when all shards are leased), ids of its operations, remaining budget, resources of the pool
+        """
+        if len(self._pending) == 0 or self.remaining <= 0:
+            return None, [], 0, []
+        worker_id, self._next_id = self._next_id, self._next_id + 1
+        shard = self._pending.popleft()
+        self._leases[worker_id] = shard
+        self._outboxes[worker_id] = []
+        _logger.info(f"Worker {worker_id} on {host} leased shard {shard} ({len(self.shards[shard])} operations)")
+        return worker_id, self.shards[shard], self.remaining, self._manager.export_resources()
+
+    def exchange(self, worker_id: int, published: list[tuple[str, list[Any]]]) -> list[tuple[str, list[Any]]]:
+        """add the resources published by a worker to the pool and the outboxes of the others, return the ones published for it"""
+        for op_uri, responses in published:
+            self._manager.add_resources(op_uri, responses)
+            for other, outbox in self._outboxes.items():
+                if other != worker_id:
+                    outbox.append((op_uri, responses))
+        received, self._outboxes[worker_id] = self._outboxes.get(worker_id, []), []
+        return received
+
+    def record(self, worker_id: int, entry: dict):
+        self._reporter.append(dict(entry, worker=worker_id))
+
+    def finish(self, worker_id: int, statistics: Optional[Statistics], completed: bool):
+        """end the lease of a worker, the shard of a worker that stopped before the end of the budget is leased again"""
+        shard = self._leases.pop(worker_id, None)
+        self._outboxes.pop(worker_id, None)
+        if shard is None:
+            return
+        if completed and statistics is not None:
+            self.statistics[shard] = statistics
+        else:
+            _logger.warning(f"Worker {worker_id} stopped before the end of the budget, shard {shard} is leased again")
+            self._pending.appendleft(shard)
+        self._changed.notify_all()
+
+    def _handle(self, connection: Connection):
+        # workers that joined through this connection, their shards are released if it is lost without finish
+        joined: list[int] = []
+        try:
+            while True:
+                method, args = connection.recv()
+                if method not in self.METHODS:
+                    connection.send(ValueError(f"Unknown method: {method}"))
+                    continue
+                with self._lock:
+                    try:
+                        result = getattr(self, method)(*args)
+                    except Exception as e:
+                        _logger.error(f"{method} failed: {e}")
+                        result = e
+                if method == "join" and isinstance(result, tuple) and result[0] is not None:
+                    joined.append(result[0])
+                connection.send(result)
+        except (EOFError, ConnectionResetError):
+            pass
+        finally:
+            connection.close()
+            with self._lock:
+                for worker_id in joined:
+                    if worker_id in self._leases:
+                        self.finish(worker_id, None, False)
+
+    def _accept(self):
+        while True:
+            try:
+                connection = self._listener.accept()
+            except AuthenticationError as e:
+                _logger.warning(f"Connection refused: {e}")
+                continue
+            except OSError:
+                # the listener is closed
+                return
+            threading.Thread(target=self._handle, args=(connection,), daemon=True).start()
+
+    def _done(self) -> bool:
+        if len(self.statistics) == len(self.shards):
+            return True
+        if self.remaining <= 0 and len(self._leases) == 0:
+            return True
+        return self.remaining <= -self.GRACE
+
+    def serve(self, address: tuple[str, int], authkey: bytes):
+        """serve the workers until all shards are tested or the budget (and the grace period) is over, then write the report"""
+        self._listener = Listener(address, authkey=authkey)
+        _logger.info(f"Coordinator of {len(self.shards)} shards listening on {address[0]}:{address[1]}")
+        threading.Thread(target=self._accept, daemon=True).start()
+        with self._changed:
+            while not self._done():
+                self._changed.wait(timeout=1)
+        self._listener.close()
+
+        with self._lock:
+            self._reporter.close()
+            missing = [i for i in range(len(self.shards)) if i not in self.statistics]
+            if len(missing) > 0:
+                # the monitors of the missing shards are lost, the report is rebuilt from the streamed batches
+                _logger.error(f"Shards {missing} were not tested until the end of the budget, the report is built from {StreamReporter.LOG_FILE}")
+                self._reporter.report(self._directory)
+            else:
+                merged = Statistics([op.id for op in self._manager.unique])
+                for shard, s in self.statistics.items():
+                    merged.adopt(s, self.shards[shard])
+                merged.report(self._directory)
+        _logger.info(f"Distributed run finished in {time.time() - self._started:.0f}s")
+
+
+class CoordinatorClient:
+    """connection of a worker to the coordinator, calls are serialized since resources may be stored by several threads"""
+
+    def __init__(self, address: tuple[str, int], authkey: bytes):
+        self._connection = Client(address, authkey=authkey)
+        self._lock = threading.Lock()
+
+    def call(self, method: str, *args):
+        with self._lock:
+            self._connection.send((method, args))
+            result = self._connection.recv()
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def close(self):
+        self._connection.close()
+
+
+class RemoteChannel:
+    """
+    ResourceChannel of a remote worker: the published resources are buffered and sent to the coordinator at the next receive,
+    i.e. one round trip per batch, see Manager.sync_resources. The entries of the batches are forwarded by StreamReporter.record.
+    """
+
+    def __init__(self, worker_id: int, client: CoordinatorClient):
+        self.worker_id = worker_id
+        self._client = client
+        self._buffer: list[tuple[str, list[Any]]] = []
+        self.published = 0
+        self.received = 0
+
+    def publish(self, op_uri: str, responses: list[Any]):
+        self._buffer.append((op_uri, list(responses)))
+        self.published += 1
+
+    def receive(self) -> list[tuple[str, list[Any]]]:
+        buffer, self._buffer = self._buffer, []
+        messages = self._client.call("exchange", self.worker_id, buffer)
+        self.received += len(messages)
+        return messages
+
+    def record(self, entry: dict):
+        self._client.call("record", self.worker_id, entry)
+
+
+def run_coordinator(exp_name: str, spec_file: str, budget: float, output_path: str, server: str = None, **kwargs):
+    """split the operations into `workers` shards and serve them to the workers connecting to `listen`"""
+    manager = Manager.from_spec(spec_file, server=server)
+    manager.configure_resources(capacity=kwargs.get('resource_capacity'), node_capacities=kwargs.get('node_capacities'),
+                                dedup_content=kwargs.get('dedup_resources'))
+    # the groups of operations are visited in the order of the operation queue
+    shards = shard_operations(sum(OperationManager.sort(manager.unique, manager.graph), []), manager.graph, kwargs.get('workers') or 1)
+    _logger.info(f"Distributed run of {len(manager.unique)} operations in {len(shards)} shards: {[len(s) for s in shards]}")
+    coordinator = Coordinator(exp_name, manager, budget, output_path, shards)
+    coordinator.serve(parse_address(kwargs['listen']), kwargs['cluster_key'].encode())
+
+
+def run_worker(exp_name: str, spec_file: str, output_path: str, pict: str, server: str = None, **kwargs):
+    """lease a shard from the coordinator at `coordinator` and test it until the end of the budget of the coordinator"""
+    # imported lazily as in src.parallel, src.alg imports this module when a run is distributed
+    from src import alg
+
+    client = CoordinatorClient(parse_address(kwargs['coordinator']), kwargs['cluster_key'].encode())
+    worker_id, op_ids, remaining, resources = client.call("join", socket.gethostname())
+    if worker_id is None:
+        _logger.warning("All the shards of the coordinator are leased or its budget is over")
+        client.close()
+        return
+
+    name = f"{exp_name}_w{worker_id}"
+    directory = os.path.join(output_path, exp_name, WORKERS_DIR)
+    logger = alg.configure(name, directory, **kwargs)
+    # the budget is the one left on the coordinator, whose clock may differ
+    alg.globalTimer.set_timeout(remaining)
+
+    algorithm = None
+    completed = False
+    try:
+        manager = Manager.from_spec(spec_file, server=server)
+        manager.restrict(set(op_ids))
+        algorithm = alg.create_algorithm(name, manager, pict, directory, **dict(kwargs, snapshot_every=0))
+        for op_uri, responses in resources:
+            manager.add_resources(op_uri, responses)
+        manager.channel = RemoteChannel(worker_id, client)
+        algorithm.reporter.channel = manager.channel
+        logger.info(f"Worker {worker_id} tests {len(manager.unique)} operations in {remaining:.0f}s, {len(resources)} resource nodes received")
+        algorithm.main()
+        completed = alg.globalTimer.reach_time_limit()
+    except ConnectionError as e:
+        logger.error(f"Worker {worker_id} stopped, the server is not reachable: {e}")
+    except (OSError, EOFError) as e:
+        # raised by multiprocessing.connection, ConnectionError of requests is an OSError caught above
+        logger.error(f"Worker {worker_id} stopped, the coordinator is not reachable: {e!r}")
+    finally:
+        try:
+            client.call("finish", worker_id, algorithm.statistics if algorithm is not None else None, completed)
+        except (OSError, EOFError) as e:
+            logger.error(f"Worker {worker_id} could not report to the coordinator, it is not reachable: {e!r}")
+        client.close()
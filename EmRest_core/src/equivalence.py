@@ -6,7 +6,7 @@ import string
 from datetime import datetime, timedelta, date
 from enum import Enum, unique
 from typing import Any, Union
-from functools import cached_property
+from functools import cached_property, lru_cache
 
 import regex
 from rstr import xeger
@@ -253,12 +253,50 @@ class RandomTime(RandomMeta):
         return f"E: {self.__class__.__name__} ({self._begin}, {self._end})"
 
 
+class FieldAccessor:
+    """
+    Compiled path of a field in the resources of a node, e.g. ("owner", "_item", "id"), "_item" standing for the first item of a list.
+    A list found at the end of the path gives one of its items at random.
+    """
+    __slots__ = ("field", "_steps")
+
+    def __init__(self, field: tuple[str, ...]):
+        self.field = field
+        # None stands for "_item"
+        self._steps = tuple(None if key == "_item" else key for key in field)
+
+    @staticmethod
+    @lru_cache(maxsize=4096)
+    def of(field: tuple[str, ...]) -> "FieldAccessor":
+        """the accessor of field, shared by the bindings to it, they keep it when it is evicted from the cache"""
+        return FieldAccessor(field)
+
+    def get(self, resource) -> Any:
+        r = resource
+        for key in self._steps:
+            if r is None:
+                return None
+            if key is None:
+                if isinstance(r, list) and len(r) > 0:
+                    r = r[0]
+                else:
+                    return r
+            elif isinstance(r, dict):
+                r = r.get(key, None)
+            else:
+                return r
+        if isinstance(r, list) and len(r) > 0:
+            return random.choice(r)
+        return r
+
+
 class Binding(AbstractEquivalence):
     NOT_SET = "__NOT_SET__"
 
     def __init__(self, resource_node: str, field: list[str]):
         self.resource_node = resource_node
         self.field = tuple(field)
+        self.accessor = FieldAccessor.of(self.field)
         self._value = Binding.NOT_SET
 
     def __str__(self):
@@ -272,3 +310,38 @@ class Binding(AbstractEquivalence):
 
     def generate(self) -> Any:
         return self._value
+
+
+class EquivalenceTable:
+    """
+    Dense integer codes of the equivalences of an operation, equivalences with the same id share a code.
+    Covering arrays, forbidden tuples and the keys of the monitors are expressed with the codes, which are decoded to ids in the reports.
+    """
+
+    def __init__(self):
+        self._codes: dict[str, int] = dict()
+        self._equivalences: list[AbstractEquivalence] = []
+
+    def __len__(self):
+        return len(self._equivalences)
+
+    def code(self, equivalence: AbstractEquivalence) -> int:
+        c = self._codes.get(equivalence.id)
+        if c is None:
+            c = self._codes[equivalence.id] = len(self._equivalences)
+            self._equivalences.append(equivalence)
+        return c
+
+    def equivalence(self, code: int) -> AbstractEquivalence:
+        return self._equivalences[code]
+
+    def encode(self, case: dict[str, Union[AbstractEquivalence, int]]) -> dict[str, int]:
+        """codes of a case or of a forbidden tuple, codes are kept as they are"""
+        return {f: e if type(e) is int else self.code(e) for f, e in case.items()}
+
+    def decode(self, case: dict[str, int]) -> dict[str, str]:
+        """ids of the equivalences of a case or of a forbidden tuple"""
+        return {f: self._equivalences[c].id if type(c) is int else str(c) for f, c in case.items()}
+
+    def decode_key(self, key: tuple) -> tuple[str, ...]:
+        return tuple(self._equivalences[c].id if type(c) is int else str(c) for c in key)
@@ -1,9 +1,14 @@
-import sys
+import http.cookiejar
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from logging import getLogger
 from typing import Tuple, Union, Optional
 
 import requests
+from requests.adapters import HTTPAdapter
 from requests.exceptions import ConnectionError
+from urllib3.exceptions import MaxRetryError, ProtocolError
+from urllib3.util.retry import Retry
 
 from src.rest import Method, ContentType
 
@@ -28,9 +33,85 @@ class Auth:
 
 class RestRequest:
     UNEXPECTED = 700
+    TIMEOUT = 10
 
-    def __init__(self, auth: Auth = None):
+    def __init__(self, auth: Auth = None, pool_size: int = 10, max_retries: int = 2, backoff_factor: float = 0.3):
+        """
+        @param auth: authentication attached to every request
+        @param pool_size: max number of keep-alive connections kept per host
+        @param max_retries: retries on connection errors, with exponential backoff
+        @param backoff_factor: backoff between retries, i.e., {backoff_factor} * 2 ** (retry - 1) seconds
+        """
         self.auth: Auth = auth
+        self._session: requests.Session = self._create_session(pool_size, max_retries, backoff_factor)
+        self._num_requests: int = 0
+        self._lock = threading.Lock()
+        self._workers: Optional[ThreadPoolExecutor] = None
+        self._num_workers: int = 0
+
+    @staticmethod
+    def _create_session(pool_size: int, max_retries: int, backoff_factor: float) -> requests.Session:
+        # only connection failures are retried, status codes are the test results and must be kept as they are.
+        # Read errors are raised as they are: a timeout is handled by send like any other error, a dropped connection is sent again once
+        retry = Retry(total=max_retries, connect=max_retries, read=False, status=0, other=0,
+                      backoff_factor=backoff_factor, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        session = requests.Session()
+        # test cases are independent, cookies set by the server must not be sent with the next requests
+        session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def close(self):
+        if self._workers is not None:
+            self._workers.shutdown(wait=True)
+            self._workers = None
+        self._session.close()
+
+    def send_batch(self, requests_kwargs: list[dict], max_in_flight: int) -> list[Tuple[int, Union[str, dict]]]:
+        """
+        send a batch of requests concurrently over the shared connection pool
+        @param requests_kwargs: keyword arguments of each call to send
+        @param max_in_flight: max number of requests in flight at the same time
+        @return: (status code, response) of each request, in the order of requests_kwargs
+        """
+        if max_in_flight <= 1 or len(requests_kwargs) <= 1:
+            return [self.send(**kw) for kw in requests_kwargs]
+        if self._workers is None or self._num_workers != max_in_flight:
+            if self._workers is not None:
+                self._workers.shutdown(wait=True)
+            self._workers = ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="RestRequest")
+            self._num_workers = max_in_flight
+        return list(self._workers.map(lambda kw: self.send(**kw), requests_kwargs))
+
+    def _count_request(self):
+        with self._lock:
+            self._num_requests += 1
+
+    def pool_stats(self) -> dict[str, dict[str, int]]:
+        """number of requests and opened connections of each connection pool, keyed by host"""
+        stats = dict()
+        for adapter in set(self._session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                host = f"{key.key_scheme}://{key.key_host}:{key.key_port}"
+                stats[host] = {
+                    "requests": pool.num_requests,
+                    "connections": pool.num_connections,
+                    "reused": pool.num_requests - pool.num_connections,
+                    "idle": pool.pool.qsize() if pool.pool is not None else 0,
+                }
+        stats["total"] = {
+            "requests": self._num_requests,
+            "connections": sum(v["connections"] for v in stats.values()),
+            "reused": self._num_requests - sum(v["connections"] for v in stats.values()),
+            "idle": sum(v["idle"] for v in stats.values()),
+        }
+        return stats
 
     @staticmethod
     def validate(verb: Method, url: str, headers: dict, **kwargs):
@@ -49,23 +130,29 @@ class RestRequest:
 
         def send_request():
             if verb in [Method.POST, Method.PUT] and kwargs.get("body", None) is not None:
-                status_code, response_content = self.send_request_with_content(verb, url, headers, self.auth, **kwargs)
+                status_code, response_content = self.send_request_with_content(verb, url, headers, **kwargs)
             elif verb is Method.PATCH:
-                status_code, response_content = self.send_request_with_content(verb, url, headers, self.auth, **kwargs)
+                status_code, response_content = self.send_request_with_content(verb, url, headers, **kwargs)
             else:
-                status_code, response_content = self.send_request(verb, url, headers, self.auth, **kwargs)
+                status_code, response_content = self.send_request(verb, url, headers, **kwargs)
             return status_code, response_content
 
-        try:
-            sc, resp = send_request()
-        except ConnectionError as e:
-            _logger.error(f"ConnectionError: {e}")
-            sys.exit(1)
-        except Exception as e:
-            _logger.error(f"{verb.value}:{url} {type(e)} {e}")
+        for attempt in range(2):
             try:
                 sc, resp = send_request()
+                break
+            except ConnectionError as e:
+                if attempt == 0 and self._is_dropped(e):
+                    # the server closed a keep-alive connection as the request went out, it is sent again on a new connection
+                    _logger.warning(f"{verb.value}:{url} connection dropped, sending again: {e}")
+                    continue
+                # the server is down, the caller saves the results before exiting
+                _logger.error(f"ConnectionError: {e}")
+                raise
             except Exception as e:
+                if attempt == 0:
+                    _logger.error(f"{verb.value}:{url} {type(e)} {e}")
+                    continue
                 _logger.error(f"Try again: {verb.value}:{url} {e}")
                 sc, resp = self.UNEXPECTED, {}
 
@@ -73,27 +160,34 @@ class RestRequest:
         return sc, resp
 
     @staticmethod
-    def send_request_with_content(method: Method, url: str, headers: dict, auth: Optional[Auth], **kwargs) \
-            -> Tuple[int, Union[str, dict]]:
+    def _is_dropped(error: ConnectionError) -> bool:
+        """whether an established connection was closed by the server, rather than new connections refused"""
+        reason = error.args[0] if len(error.args) > 0 else None
+        if isinstance(reason, MaxRetryError):
+            reason = reason.reason
+        return isinstance(reason, ProtocolError)
+
+    def send_request_with_content(self, method: Method, url: str, headers: dict, **kwargs) -> Tuple[int, Union[str, dict]]:
         content_type = kwargs.get("ContentType", ContentType.JSON)
         # Set Content-Type
         headers["Content-Type"] = content_type.value
 
+        self._count_request()
         if "json" in content_type.value.lower():
-            response = requests.request(method=method.value, url=url, headers=headers, params=kwargs.get("query", None),
-                                        json=kwargs.get("body", None), files=kwargs.get("files", None), timeout=10,
-                                        auth=auth)
+            response = self._session.request(method=method.value, url=url, headers=headers, params=kwargs.get("query", None),
+                                             json=kwargs.get("body", None), files=kwargs.get("files", None), timeout=self.TIMEOUT,
+                                             auth=self.auth)
         else:
-            response = requests.request(method=method.value, url=url, headers=headers, params=kwargs.get("query", None),
-                                        data=kwargs.get("body", None), files=kwargs.get("files", None), timeout=10,
-                                        auth=auth)
+            response = self._session.request(method=method.value, url=url, headers=headers, params=kwargs.get("query", None),
+                                             data=kwargs.get("body", None), files=kwargs.get("files", None), timeout=self.TIMEOUT,
+                                             auth=self.auth)
 
         return RestRequest.get_response_info(response)
 
-    @staticmethod
-    def send_request(verb: Method, url, headers, auth, **kwargs) -> Tuple[int, Union[str, dict]]:
-        feedback = requests.request(method=verb.value, url=url, headers=headers, params=kwargs.get("query", None),
-                                    timeout=10, auth=auth)
+    def send_request(self, verb: Method, url, headers, **kwargs) -> Tuple[int, Union[str, dict]]:
+        self._count_request()
+        feedback = self._session.request(method=verb.value, url=url, headers=headers, params=kwargs.get("query", None),
+                                         timeout=self.TIMEOUT, auth=self.auth)
         return RestRequest.get_response_info(feedback)
 
     @staticmethod
@@ -1,7 +1,7 @@
 from typing import Optional
 
 import wordninja
-from src.nlp import _nlp
+from src.nlp import lemmatize
 
 from src.equivalence import *
 
@@ -54,7 +54,7 @@ class AbstractFactor(metaclass=abc.ABCMeta):
         placeholder = '{' + self.global_name + '}'
         if placeholder in uri_parts:
             pre_part = uri_parts[uri_parts.index(placeholder) - 1]
-            lemma_ = ''.join(t.lemma_ for t in _nlp(pre_part))
+            lemma_ = lemmatize(pre_part)
             self._tokens.add(lemma_)
             self._tokens.add(pre_part)
 
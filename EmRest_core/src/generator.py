@@ -2,18 +2,32 @@ import abc
 import os
 import random
 import shlex
+import shutil
 import subprocess
+import tempfile
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+from itertools import combinations, count
 
-import chardet
+import numpy as np
 from logging import getLogger
+from typing import Iterable, Iterator
 
 _logger = getLogger(__name__)
 
+# in-memory file system for model files of the covering array tools, if available
+_TMPFS = "/dev/shm"
+
 
 class Generator(metaclass=abc.ABCMeta):
+    # whether prefetch generates covering arrays in background, callers skip selecting the next domains otherwise
+    supports_prefetch = False
+
     def __init__(self, strength: int = 2):
         self.strength = strength
         self.count = 0
+        # forbidden tuples given to the generator, and the ones dropped by _check_fbt
+        self.constraint_stats: dict[str, int] = {"constraints": 0, "out_of_domain": 0, "duplicated": 0, "subsumed": 0}
 
     # define a decorator to autoincrement count
     @staticmethod
@@ -24,35 +38,75 @@ class Generator(metaclass=abc.ABCMeta):
 
         return wrapper
 
-    @staticmethod
-    def _check_fbt(name_mappings: dict[str, str],
-                   value_mappings: dict[str, dict[int, str]],
-                   ftb: list[dict[str, str]]) -> list[dict[str, int]]:
+    def _check_fbt(self,
+                   name_mappings: dict[str, str],
+                   value_mappings: dict[str, dict[int, int]],
+                   ftb: list[dict[str, int]]) -> list[dict[str, int]]:
         """
         delete invalid fbt based on value domains, and standardize the format of the valid ones.
+        Duplicated tuples and the tuples containing another forbidden tuple are redundant and also deleted.
             @param name_mappings: formatted name: original name
-            @param value_mappings: formatted name: [(value, [equivalent_name, ...])]
+            @param value_mappings: original name: {value index: value}
             @param ftb: forbidden tuples
-            @return: ftb
+            @return: ftb, original name replaced by formatted name and value by value index
         """
-        transformed_ftb = []
+        if len(ftb) == 0:
+            return []
+        # inverse mappings, built once per call
+        transformed_names = {f: transformed for transformed, f in name_mappings.items()}
+        value_indexes: dict[str, dict[int, int]] = dict()
+
+        out_of_domain = 0
+        unique: dict[frozenset, dict[str, int]] = dict()
         for t in ftb:
             new_t = {}
             for global_name, f_v in t.items():
-                transformed_name = next(
-                    (_transformed for _transformed in name_mappings.keys() if
-                     name_mappings[_transformed] == global_name), None)
+                transformed_name = transformed_names.get(global_name)
                 if transformed_name is None:
                     break
-                transformed_value = next((_transformed for _transformed in value_mappings.get(global_name).keys() if
-                                          value_mappings[global_name][_transformed] == str(f_v)), None)
-                if transformed_value is not None:
-                    new_t[transformed_name] = transformed_value
+                indexes = value_indexes.get(global_name)
+                if indexes is None:
+                    indexes = value_indexes[global_name] = {v: idx for idx, v in value_mappings[global_name].items()}
+                transformed_value = indexes.get(f_v)
+                if transformed_value is None:
+                    break
+                new_t[transformed_name] = transformed_value
+            else:
+                if len(new_t) > 0:
+                    unique.setdefault(frozenset(new_t.items()), new_t)
+                    continue
+            out_of_domain += 1
+
+        transformed_ftb = self._remove_subsumed(unique)
+        stats = self.constraint_stats
+        stats["constraints"] += len(ftb)
+        stats["out_of_domain"] += out_of_domain
+        stats["duplicated"] += len(ftb) - out_of_domain - len(unique)
+        stats["subsumed"] += len(unique) - len(transformed_ftb)
+        if len(transformed_ftb) < len(ftb):
+            _logger.debug(f"{len(ftb) - len(transformed_ftb)} of {len(ftb)} forbidden tuples pruned: {out_of_domain} out of domain, "
+                          f"{len(ftb) - out_of_domain - len(unique)} duplicated, {len(unique) - len(transformed_ftb)} subsumed")
+        return transformed_ftb
 
-            if len(new_t.keys()) == len(t.keys()):
-                transformed_ftb.append(new_t)
+    @staticmethod
+    def _remove_subsumed(unique: dict[frozenset, dict[str, int]]) -> list[dict[str, int]]:
+        """a forbidden tuple containing a smaller forbidden tuple is redundant, the smaller one already excludes its rows"""
+        kept: list[dict[str, int]] = []
+        # item -> kept tuples with this item, a tuple can only contain the kept tuples sharing its items
+        by_item: dict[tuple[str, int], list[frozenset]] = dict()
+        for items in sorted(unique, key=len):
+            if any(other <= items for item in items for other in by_item.get(item, ())):
+                continue
+            kept.append(unique[items])
+            for item in items:
+                by_item.setdefault(item, []).append(items)
+        return kept
 
-        return transformed_ftb
+    @staticmethod
+    def _canonical_key(factors: list[str], domains: list[list[str]], forbidden_tuples: list[dict[str, str]], strength: int) -> tuple:
+        """identify the inputs of a covering array, the order of forbidden tuples and their items are ignored"""
+        constraints = frozenset(frozenset(t.items()) for t in forbidden_tuples)
+        return tuple(factors), tuple(tuple(d) for d in domains), constraints, strength
 
     def handle(self,
                op_id: str,
@@ -61,6 +115,18 @@ class Generator(metaclass=abc.ABCMeta):
                forbidden_tuples: list[dict[str, str]], **kwargs) -> list[dict[str, str]]:
         raise NotImplementedError()
 
+    def prefetch(self,
+                 op_id: str,
+                 factors: list[str],
+                 domains: list[list[str]],
+                 forbidden_tuples: list[dict[str, str]], strength: int = None) -> None:
+        """generate a covering array ahead of time, generators that cannot work in background ignore it"""
+        pass
+
+    def close(self) -> None:
+        """release workers and files held by the generator"""
+        pass
+
 
 class GeneratorUseTool(Generator, metaclass=abc.ABCMeta):
     def __init__(self, exp_name: str, output_folder: str, tool_path: str, strength: int = 2):
@@ -108,6 +174,10 @@ class GeneratorUseTool(Generator, metaclass=abc.ABCMeta):
 
         if len(factors) == 0:
             return [{}]
+        return self._generate(*self._prepare(op_id, factors, domains, forbidden_tuples, strength))
+
+    def _prepare(self, op_id: str, factors: list[str], domains: list[list[str]], forbidden_tuples: list[dict[str, str]], strength: int = None) -> tuple:
+        """write the input file of the tool, return the arguments of _generate"""
         if strength is None:
             strength = self.strength
         strength = min(strength, len(factors))
@@ -121,8 +191,17 @@ class GeneratorUseTool(Generator, metaclass=abc.ABCMeta):
 
         content = self._generate_input_content(ca_op_id, _name_mappings, _value_mappings, fbt)
         input_file = self._write_to_file(ca_op_id, content)
-        output_file, stdout, stderr = self._run_tool(ca_op_id, input_file, strength)
-        return self._parse_output(_name_mappings, _value_mappings, out_file=output_file, stdout=stdout, stderr=stderr)
+        return ca_op_id, input_file, strength, _name_mappings, _value_mappings
+
+    def _generate(self, op_id: str, input_file: str, strength: int,
+                  name_mappings: dict[str, str], value_mappings: dict[str, dict[int, str]]) -> list[dict[str, str]]:
+        output_file, stdout, stderr = self._run_tool(op_id, input_file, strength)
+        return self._parse_output(name_mappings, value_mappings, out_file=output_file, stdout=stdout, stderr=stderr)
+
+    @staticmethod
+    def _decode(output: bytes) -> str:
+        # the tools only print parameter names, value indexes and messages in ASCII, so no charset detection is needed
+        return output.decode("utf-8", errors="replace")
 
     def _run_tool(self, op_id: str, input_file: str, strength: int = 2):
         output_file = os.path.join(self.output_folder, f"{self.__class__.__name__}_{op_id}_{self.count}_output.txt")
@@ -131,20 +210,7 @@ class GeneratorUseTool(Generator, metaclass=abc.ABCMeta):
 
         stdout, stderr = subprocess.Popen(shlex.split(command, posix=False), stdout=subprocess.PIPE,
                                           stderr=subprocess.PIPE).communicate()
-        encoding = chardet.detect(stdout)["encoding"]
-        if encoding is not None:
-            stdout = stdout.decode(encoding)
-        else:
-            stdout = stdout.decode("utf-8")
-
-        encoding = chardet.detect(stderr)["encoding"]
-        if encoding is not None:
-            stderr = stderr.decode(encoding)
-        else:
-            stderr = stderr.decode("utf-8")
-        # _logger.debug(f"ca progress: {stdout}")
-        # _logger.debug(f"ca error: {stderr}")
-        return output_file, stdout, stderr
+        return output_file, self._decode(stdout), self._decode(stderr)
 
 
 class ACTS(GeneratorUseTool):
@@ -250,6 +316,100 @@ class PICT(GeneratorUseTool):
                 results.append(d)
         return results
 
+    @staticmethod
+    def _iter_rows(name_mappings: dict[str, str], value_mappings: dict[str, dict[int, str]], lines: Iterable[bytes]) -> Iterator[dict[str, str]]:
+        """parse the raw output of PICT line by line, rows are yielded as soon as they are printed"""
+        global_names = None
+        for line in lines:
+            line = line.strip()
+            if line == b"" or line.startswith(b"Used seed:"):
+                continue
+            if line.startswith(b"P"):
+                global_names = [name_mappings[p.strip().decode("ascii")] for p in line.split(b"\t")]
+            else:
+                yield {g: value_mappings[g][int(v)] for g, v in zip(global_names, line.split(b"\t"))}
+
+    def _generate(self, op_id: str, input_file: str, strength: int,
+                  name_mappings: dict[str, str], value_mappings: dict[str, dict[int, str]]) -> list[dict[str, str]]:
+        command = self.create_command(input_file, "", strength)
+        # stderr goes to a file, PICT would block on a full stderr pipe while stdout is read
+        with tempfile.TemporaryFile() as stderr:
+            with subprocess.Popen(shlex.split(command, posix=False), stdout=subprocess.PIPE, stderr=stderr) as process:
+                results = list(self._iter_rows(name_mappings, value_mappings, process.stdout))
+            if len(results) == 0:
+                stderr.seek(0)
+                _logger.error(f"PICT: {self._decode(stderr.read())}")
+        return results
+
+
+class PICTPool(PICT):
+    """
+    PICT running in a pool of background threads,
+    covering arrays can be prefetched, e.g., for the next iteration of an operation, while test cases are executed.
+    Model files are written to an in-memory file system (if available) and removed once PICT finishes.
+    Only PICT runs on the threads, the model files are written and the counters updated by the calling thread.
+    """
+    supports_prefetch = True
+
+    def __init__(self, exp_id: str, output_folder: str, tool_path: str = None, strength: int = 2,
+                 workers: int = 2, max_pending: int = 8):
+        super().__init__(exp_id, output_folder, tool_path, strength)
+        self.output_folder = tempfile.mkdtemp(prefix=f"{exp_id}-ca-", dir=_TMPFS if os.path.isdir(_TMPFS) else None)
+        self._workers = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="PICT")
+        self._pending: OrderedDict[tuple, Future] = OrderedDict()
+        self._max_pending = max_pending
+        self._file_ids = count()
+        self.prefetch_hits = 0
+
+    def _write_to_file(self, op_id: str, content: str):
+        # files are written from several threads, self.count is not unique among them
+        input_file = os.path.join(self.output_folder, f"{self.__class__.__name__}_{op_id}_{next(self._file_ids)}.txt")
+        with open(input_file, "w") as fp:
+            fp.write(content)
+        return input_file
+
+    def _generate(self, op_id: str, input_file: str, strength: int,
+                  name_mappings: dict[str, str], value_mappings: dict[str, dict[int, str]]) -> list[dict[str, str]]:
+        try:
+            return super()._generate(op_id, input_file, strength, name_mappings, value_mappings)
+        finally:
+            os.remove(input_file)
+
+    def handle(self,
+               op_id: str,
+               factors: list[str],
+               domains: list[list[str]],
+               forbidden_tuples: list[dict[str, str]], strength: int = None, **kwargs) -> list[dict[str, str]]:
+        if strength is None:
+            strength = self.strength
+        future = self._pending.pop(self._canonical_key(factors, domains, forbidden_tuples, strength), None)
+        if future is not None and not future.cancelled():
+            self.prefetch_hits += 1
+            return future.result()
+        return super().handle(op_id, factors, domains, forbidden_tuples, strength, **kwargs)
+
+    def prefetch(self,
+                 op_id: str,
+                 factors: list[str],
+                 domains: list[list[str]],
+                 forbidden_tuples: list[dict[str, str]], strength: int = None) -> None:
+        if strength is None:
+            strength = self.strength
+        key = self._canonical_key(factors, domains, forbidden_tuples, strength)
+        if len(factors) == 0 or key in self._pending:
+            return
+        self.count += 1
+        self._pending[key] = self._workers.submit(self._generate, *self._prepare(op_id, factors, domains, forbidden_tuples, strength))
+        while len(self._pending) > self._max_pending:
+            _, future = self._pending.popitem(last=False)
+            future.cancel()
+
+    def close(self) -> None:
+        self._workers.shutdown(wait=True, cancel_futures=True)
+        self._pending.clear()
+        shutil.rmtree(self.output_folder, ignore_errors=True)
+        _logger.info(f"PICT pool: {self.count} covering arrays, {self.prefetch_hits} prefetched")
+
 
 class Randomize(Generator):
     def __init__(self, exp_name: str, output_folder: str, pict_path: str):
@@ -308,3 +468,328 @@ class Randomize(Generator):
             if len(results) >= num:
                 break
         return results
+
+
+class IPOG(Generator):
+    """
+    In-process t-way covering array generator based on IPOG (In-Parameter-Order-General),
+    the uncovered tuples of each new factor are kept in a boolean matrix so that gains are computed with NumPy.
+
+    A value is assigned only if the row can still be completed without containing a forbidden tuple,
+    so no row is dropped and a tuple is marked as covered once a row contains it.
+    """
+
+    def __init__(self, strength: int = 2):
+        super().__init__(strength)
+
+    @Generator.auto_increment_count
+    def handle(self,
+               op_id: str,
+               factors: list[str],
+               domains: list[list[str]],
+               forbidden_tuples: list[dict[str, str]], strength: int = None, **kwargs) -> list[dict[str, str]]:
+        if len(factors) == 0:
+            return [{}]
+        if any(len(d) == 0 for d in domains):
+            _logger.error(f"IPOG: empty domain in {op_id}")
+            return []
+        if strength is None:
+            strength = self.strength
+        strength = max(1, min(strength, len(factors)))
+
+        _name_mappings: dict[str, str] = {f"P{idx}": f for idx, f in enumerate(factors)}
+        _value_mappings = {f: {e_idx: _e for e_idx, _e in enumerate(domains[f_idx])} for f_idx, f in enumerate(factors)}
+        fbt = self._check_fbt(_name_mappings, _value_mappings, forbidden_tuples)
+        constraints = [{int(n[1:]): v for n, v in t.items()} for t in fbt if len(t) > 0]
+
+        rng = np.random.default_rng(random.getrandbits(32))
+        rows = self.generate([len(d) for d in domains], constraints, strength, rng)
+        return [{factors[j]: domains[j][v] for j, v in enumerate(row)} for row in rows.tolist()]
+
+    @staticmethod
+    def generate(sizes: list[int], constraints: list[dict[int, int]], strength: int, rng: np.random.Generator) -> np.ndarray:
+        """
+        @param sizes: domain size of each factor
+        @param constraints: forbidden tuples, factor index: value index
+        @param strength: strength t of the covering array
+        @param rng: random generator used to break ties
+        @return: covering array, one row per test case and one column per factor, cells are value indexes
+        """
+        k = len(sizes)
+        # factors with larger domains first, which leads to smaller arrays
+        order = np.argsort(-np.array(sizes), kind="stable")
+        position = np.empty(k, dtype=int)
+        position[order] = np.arange(k)
+        n = [sizes[f] for f in order]
+        checker = _ConstraintChecker(n, [{int(position[f]): v for f, v in c.items()} for c in constraints])
+
+        # all combinations of the first t factors
+        first = np.indices(n[:strength]).reshape(strength, -1).T
+        rows = np.full((len(first), k), -1, dtype=int)
+        rows[:, :strength] = first[rng.permutation(len(first))]
+        if checker.has_constraints:
+            rows = rows[[checker.is_valid(r) and checker.completable(r) for r in rows]]
+
+        for i in range(strength, k):
+            combos = list(combinations(range(i), strength - 1))
+            combos = np.array(combos, dtype=int).reshape(len(combos), strength - 1)
+            combo_sizes = np.array([[n[c] for c in combo] for combo in combos], dtype=int).reshape(len(combos), strength - 1)
+            # row-major strides of the cells of each combination
+            strides = np.ones_like(combo_sizes)
+            for j in range(strength - 3, -1, -1):
+                strides[:, j] = strides[:, j + 1] * combo_sizes[:, j + 1]
+            num_cells = combo_sizes.prod(axis=1)
+            offsets = np.concatenate(([0], np.cumsum(num_cells)[:-1])).astype(int)
+
+            # uncovered[cell, v]: the tuple (cell of a combination, v of factor i) has not been covered
+            uncovered = np.ones((int(num_cells.sum()), n[i]), dtype=bool)
+            if checker.has_constraints:
+                checker.exclude_invalid_tuples(i, combos, combo_sizes, strides, offsets, uncovered)
+
+            def cells_of(_rows: np.ndarray) -> np.ndarray:
+                values = _rows[:, combos]
+                cells = (values * strides).sum(axis=-1) + offsets
+                cells[(values < 0).any(axis=-1)] = -1
+                return cells
+
+            # horizontal growth
+            all_cells = cells_of(rows)
+            for r in range(len(rows)):
+                cells = all_cells[r][all_cells[r] >= 0]
+                allowed = checker.allowed_values(rows[r], i, n[i])
+                gains = np.where(allowed, uncovered[cells].sum(axis=0), -1)
+                # values by decreasing gain, ties in random order, the first one that keeps the row completable is assigned
+                candidates = rng.permutation(n[i])
+                candidates = candidates[np.argsort(-gains[candidates], kind="stable")]
+                v = next((v for v in candidates if gains[v] > 0 and checker.completable(rows[r], i, v)), None)
+                if v is None:
+                    # leave it as don't care, vertical growth may use it
+                    continue
+                rows[r, i] = v
+                uncovered[cells, v] = False
+
+            # vertical growth
+            to_cover_cells, to_cover_values = np.nonzero(uncovered)
+            for cell, v in zip(to_cover_cells, to_cover_values):
+                if not uncovered[cell, v]:
+                    continue
+                c = int(np.searchsorted(offsets, cell, side="right") - 1)
+                cols = np.append(combos[c], i)
+                target = np.append((cell - offsets[c]) // strides[c] % combo_sizes[c], v)
+
+                sub = rows[:, cols]
+                candidates = np.flatnonzero(np.all((sub == target) | (sub < 0), axis=1))
+                r = next((r for r in candidates if checker.assign(rows[r], cols, target)), None)
+                if r is None:
+                    row = np.full(k, -1, dtype=int)
+                    if not checker.assign(row, cols, target):
+                        # no valid row contains the tuple
+                        uncovered[cell, v] = False
+                        continue
+                    rows = np.vstack((rows, row))
+                    r = len(rows) - 1
+                cells = cells_of(rows[r:r + 1])[0]
+                uncovered[cells[cells >= 0], rows[r, i]] = False
+
+        # fill don't care values
+        for r in range(len(rows)):
+            for j in np.flatnonzero(rows[r] < 0):
+                # the row is completable, so one of the values keeps it completable
+                rows[r, j] = next(v for v in rng.permutation(n[j]) if checker.completable(rows[r], j, v))
+
+        return rows[:, position]
+
+
+class _ConstraintChecker:
+    """check forbidden tuples when values of a row are assigned"""
+
+    def __init__(self, sizes: list[int], constraints: list[dict[int, int]]):
+        k = len(sizes)
+        self._sizes = sizes
+        self.constraints = [c for c in constraints if len(c) > 0]
+        # factor: [(other factors, their values, value of the factor)]
+        self._by_factor: list[list[tuple[np.ndarray, np.ndarray, int]]] = [list() for _ in range(k)]
+        # the same rules on Python values, for the search of completions
+        self._rules: list[list[tuple[tuple, tuple, int]]] = [list() for _ in range(k)]
+        for c in self.constraints:
+            for f, v in c.items():
+                others = [o for o in c.keys() if o != f]
+                self._by_factor[f].append((np.array(others, dtype=int), np.array([c[o] for o in others], dtype=int), v))
+                self._rules[f].append((tuple(others), tuple(c[o] for o in others), v))
+        # factors with constraints, and whether a partial row (their values) can be completed
+        self._constrained = [f for f in range(k) if len(self._by_factor[f]) > 0]
+        # a factor with a value in no forbidden tuple is completed by this value, only the other ones are searched
+        self._tight = [f for f in self._constrained if len({v for _, _, v in self._rules[f]}) == sizes[f]]
+        self._completable: dict[tuple, bool] = dict()
+
+    @property
+    def has_constraints(self) -> bool:
+        return len(self.constraints) > 0
+
+    def allowed_values(self, row: np.ndarray, f: int, size: int) -> np.ndarray:
+        allowed = np.ones(size, dtype=bool)
+        for others, values, v in self._by_factor[f]:
+            if np.array_equal(row[others], values):
+                allowed[v] = False
+        return allowed
+
+    def is_valid(self, row: np.ndarray) -> bool:
+        return not any(all(f < len(row) and row[f] == v for f, v in c.items()) for c in self.constraints)
+
+    def assign(self, row: np.ndarray, cols: np.ndarray, target: np.ndarray) -> bool:
+        """assign target values to row[cols] in place if the row can still be completed without containing a forbidden tuple"""
+        original = row[cols].copy()
+        for f, v in zip(cols, target):
+            if row[f] == v:
+                continue
+            for others, values, forbidden in self._by_factor[f]:
+                if forbidden == v and np.array_equal(row[others], values):
+                    row[cols] = original
+                    return False
+            row[f] = v
+        if not self.completable(row):
+            row[cols] = original
+            return False
+        return True
+
+    def completable(self, row: np.ndarray, f: int = None, v: int = None) -> bool:
+        """
+        whether the don't care values of a row (with row[f] = v if given) can be assigned without introducing a forbidden tuple,
+        the assigned values of the row must not contain a forbidden tuple
+        """
+        if not self.has_constraints:
+            return True
+        values = row.tolist()
+        if f is not None:
+            if any(v == forbidden and all(values[o] == x for o, x in zip(others, others_values))
+                   for others, others_values, forbidden in self._rules[f]):
+                return False
+            values[f] = v
+        key = tuple(values[j] for j in self._constrained)
+        result = self._completable.get(key)
+        if result is None:
+            free = [j for j in self._tight if values[j] < 0]
+            result = self._completable[key] = self._greedy(values, free) or self._complete(values, free)
+        return result
+
+    def _allowed(self, row: list[int], j: int, size: int) -> list[int]:
+        forbidden = {v for others, values, v in self._rules[j] if all(row[o] == x for o, x in zip(others, values))}
+        return [v for v in range(size) if v not in forbidden]
+
+    def _greedy(self, row: list[int], free: list[int]) -> bool:
+        # most rows are completed by the first allowed value of each factor, without searching
+        row = list(row)
+        for j in free:
+            allowed = self._allowed(row, j, self._sizes[j])
+            if len(allowed) == 0:
+                return False
+            row[j] = allowed[0]
+        return True
+
+    def _complete(self, row: list[int], free: list[int]) -> bool:
+        # backtracking search, the factor with the fewest allowed values first
+        if len(free) == 0:
+            return True
+        best, best_allowed = None, None
+        for j in free:
+            allowed = self._allowed(row, j, self._sizes[j])
+            if len(allowed) == 0:
+                return False
+            if best_allowed is None or len(allowed) < len(best_allowed):
+                best, best_allowed = j, allowed
+                if len(allowed) == 1:
+                    break
+        rest = [j for j in free if j != best]
+        for v in best_allowed:
+            row[best] = v
+            if self._complete(row, rest):
+                return True
+        row[best] = -1
+        return False
+
+    def exclude_invalid_tuples(self, i: int, combos: np.ndarray, combo_sizes: np.ndarray, strides: np.ndarray,
+                               offsets: np.ndarray, uncovered: np.ndarray):
+        """tuples that contain a forbidden tuple do not need to be covered"""
+        num_cells = combo_sizes.prod(axis=1)
+        for c in self.constraints:
+            cols = set(c.keys())
+            if max(cols) > i:
+                continue
+            for idx, combo in enumerate(combos):
+                scope = set(combo.tolist()) | {i}
+                if not cols.issubset(scope):
+                    continue
+                cells = np.indices(combo_sizes[idx]).reshape(len(combo), int(num_cells[idx])).T
+                matched = np.ones(len(cells), dtype=bool)
+                for j, f in enumerate(combo):
+                    if f in c:
+                        matched &= cells[:, j] == c[f]
+                matched_cells = (cells[matched] * strides[idx]).sum(axis=1) + offsets[idx]
+                if i in c:
+                    uncovered[matched_cells, c[i]] = False
+                else:
+                    uncovered[matched_cells, :] = False
+
+
+class CachedGenerator(Generator):
+    """
+    LRU cache in front of another generator, keyed by factors, domains, forbidden tuples and strength.
+    A hit returns the cached covering array with its rows reshuffled instead of generating it again.
+    """
+
+    def __init__(self, generator: Generator, max_size: int = 128):
+        super().__init__(generator.strength)
+        self._generator = generator
+        self._max_size = max_size
+        self._cache: OrderedDict[tuple, list[dict[str, str]]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def supports_prefetch(self) -> bool:
+        return self._generator.supports_prefetch
+
+    @property
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._cache), **self._generator.constraint_stats}
+
+    @Generator.auto_increment_count
+    def handle(self,
+               op_id: str,
+               factors: list[str],
+               domains: list[list[str]],
+               forbidden_tuples: list[dict[str, str]], strength: int = None, **kwargs) -> list[dict[str, str]]:
+        if strength is None:
+            strength = self.strength
+        key = self._canonical_key(factors, domains, forbidden_tuples, strength)
+        if key in self._cache:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            cases = [dict(c) for c in self._cache[key]]
+            random.shuffle(cases)
+            return cases
+
+        self.misses += 1
+        cases = self._generator.handle(op_id=op_id, factors=factors, domains=domains, forbidden_tuples=forbidden_tuples, strength=strength, **kwargs)
+        # failed generations are not cached, they may succeed next time
+        if len(cases) > 0 and cases != [{}]:
+            self._cache[key] = [dict(c) for c in cases]
+            if len(self._cache) > self._max_size:
+                self._cache.popitem(last=False)
+        if self.count % 100 == 0:
+            _logger.debug(f"Covering array cache: {self.stats}")
+        return cases
+
+    def prefetch(self,
+                 op_id: str,
+                 factors: list[str],
+                 domains: list[list[str]],
+                 forbidden_tuples: list[dict[str, str]], strength: int = None) -> None:
+        if strength is None:
+            strength = self.strength
+        if self._canonical_key(factors, domains, forbidden_tuples, strength) in self._cache:
+            return
+        self._generator.prefetch(op_id=op_id, factors=factors, domains=domains, forbidden_tuples=forbidden_tuples, strength=strength)
+
+    def close(self) -> None:
+        self._generator.close()
@@ -0,0 +1,176 @@
+from functools import lru_cache
+from logging import getLogger
+from typing import Optional
+
+from src.factor import AbstractFactor, ObjectFactor, ArrayFactor, EnumFactor
+from src.rest import RestOp
+from src.similarity import score_matrix
+
+_logger = getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def resource_node_of(path: str) -> str:
+    """the path without its trailing placeholders, e.g. /users/{id} -> /users"""
+    while True:
+        if path.endswith('/'):
+            path = path[:-1]
+        elif path.endswith('}'):
+            path = path[:path.rfind('{')]
+        else:
+            return path
+
+
+def _is_2xx(code) -> bool:
+    # codes such as "default" or "2XX" may also be successful
+    return not isinstance(code, int) or 200 <= code < 300
+
+
+class ResourceGraph:
+    """
+    Producer/consumer edges between the resource nodes and the operations of a spec, built once from the paths, the parameter names
+    and the 2xx response schemas. A resource node is a plausible producer of binding sources for an operation when:
+    - it is the node of the operation or of one of its ancestors, e.g. /users for get:/users/{id}/posts
+    - a token of a parameter of the operation is similar to a field name of the resources of the node (as in ResourceManager.match_value_source),
+      the names are the ones of the response schemas and the ones of the stored resources, see observe_fields
+    - the successful responses of the node are not described, so any field may be stored
+    """
+
+    def __init__(self, operations: list[RestOp], threshold: float):
+        self.threshold = threshold
+        self.node_of: dict[str, str] = {op.id: resource_node_of(op.path.computed_to_string) for op in operations}
+        # node -> names of the fields of its resources, by ResourceManager and FieldIndex conventions
+        self.fields: dict[str, set[str]] = dict()
+        self.undescribed: set[str] = set()
+        # lowercase tokens of the parameters -> row, op.id -> rows of the tokens of its parameters
+        self._tokens: dict[str, int] = dict()
+        self._op_tokens: dict[str, list[int]] = dict()
+        for op in operations:
+            node = self.node_of[op.id]
+            names = self.fields.setdefault(node, set())
+            if not self._add_response_fields(op, node, names):
+                self.undescribed.add(node)
+
+        # op.id -> plausible producer nodes, node -> ids of the operations it produces for
+        self.producers: dict[str, set[str]] = {op.id: self._path_producers(op) | self.undescribed for op in operations}
+        self._add_similar_producers(operations)
+        self.consumers: dict[str, set[str]] = {node: set() for node in self.fields}
+        for op_id, nodes in self.producers.items():
+            for node in nodes:
+                self.consumers[node].add(op_id)
+
+        if len(operations) > 0:
+            _logger.info(f"Resource graph: {len(self.fields)} nodes ({len(self.undescribed)} undescribed), "
+                         f"{sum(len(p) for p in self.producers.values()) / len(operations):.1f} producers per operation")
+
+    @staticmethod
+    def _add_response_fields(op: RestOp, node: str, names: set[str]) -> bool:
+        """add the field names of the resources op may store, False if they can not be known"""
+        resource_name = node.split('/')[-1]
+        # an empty 2xx response stores the values of the request, keyed by global names
+        names.update(f.global_name for f in op.get_all_factors())
+
+        responses = [r for r in op.responses if _is_2xx(r.status_code)]
+        if all(len(r.contents) == 0 for r in responses):
+            # nothing is documented, unless the operation only answers 204 No Content
+            return len(responses) > 0 and all(r.status_code == 204 for r in responses)
+        # the 2xx responses without content of an operation documenting another one are expected to be empty
+        return all(ResourceGraph._add_root_fields(content, resource_name, names) for r in responses for _, content in r.contents)
+
+    @staticmethod
+    def _add_root_fields(factor: Optional[AbstractFactor], resource_name: str, names: set[str]) -> bool:
+        # a response that is not an object, or an item of a list that is not an object, is stored as {resource_name: value}
+        if isinstance(factor, ArrayFactor):
+            factor = factor.item
+            if isinstance(factor, ArrayFactor):
+                return ResourceGraph._add_item_fields(factor, resource_name, names)
+        if isinstance(factor, ObjectFactor):
+            if len(factor.properties) == 0:
+                return False
+            return all(ResourceGraph._add_property_fields(p, None, names) for p in factor.properties)
+        names.add(resource_name)
+        return True
+
+    @staticmethod
+    def _add_property_fields(factor: AbstractFactor, parent: Optional[str], names: set[str]) -> bool:
+        key = factor.name
+        if isinstance(factor, ObjectFactor):
+            if len(factor.properties) == 0:
+                return False
+            return all(ResourceGraph._add_property_fields(p, key, names) for p in factor.properties)
+        if isinstance(factor, ArrayFactor):
+            return ResourceGraph._add_item_fields(factor.item, key, names)
+        names.add(key)
+        if parent is not None:
+            names.add(f"{parent}.{key}")
+        return True
+
+    @staticmethod
+    def _add_item_fields(item: Optional[AbstractFactor], parent: str, names: set[str]) -> bool:
+        """fields of the items of a list whose key is parent"""
+        if item is None:
+            return False
+        if isinstance(item, ObjectFactor):
+            if len(item.properties) == 0:
+                return False
+            return all(ResourceGraph._add_property_fields(p, parent, names) for p in item.properties)
+        if isinstance(item, ArrayFactor):
+            return ResourceGraph._add_item_fields(item.item, parent, names)
+        names.add(parent)
+        return True
+
+    def _path_producers(self, op: RestOp) -> set[str]:
+        path = op.path.computed_to_string
+        return {node for node in self.fields if path == node or path.startswith(node.rstrip('/') + '/')}
+
+    def _add_similar_producers(self, operations: list[RestOp]):
+        for op in operations:
+            rows = set()
+            for factor in op.get_leaf_factors():
+                if isinstance(factor, EnumFactor):
+                    continue
+                for t in factor.tokens:
+                    rows.add(self._tokens.setdefault(t.lower(), len(self._tokens)))
+            self._op_tokens[op.id] = list(rows)
+
+        for node, names in self.fields.items():
+            if node not in self.undescribed:
+                self._add_producer_edges(node, names)
+
+    def _add_producer_edges(self, node: str, names: set[str]) -> list[str]:
+        """make node a producer of the operations with a token similar to one of names, return the ids of the new consumers"""
+        if len(self._tokens) == 0 or len(names) == 0:
+            return []
+        # best similarity of each token with the fields of the node
+        best = score_matrix(list(self._tokens), [n.lower() for n in names]).max(axis=1)
+        added = []
+        for op_id, rows in self._op_tokens.items():
+            if len(rows) > 0 and node not in self.producers[op_id] and best[rows].max() >= self.threshold:
+                self.producers[op_id].add(node)
+                added.append(op_id)
+        return added
+
+    def observe_fields(self, node: str, names: set[str]):
+        """
+        add the field names found in the resources stored by node, the responses may have fields that are not documented, e.g. an id,
+        the node becomes a producer of the operations with a token similar to one of them
+        """
+        known = self.fields.setdefault(node, set())
+        new_names = names - known
+        if len(new_names) == 0:
+            return
+        known.update(new_names)
+        if node in self.undescribed:
+            return
+        added = self._add_producer_edges(node, new_names)
+        self.consumers.setdefault(node, set()).update(added)
+        if len(added) > 0:
+            _logger.debug(f"Resource graph: {node} stores {sorted(new_names)}, producer of {len(added)} more operations")
+
+    def producers_of(self, op_id: str) -> Optional[set[str]]:
+        """plausible producer nodes of an operation, None if the operation is not in the graph"""
+        return self.producers.get(op_id)
+
+    def out_degree(self, op: RestOp) -> int:
+        """number of operations the node of op produces for"""
+        return len(self.consumers.get(self.node_of.get(op.id, ''), ()))
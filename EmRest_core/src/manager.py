@@ -1,14 +1,17 @@
+import hashlib
+import json
 import re
-from itertools import groupby
+from collections import deque
 from logging import getLogger, DEBUG
-from typing import Callable
+from typing import Callable, Iterable
 
 import numpy as np
-from fuzzywuzzy import fuzz
 
 from src.factor import *
 from src.generator import Randomize
+from src.graph import ResourceGraph, resource_node_of
 from src.rest import RestOp, Method
+from src.similarity import similarity_matrix
 from src.swagger import ParserV3
 
 _logger = getLogger(__name__)
@@ -19,15 +22,36 @@ class Manager:
     manage the operations of REST APIs
     """
 
-    def __init__(self, uni: list[RestOp]):
+    def __init__(self, uni: list[RestOp], graph: ResourceGraph = None):
         self.unique = uni
+        # producer/consumer edges of the spec, binding sources are only searched in the plausible producers when restrict_bindings is set
+        self.graph: Optional[ResourceGraph] = graph
+        self.restrict_bindings: bool = True
         # manage created web resources
         self._resources: dict[str, ResourceManager] = dict()
+        # number of resources kept by each resource node, by default and for specific nodes, see configure_resources
+        self.resource_capacity: int = ResourceManager.MAX_RESOURCE_SIZE
+        self.node_capacities: dict[str, int] = dict()
+        self.dedup_content: bool = False
         # manage equivalences
         self.equiv_manager: dict[str, EquivalenceManager] = {op.id: EquivalenceManager(op) for op in uni}
         self.equiv_generator: Optional[Randomize] = None
         # manage operation selection
-        self.op_selector: OperationManager = OperationManager(uni)
+        self.op_selector: OperationManager = OperationManager(uni, graph)
+        # resources created by the other processes of a parallel run, see src.parallel.ResourceChannel
+        self.channel = None
+
+    def __getstate__(self):
+        # the generator holds processes and threads, it is created again when a run is resumed
+        state = self.__dict__.copy()
+        state["equiv_generator"] = None
+        state["channel"] = None
+        return state
+
+    def restrict(self, op_ids: set[str]):
+        """only select the given operations, e.g. the shard of a worker of a parallel run"""
+        self.unique = [op for op in self.unique if op.id in op_ids]
+        self.op_selector = OperationManager(self.unique, self.graph)
 
     @classmethod
     def from_spec(cls, spec: str, server: str = None):
@@ -35,52 +59,101 @@ class Manager:
         spec_parser = ParserV3(spec, server)
         operations = spec_parser.extract()
         _logger.info(f"Number of operations: {len(operations)}")
-        return cls(operations)
+        return cls(operations, graph=ResourceGraph(operations, ResourceManager.SIMILARITY_THRESHOLD))
 
     @staticmethod
     def get_resource_node(path: str):
-        def remove_placeholder_in_right(_path: str):
-            if _path.endswith('/'):
-                return remove_placeholder_in_right(_path[:-1])
-            if _path.endswith('}'):
-                idx = _path.rfind('{')
-                return remove_placeholder_in_right(_path[:idx])
-            return _path
-
-        return remove_placeholder_in_right(path)
+        return resource_node_of(path)
+
+    def configure_resources(self, capacity: int = None, node_capacities: dict[str, int] = None, dedup_content: bool = None):
+        """
+        @param capacity: number of resources kept by a resource node, the oldest ones are evicted first
+        @param node_capacities: capacities of specific resource nodes, e.g. {"/users": 500}
+        @param dedup_content: also skip the resources without id whose content is already stored
+        """
+        if capacity is not None and capacity > 0:
+            self.resource_capacity = capacity
+        if node_capacities is not None:
+            self.node_capacities.update(node_capacities)
+        if dedup_content is not None:
+            self.dedup_content = dedup_content
+        for node, resource in self._resources.items():
+            resource.set_capacity(self.node_capacities.get(node, self.resource_capacity))
+            resource.dedup_content = self.dedup_content
 
     def add_resources(self, op_uri: str, responses: list):
         resource_node = self.get_resource_node(op_uri)
 
         if resource_node not in self._resources.keys():
-            self._resources[resource_node] = ResourceManager(resource_node=resource_node)
+            self._resources[resource_node] = ResourceManager(resource_node=resource_node,
+                                                             capacity=self.node_capacities.get(resource_node, self.resource_capacity),
+                                                             dedup_content=self.dedup_content)
+        new_names = set()
         for r in responses:
-            self._resources[resource_node].add_resource(r)
-
-    def get_binding_sources(self, consumer_op: str, factors: dict[str, list[str]], check_funcs: dict[str, Callable], producer_op: str = None) -> dict[str, tuple[str, str, float]]:
+            new_names.update(self._resources[resource_node].add_resource(r))
+        if self.graph is not None and len(new_names) > 0:
+            # fields the spec does not document also make the node a producer
+            self.graph.observe_fields(resource_node, new_names)
+        if self.channel is not None and len(responses) > 0:
+            self.channel.publish(op_uri, responses)
+
+    def sync_resources(self):
+        """add the resources published by the other processes since the last call"""
+        if self.channel is None:
+            return
+        channel, self.channel = self.channel, None
+        try:
+            for op_uri, responses in channel.receive():
+                self.add_resources(op_uri, responses)
+        finally:
+            self.channel = channel
+
+    def export_resources(self) -> list[tuple[str, list[dict]]]:
+        """the stored resources of each resource node, added to the pool of another manager by add_resources(node, resources)"""
+        return [(node, list(r._existing_resources)) for node, r in self._resources.items() if r.is_active]
+
+    def get_binding_sources(self, consumer_op: str, factors: dict[str, list[str]], check_funcs: dict[str, Callable], producer_op: str = None,
+                            consumer_id: str = None) -> dict[str, tuple[str, str, float]]:
+        """
+        @param consumer_op: path of the consumer operation
+        @param consumer_id: id of the consumer operation, its plausible producers in the resource graph are searched if given
+        """
         match_results = {g: list() for g in factors.keys()}
         consumer = self.get_resource_node(consumer_op)
-        for resource in self._resources.values():
+        producers = self.graph.producers_of(consumer_id) if self.graph is not None and self.restrict_bindings and consumer_id is not None else None
+        if producers is None:
+            resources = self._resources.values()
+        else:
+            resources = [self._resources[n] for n in sorted(producers) if n in self._resources]
+        for resource in resources:
             if resource.is_active:
                 for g_n, r in resource.match_value_source(factors, check_funcs, 0 if consumer == resource.resource_node else ResourceManager.SIMILARITY_THRESHOLD).items():
                     match_results[g_n].extend(r)
         return match_results
 
-    def retrieve_bound_value(self, bindings: list[Binding]) -> dict[str, dict[tuple, Any]]:
-        values: dict = dict()
-        for node, b_n in groupby(sorted(bindings, key=lambda b: b.resource_node), key=lambda b: b.resource_node):
-            values[node] = dict()
-            fields = [b.field for b in b_n]
-            # _logger.info(f"Retrieving values for {node} with fields {fields}")
-            temp = self._resources[node].retrieve_values(fields)
-            # _logger.info(f"Retrieved values: {temp}")
-            for f, v in temp.items():
-                values[node][f] = v
+    def retrieve_bound_value(self, bindings: Iterable[Binding], values: dict[str, dict[tuple, Any]] = None) -> dict[str, dict[tuple, Any]]:
+        """
+        values of the bound fields, the fields of a resource node are read from the same resource chosen at random
+        @param bindings: e.g. all the bindings of a covering array, retrieved in one pass
+        @param values: resource node -> field -> value, completed in place with the missing fields
+        """
+        if values is None:
+            values = dict()
+        accessors: dict[str, dict[tuple, FieldAccessor]] = dict()
+        for b in bindings:
+            node_values = values.get(b.resource_node)
+            if node_values is None or b.field not in node_values:
+                accessors.setdefault(b.resource_node, dict())[b.field] = b.accessor
+        for node, node_accessors in accessors.items():
+            values.setdefault(node, dict()).update(self._resources[node].retrieve_values(node_accessors.values()))
         return values
 
     def sample_equivalences(self, op_id: str, constraints: list[dict] = None, strength: int = None) -> list[dict[str, AbstractEquivalence]]:
         return self.equiv_manager[op_id].sample_with_constraints(self.equiv_generator, constraints, strength)
 
+    def prefetch_equivalences(self, op_id: str, constraints: list[dict] = None, strength: int = None) -> None:
+        self.equiv_manager[op_id].prefetch(self.equiv_generator, constraints, strength)
+
     def initialize_equiv(self, op_id):
         self.equiv_manager[op_id].initialize(self)
 
@@ -88,13 +161,85 @@ class Manager:
         return self.equiv_manager[op_id].mutate_equiv(factor)
 
 
+class FieldIndex:
+    """
+    Field paths observed in the resources of a node, maintained on insert and eviction.
+    A path is a tuple of keys, "_item" standing for the items of a list, e.g. ("owner", "id") or ("tags", "_item", "name").
+    Each path keeps the names it is matched by ("id" and "owner.id") and one observed value per type of value,
+    so that finding binding sources is a lookup over distinct paths instead of a walk over the stored resources.
+    """
+    # items of a list walked when indexing, the items of a list of resources usually share their structure
+    LIST_ITEMS = 3
+
+    def __init__(self):
+        # path -> number of stored resources having it, names, type name -> observed value
+        self._counts: dict[tuple[str, ...], int] = dict()
+        self._names: dict[tuple[str, ...], tuple[str, ...]] = dict()
+        self._samples: dict[tuple[str, ...], dict[str, Any]] = dict()
+
+    def __len__(self):
+        return len(self._counts)
+
+    def items(self):
+        for path, names in self._names.items():
+            yield path, names, self._samples[path].values()
+
+    @classmethod
+    def leaves(cls, resource, path: tuple[str, ...] = (), parent: str = None):
+        """(path, names, value) of the scalar fields of resource"""
+        if isinstance(resource, dict):
+            for key, value in resource.items():
+                key = str(key)
+                if isinstance(value, (dict, list)):
+                    yield from cls.leaves(value, path + (key,), key)
+                else:
+                    yield path + (key,), (key, f"{parent}.{key}") if parent is not None else (key,), value
+        elif isinstance(resource, list):
+            for item in resource[:cls.LIST_ITEMS]:
+                if isinstance(item, (dict, list)):
+                    yield from cls.leaves(item, path + ('_item',), parent)
+                elif parent is not None:
+                    # values of a list of scalars are bound through the list, see ResourceManager.retrieve_values
+                    yield path, (parent,), item
+
+    def add(self, resource) -> set[str]:
+        """index the paths of resource, return the names of the paths that were not indexed"""
+        observed = {path: (names, value) for path, names, value in self.leaves(resource)}
+        new_names = set()
+        for path, (names, value) in observed.items():
+            if path not in self._counts:
+                new_names.update(names)
+            self._counts[path] = self._counts.get(path, 0) + 1
+            self._names[path] = names
+            self._samples.setdefault(path, dict())[type(value).__name__] = value
+        return new_names
+
+    def remove(self, resource):
+        for path in set(p for p, _, _ in self.leaves(resource)):
+            count = self._counts.get(path, 0) - 1
+            if count > 0:
+                self._counts[path] = count
+            else:
+                self._counts.pop(path, None)
+                self._names.pop(path, None)
+                self._samples.pop(path, None)
+
+
 class ResourceManager:
     MAX_RESOURCE_SIZE = 100
     SIMILARITY_THRESHOLD = 0.60
 
-    def __init__(self, resource_node: str):
+    def __init__(self, resource_node: str, capacity: int = None, dedup_content: bool = False):
         self.resource_node = resource_node
-        self._existing_resources: list[Union[dict, str, float, int]] = list()
+        self.capacity = capacity if capacity is not None and capacity > 0 else self.MAX_RESOURCE_SIZE
+        self.dedup_content = dedup_content
+        # oldest first, evicted from the left when the capacity is exceeded
+        self._existing_resources: deque[dict] = deque()
+        # str(id) of the stored resources that have one, and digests of the content of the others when dedup_content is set
+        self._ids: set[str] = set()
+        self._digests: set[bytes] = set()
+        # field paths of the stored resources, matched with factors to find binding sources
+        self._fields = FieldIndex()
 
     @property
     def is_active(self):
@@ -110,24 +255,67 @@ class ResourceManager:
     def __str__(self):
         return f"ResourceManager({self.resource_node})"
 
+    @staticmethod
+    def _digest(resource: dict) -> Optional[bytes]:
+        try:
+            content = json.dumps(resource, sort_keys=True, default=str)
+        except (TypeError, ValueError):
+            # keys of different types can not be sorted
+            return None
+        return hashlib.blake2b(content.encode("utf-8"), digest_size=16).digest()
+
+    def _index_key(self, resource: dict) -> Optional[Union[str, bytes]]:
+        """str(id) of resource, or the digest of its content when it has no id and dedup_content is set"""
+        if "id" in resource.keys():
+            return str(resource["id"])
+        if self.dedup_content:
+            return self._digest(resource)
+        return None
+
     def is_duplicated(self, resource: dict):
         if not isinstance(resource, dict):
             return False
-        if "id" in resource.keys():
-            return str(resource["id"]) in set(str(r.get("id", -9944)) for r in self._existing_resources if isinstance(r, dict))
-
+        key = self._index_key(resource)
+        if isinstance(key, str):
+            return key in self._ids
+        if isinstance(key, bytes):
+            return key in self._digests
         return False
 
+    def _unindex(self, resource: dict):
+        self._fields.remove(resource)
+        key = self._index_key(resource)
+        if isinstance(key, str):
+            self._ids.discard(key)
+        elif isinstance(key, bytes):
+            self._digests.discard(key)
+
+    def set_capacity(self, capacity: int):
+        self.capacity = capacity
+        while len(self._existing_resources) > self.capacity:
+            self._unindex(self._existing_resources.popleft())
+
     # @time_count(_logger)
-    def add_resource(self, response):
+    def add_resource(self, response) -> set[str]:
+        """store the resources of a response, return the names of the field paths they add to the index"""
+        new_names = set()
+
         def atomic_add_resource(_r):
-            if self.is_duplicated(_r):
-                return
+            key = self._index_key(_r)
+            if isinstance(key, str):
+                if key in self._ids:
+                    return
+                self._ids.add(key)
+            elif isinstance(key, bytes):
+                if key in self._digests:
+                    return
+                self._digests.add(key)
 
             self._existing_resources.append(_r)
+            new_names.update(self._fields.add(_r))
             # control the size of the resources
-            if len(self._existing_resources) > self.MAX_RESOURCE_SIZE:
-                self._existing_resources.pop(0)
+            if len(self._existing_resources) > self.capacity:
+                self._unindex(self._existing_resources.popleft())
 
         if isinstance(response, list):
             for item in response:
@@ -141,92 +329,42 @@ class ResourceManager:
             atomic_add_resource(response)
         else:
             atomic_add_resource({self.resource_name: response})
+        return new_names
 
     def match_value_source(self, to_match: dict[str, list[str]], check_funcs: dict[str, Callable], threshold: float):
-        def operate_matching(r, path: list[str] = None, parent: str = None):
-            if path is None:
-                path = list()
-            if isinstance(r, dict):
-                for key, value in r.items():
-                    new_path = path + [key, ]
-                    if isinstance(value, dict) or isinstance(value, list):
-                        operate_matching(value, new_path[:], key)
-                    else:
-                        for g_n, match_list in to_match.items():
-                            if not check_funcs[g_n](value):
-                                continue
-                            for m in match_list:
-                                similarity = fuzz.token_set_ratio(m.lower(), key.lower()) / 100
-                                if similarity >= threshold:
-                                    results[g_n].append((new_path, similarity))
-                                    break
-                                elif parent is not None:
-                                    similarity = fuzz.token_set_ratio(m.lower(), f"{parent}.{key}".lower()) / 100
-                                    if similarity >= threshold:
-                                        results[g_n].append((new_path, similarity))
-                                        break
-
-            elif isinstance(r, list):
-                if len(r) > 0:
-                    item = random.choice(r)
-                    if isinstance(item, dict) or isinstance(item, list):
-                        operate_matching(item, path + ['_item'], parent)
-                    else:
-                        for g_n, match_list in to_match.items():
-                            if not check_funcs[g_n](item):
-                                continue
-                            if parent is not None:
-                                for m in match_list:
-                                    similarity = fuzz.token_set_ratio(m.lower(), parent.lower()) / 100
-                                    if similarity >= threshold:
-                                        results[g_n].append((path[:], similarity))
-                                        break
-            else:
-                if parent is not None:
-                    for g_n, match_list in to_match.items():
-                        for m in match_list:
-                            similarity = fuzz.token_set_ratio(m.lower(), parent.lower()) / 100
-                            if similarity >= threshold:
-                                results[g_n].append((path[:], similarity))
-                                break
-
-        if not self.is_active:
-            return dict()
-        resource = random.choice(self._existing_resources)
+        """
+        match the tokens of factors with the names of the field paths observed in the stored resources
+        @param to_match: f.global_name -> tokens of f, tried in order, the first one similar enough to a name of a path binds f to this path
+        @param check_funcs: f.global_name -> whether an observed value satisfies the constraints of f
+        @param threshold: minimal similarity
+        @return: f.global_name -> list of (resource node, path, similarity)
+        """
         results = {g: list() for g in to_match.keys()}
-        operate_matching(resource)
-        return {g: [(self.resource_node, tuple(f), p) for (f, p) in l] for g, l in results.items()}
-
-    def retrieve_values(self, fields: list[tuple]) -> dict[tuple[str, ...], Any]:
-        def find_value_by_path(_r, _path):
-            if len(_path) == 0:
-                if isinstance(_r, list) and len(_r) > 0:
-                    return random.choice(_r)
-                else:
-                    return _r
-            while len(_path) > 0:
-                if _r is None:
-                    return None
-                key = _path.pop(0)
-                if key == "_item":
-                    if isinstance(_r, list) and len(_r) > 0:
-                        _r = _r[0]
-                    else:
-                        return _r
-                else:
-                    if isinstance(_r, dict):
-                        _r = _r.get(key, None)
-                    else:
-                        return _r
-            if isinstance(_r, list) and len(_r) > 0:
-                return random.choice(_r)
-            return _r
-
-        values = dict()
+        fields = list(self._fields.items())
+        # similarities of all tokens and all names in one batch
+        rows, columns, similarities = similarity_matrix((m.lower() for match_list in to_match.values() for m in match_list),
+                                                        (n.lower() for _, names, _ in fields for n in names))
+        similarities = similarities.tolist()
+        for path, names, samples in fields:
+            name_columns = [columns[n.lower()] for n in names]
+            for g_n, match_list in to_match.items():
+                if not any(check_funcs[g_n](v) for v in samples):
+                    continue
+                for m in match_list:
+                    row = similarities[rows[m.lower()]]
+                    similarity = next((row[c] for c in name_columns if row[c] >= threshold), None)
+                    if similarity is not None:
+                        results[g_n].append((self.resource_node, path, similarity))
+                        break
+        return results
+
+    def retrieve_values(self, fields: Iterable[Union[tuple, FieldAccessor]]) -> dict[tuple[str, ...], Any]:
+        """values of fields (paths or their compiled accessors) in one of the stored resources chosen at random"""
         resource = random.choice(self._existing_resources)
-        for idx, f in enumerate(fields):
-            value = find_value_by_path(resource, list(f))
-            values[f] = value
+        values = dict()
+        for f in fields:
+            accessor = f if isinstance(f, FieldAccessor) else FieldAccessor.of(tuple(f))
+            values[accessor.field] = accessor.get(resource)
         return values
 
 
@@ -236,6 +374,13 @@ class EquivalenceManager:
 
         self.initialized_equivalences: dict[str, list[tuple[AbstractEquivalence, float]]] = dict()
         self.mutated_equivalences: dict[str, list[tuple[AbstractEquivalence, float]]] = dict()
+        # integer codes of the equivalences in covering arrays, forbidden tuples and monitors
+        self.table = EquivalenceTable()
+
+        # domains selected in advance for the next covering array, see prefetch
+        self._next_domains: Optional[tuple[list[str], list[list[int]]]] = None
+        # forbidden tuples of the monitor and their codes, the monitor replaces the list when they change
+        self._constraints: tuple[Optional[list[dict]], list[dict[str, int]]] = (None, [])
 
     @staticmethod
     def _set_random_values(_f: AbstractFactor, to_update: list[tuple[AbstractEquivalence, float]]):
@@ -301,12 +446,16 @@ class EquivalenceManager:
 
             if not factor.required:
                 e_list.append((Null(), 1))
+        self._next_domains = None
 
         # set binding equivalences
-        bindings = resource_manager.get_binding_sources(self.op.path.computed_to_string, to_match, check_funcs)
+        bindings = resource_manager.get_binding_sources(self.op.path.computed_to_string, to_match, check_funcs, consumer_id=self.op.id)
         for g_n, b_t in bindings.items():
             for node, field, prob in b_t:
                 self.initialized_equivalences[g_n].append((Binding(node, field), prob))
+        for e_list in self.initialized_equivalences.values():
+            for e, _ in e_list:
+                self.table.code(e)
         if _logger.isEnabledFor(DEBUG):
             for g_n, e_list in self.initialized_equivalences.items():
                 _logger.debug(f"Initialized equivalences for {g_n}: {e_list}")
@@ -317,9 +466,11 @@ class EquivalenceManager:
             case[g_n] = random.choices(e_list, weights=[x[1] for x in e_list], k=1)[0][0]
         return case
 
-    def sample_with_constraints(self, generator, constraints: list[dict[str, str]], strength: int = None) -> list[dict[str, AbstractEquivalence]]:
-        if constraints is None:
-            return [self.sample(), ]
+    def _select_domains(self) -> tuple[list[str], list[list[int]]]:
+        """factors and codes of at most 20 equivalences of each factor, to be combined by the covering array"""
+        if self._next_domains is not None:
+            selected, self._next_domains = self._next_domains, None
+            return selected
 
         factors = []
         equivalences = []
@@ -332,15 +483,38 @@ class EquivalenceManager:
                 selects = [e_list[i] for i in selects]
             else:
                 selects = e_list
-            equivalences.append([str(e[0]) for e in selects])
-        cases: list[dict[str, str]] = generator.handle(op_id=self.op.id,
+            equivalences.append([self.table.code(e[0]) for e in selects])
+        return factors, equivalences
+
+    def _encode_constraints(self, constraints: list[dict]) -> list[dict[str, int]]:
+        """codes of the forbidden tuples, which hold equivalences when the monitors are not given the table of the operation"""
+        source, encoded = self._constraints
+        if source is not constraints:
+            encoded = [self.table.encode(t) for t in constraints]
+            self._constraints = (constraints, encoded)
+        return encoded
+
+    def prefetch(self, generator, constraints: list[dict[str, str]], strength: int = None) -> None:
+        """select the domains of the next covering array now, so that the generator can build it in background"""
+        # selecting the domains draws random numbers, it is skipped when the generator would ignore them
+        if constraints is None or not generator.supports_prefetch:
+            return
+        self._next_domains = self._select_domains()
+        factors, equivalences = self._next_domains
+        generator.prefetch(op_id=self.op.id, factors=factors, domains=equivalences, forbidden_tuples=self._encode_constraints(constraints), strength=strength)
+
+    def sample_with_constraints(self, generator, constraints: list[dict[str, str]], strength: int = None) -> list[dict[str, AbstractEquivalence]]:
+        if constraints is None:
+            return [self.sample(), ]
+
+        factors, equivalences = self._select_domains()
+        cases: list[dict[str, int]] = generator.handle(op_id=self.op.id,
                                                        factors=factors,
                                                        domains=equivalences,
-                                                       forbidden_tuples=constraints,
+                                                       forbidden_tuples=self._encode_constraints(constraints),
                                                        strength=strength)
-        transformed = []
-        for c in cases:
-            transformed.append({factors[i]: self.initialized_equivalences[factors[i]][equivalences[i].index(c[factors[i]])][0] for i in range(len(factors))})
+        equivalence = self.table.equivalence
+        transformed = [{f: equivalence(c[f]) for f in factors} for c in cases if len(c) > 0 or len(factors) == 0]
         if len(transformed) == 0:
             return [self.sample(), ]
         return transformed
@@ -366,21 +540,27 @@ class EquivalenceManager:
 class OperationManager:
     NUM_RETRIES = 3
 
-    def __init__(self, operations: list[RestOp]):
+    def __init__(self, operations: list[RestOp], graph: ResourceGraph = None):
         self.operations = [op for op in operations]
-        self.CUR_OPS, self.D_OPS = OperationManager.sort(operations)
+        self._graph = graph
+        self.CUR_OPS, self.D_OPS = OperationManager.sort(operations, graph)
         self._failed: list[RestOp] = []
         self._counter: dict[str, int] = {op.id: 0 for op in operations}
 
         self._buggy_operations = self.CUR_OPS + self.D_OPS
 
     @staticmethod
-    def sort(operations: list[RestOp]) -> tuple[list[RestOp], list[RestOp]]:
+    def sort(operations: list[RestOp], graph: ResourceGraph = None) -> tuple[list[RestOp], list[RestOp]]:
+        """
+        shorter paths first, POST first among the operations of the same path length,
+        then the operations whose resources may be bound by more operations according to graph
+        """
         def sort_key(_op):
             verb_priority = 1 if _op.verb == Method.POST else 0
             url_priority = - len(_op.path.elements)
+            producer_priority = graph.out_degree(_op) if graph is not None else 0
 
-            return url_priority, verb_priority
+            return url_priority, verb_priority, producer_priority
 
         cur = []
         d = []
@@ -396,7 +576,7 @@ class OperationManager:
         if len(self.CUR_OPS) > 0:
             to_execute = self.CUR_OPS.pop(0)
         elif len(self._failed) > 0:
-            CUR_OPS, D_OPS = OperationManager.sort(self._failed)
+            CUR_OPS, D_OPS = OperationManager.sort(self._failed, self._graph)
             self._failed.clear()
             if len(CUR_OPS) > 0:
                 self.CUR_OPS.extend(CUR_OPS)
@@ -1,9 +1,8 @@
 from dataclasses import dataclass
 from typing import Optional, Union, Any
 
-from fuzzywuzzy import fuzz
-
 from src.nlp import remove_punctuation
+from src.similarity import similarity_matrix, token_set_similarity
 
 
 @dataclass(frozen=True)
@@ -114,9 +113,9 @@ class MatchInSchema:
             for p in schema.properties:
                 MatchInSchema.match_similar_name(p, name, results, depth - 1)
         else:
-            p = fuzz.token_set_ratio(remove_punctuation(name).lower(), remove_punctuation(schema.name).lower())
-            if p >= 80:
-                results.append(MatchResult(schema.global_name, schema.__class__.__name__, p / 100, depth))
+            p = token_set_similarity(remove_punctuation(name).lower(), remove_punctuation(schema.name).lower())
+            if p >= 0.8:
+                results.append(MatchResult(schema.global_name, schema.__class__.__name__, p, depth))
 
     @staticmethod
     def match_exact_name_for_multiple_factors(schema, name_mappings: dict[str, str],
@@ -230,12 +229,15 @@ class MatchInSchema:
 
     @staticmethod
     def match_similar_name_for_multiple_factors(schema, name_mappings: dict[str, str],
-                                                results: dict[str, list[MatchResult]], depth: dict[str, int]) -> None:
+                                                results: dict[str, list[MatchResult]], depth: dict[str, int],
+                                                leaves: list = None) -> None:
         """
         @param schema: response definition
         @param name_mappings: f.global_name -> f.name
         @param results: f.global_name -> MatchResult list
         @param depth: matching depth for each f respectively, f.global_name -> depth
+        @param leaves: leaves of the schema reached by the recursion, with the factors to compare with them,
+        the similarities of all of them are computed in one batch by the outermost call
         @return: None, results is the target
         """
         from src.factor import ObjectFactor, ArrayFactor
@@ -246,13 +248,18 @@ class MatchInSchema:
         if len(depth) == 0 or all([d == 0 for d in depth.values()]):
             return
 
+        outermost = leaves is None
+        if outermost:
+            leaves = list()
+
         if isinstance(schema, ArrayFactor):
             updated_depth = {k: v - 1 for k, v in depth.items()}
             MatchInSchema.match_similar_name_for_multiple_factors(
                 schema.item,
                 {k: v for k, v in name_mappings.items() if updated_depth.get(k, 0) > 0},
                 results,
-                updated_depth
+                updated_depth,
+                leaves
             )
         elif isinstance(schema, ObjectFactor):
             updated_depth = {k: v - 1 for k, v in depth.items()}
@@ -261,13 +268,21 @@ class MatchInSchema:
                     p,
                     {k: v for k, v in name_mappings.items() if updated_depth.get(k, 0) > 0},
                     results,
-                    updated_depth
+                    updated_depth,
+                    leaves
                 )
         else:
-            for k, v in name_mappings.items():
-                p = fuzz.token_set_ratio(v.lower(), remove_punctuation(schema.name.lower()))
-                if p >= 80:
-                    results[k].append(MatchResult(schema.global_name, schema.__class__.__name__, p / 100, depth[k]))
+            leaves.append((schema, [(k, v.lower(), depth[k]) for k, v in name_mappings.items()]))
+
+        if outermost and len(leaves) > 0:
+            rows, columns, similarities = similarity_matrix((v for _, factors in leaves for _, v, _ in factors),
+                                                            (remove_punctuation(leaf.name.lower()) for leaf, _ in leaves))
+            for leaf, factors in leaves:
+                column = columns[remove_punctuation(leaf.name.lower())]
+                for k, v, d in factors:
+                    p = float(similarities[rows[v], column])
+                    if p >= 0.8:
+                        results[k].append(MatchResult(leaf.global_name, leaf.__class__.__name__, p, d))
 
 
 class MatchInJson:
@@ -2,12 +2,13 @@ import abc
 import os
 import time
 from logging import getLogger
-from typing import Any
+from typing import Any, Optional
 
 import numpy as np
 import pandas as pd
 
-from src.response import handle_response
+from src.equivalence import EquivalenceTable
+from src.response import Fragmentizer, handle_response
 
 _logger = getLogger(__name__)
 
@@ -22,17 +23,119 @@ class Report(metaclass=abc.ABCMeta):
         pass
 
 
+class WindowStore:
+    """
+    Windows of an operation, i.e., the status codes of the test cases generated each time and the time they took.
+    The last `retention` windows are kept in a ring buffer (all of them if retention is None), totals and moving averages
+    are maintained on-line, and the full history can be appended to a file instead of being kept in memory.
+    """
+    COLUMNS = ("20X", "40X", "500")
+    _INIT_CAPACITY = 64
+    # smoothing factor of the moving averages of the status code rates
+    _ALPHA = 0.2
+
+    def __init__(self, start: float, retention: int = None, spill_file: str = None):
+        self._retention = retention if retention is not None and retention > 0 else None
+        capacity = self._retention if self._retention is not None else WindowStore._INIT_CAPACITY
+        self._counts: np.ndarray = np.zeros((capacity, len(WindowStore.COLUMNS)), dtype=np.int64)
+        self._durations: np.ndarray = np.zeros(capacity, dtype=np.float64)
+        self._last_time = start
+        self._spill_file = spill_file
+
+        self.num_windows = 0
+        self.totals: np.ndarray = np.zeros(len(WindowStore.COLUMNS), dtype=np.int64)
+        self.total_duration = 0.0
+        self.moving_rates: np.ndarray = np.zeros(len(WindowStore.COLUMNS), dtype=np.float64)
+        # (counts, duration) of the last window
+        self.last: tuple[tuple[int, ...], float] = (tuple(0 for _ in WindowStore.COLUMNS), 0.0)
+
+    @property
+    def rates(self) -> np.ndarray:
+        """share of each status code class over all windows"""
+        total = self.totals.sum()
+        return self.totals / total if total > 0 else np.zeros(len(WindowStore.COLUMNS))
+
+    @property
+    def mean_duration(self) -> float:
+        return self.total_duration / self.num_windows if self.num_windows > 0 else 0.0
+
+    def append(self, counts: tuple[int, ...], timestamp: float):
+        duration = timestamp - self._last_time
+        self._last_time = timestamp
+
+        if self._retention is not None:
+            slot = self.num_windows % self._retention
+        else:
+            slot = self.num_windows
+            if slot == len(self._durations):
+                self._counts = np.concatenate((self._counts, np.zeros_like(self._counts)))
+                self._durations = np.concatenate((self._durations, np.zeros_like(self._durations)))
+        self._counts[slot] = counts
+        self._durations[slot] = duration
+        self.last = (tuple(counts), duration)
+
+        self.totals += counts
+        self.total_duration += duration
+        n = sum(counts)
+        if n > 0:
+            rates = np.asarray(counts, dtype=np.float64) / n
+            self.moving_rates = rates if self.num_windows == 0 else WindowStore._ALPHA * rates + (1 - WindowStore._ALPHA) * self.moving_rates
+
+        if self._spill_file is not None:
+            new_file = not os.path.exists(self._spill_file)
+            with open(self._spill_file, 'a') as f:
+                if new_file:
+                    f.write("window,duration," + ",".join(WindowStore.COLUMNS) + "\n")
+                f.write(f"{self.num_windows},{duration!r}," + ",".join(str(c) for c in counts) + "\n")
+        self.num_windows += 1
+
+    def retained(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(window numbers, counts, durations) of the windows kept in memory, oldest first"""
+        if self._retention is None or self.num_windows <= self._retention:
+            n = self.num_windows
+            return np.arange(n), self._counts[:n].copy(), self._durations[:n].copy()
+        shift = -(self.num_windows % self._retention)
+        return (np.arange(self.num_windows - self._retention, self.num_windows),
+                np.roll(self._counts, shift, axis=0), np.roll(self._durations, shift))
+
+    def truncate_spill(self):
+        """drop the spilled windows recorded after this store was saved, when a run is resumed from a snapshot"""
+        if self._spill_file is None or not os.path.exists(self._spill_file):
+            return
+        df = pd.read_csv(self._spill_file)
+        df[df["window"] < self.num_windows].to_csv(self._spill_file, index=False)
+
+    def history(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(window numbers, counts, durations) of all windows if they are spilled to the file, otherwise the retained ones"""
+        if self._spill_file is None or not os.path.exists(self._spill_file):
+            return self.retained()
+        df = pd.read_csv(self._spill_file)
+        return df["window"].to_numpy(), df[list(WindowStore.COLUMNS)].to_numpy(dtype=np.int64), df["duration"].to_numpy(dtype=np.float64)
+
+
 class Statistics(Report):
-    def __init__(self, operations: list[str]):
+    def __init__(self, operations: list[str], window_retention: int = None, spill_dir: str = None):
+        """
+        @param window_retention: number of windows of each operation kept in memory, None keeps all of them
+        @param spill_dir: if given, the windows of each operation are also appended to a file in it, and reported from there
+        """
         self.status_code: dict[str, dict[str, int]] = {op: {"20X": 0, "40X": 0, "500": 0} for op in operations}
 
-        self.time_budget = {op: [time.time(), ] for op in operations}
-
         self.error_monitors: dict[str, ErrorMonitor] = {op: ErrorMonitor(op) for op in operations}
         self.bug_monitors: dict[str, ErrorMonitor] = {op: ErrorMonitor(op) for op in operations}
+        self.fragmentizers: dict[str, Fragmentizer] = {op: Fragmentizer() for op in operations}
+        # op -> codes of the equivalences counted by its monitors, see update
+        self.tables: dict[str, EquivalenceTable] = dict()
 
         # Window-based trend monitoring, the window size is controlled by the number of test cases generated each time
-        self.status_code_by_windows = {op: {"20X": [], "40X": [], "500": []} for op in operations}
+        if spill_dir is not None:
+            os.makedirs(spill_dir, exist_ok=True)
+        start = time.time()
+        self.windows: dict[str, WindowStore] = {
+            op: WindowStore(start, window_retention,
+                            os.path.join(spill_dir, f"{self.remove_slash_in_name(op)}.csv") if spill_dir is not None else None)
+            for op in operations
+        }
 
         self._current_op = None
         self._repeat_of_current_op = 0
@@ -45,7 +148,14 @@ class Statistics(Report):
                assignments: list[dict[str, str]],
                status_codes: list[int],
                responses: list[Any],
-               with_error: bool):
+               with_error: bool,
+               table: EquivalenceTable = None):
+        """
+        @param table: codes of the equivalences of op_id, the monitors count the codes of the equivalences instead of the equivalences
+        """
+        if table is not None:
+            self.tables[op_id] = table
+            equivalences = [table.encode(e) for e in equivalences]
         if self._current_op != op_id:
             self._current_op = op_id
             self._repeat_of_current_op = 0
@@ -62,7 +172,8 @@ class Statistics(Report):
         existed_error_messages = self.error_monitors[op_id].get_error_fragments()
         existed_bug_messages = self.bug_monitors[op_id].get_error_fragments()
         fragments_in_40x, fragments_in_50x, error_fragment_map_parameters, bug_fragment_map_parameters = handle_response(tokens, equivalences, assignments, status_codes, responses,
-                                                                                                                         existed_error_messages, existed_bug_messages)
+                                                                                                                         existed_error_messages, existed_bug_messages,
+                                                                                                                         fragmentizer=self.fragmentizers[op_id])
 
         num_20x = 0
         num_40x = 0
@@ -81,15 +192,29 @@ class Statistics(Report):
         self.status_code[op_id]["40X"] += num_40x
         self.status_code[op_id]["500"] += num_500
 
-        self.status_code_by_windows[op_id]["20X"].append(num_20x)
-        self.status_code_by_windows[op_id]["40X"].append(num_40x)
-        self.status_code_by_windows[op_id]["500"].append(num_500)
-
-        self.time_budget[op_id].append(time.time())
+        self.windows[op_id].append((num_20x, num_40x, num_500), time.time())
 
         self.error_monitors[op_id].update(equivalences, fragments_in_40x, error_fragment_map_parameters)
         self.bug_monitors[op_id].update(equivalences, fragments_in_50x, error_fragment_map_parameters)
 
+    def adopt(self, other: "Statistics", operations: list[str]):
+        """take the results of operations from other, e.g. from the worker of a parallel run that tested them"""
+        for op in operations:
+            self.status_code[op] = other.status_code[op]
+            self.error_monitors[op] = other.error_monitors[op]
+            self.bug_monitors[op] = other.bug_monitors[op]
+            self.fragmentizers[op] = other.fragmentizers[op]
+            self.windows[op] = other.windows[op]
+            if op in other.tables:
+                self.tables[op] = other.tables[op]
+
+    def decode_tuples(self, op_id: str, tuples: list[dict]) -> list[dict[str, str]]:
+        """ids of the equivalences of forbidden tuples, for the reports"""
+        table = self.tables.get(op_id)
+        if table is None:
+            return [{f: str(e) for f, e in t.items()} for t in tuples]
+        return [table.decode(t) for t in tuples]
+
     def should_stop(self, op_id: str, stage: str):
         if self._repeat_of_current_op > 10:
             return True
@@ -121,19 +246,41 @@ class Statistics(Report):
         status_code_df = pd.DataFrame.from_dict(self.status_code, orient='index')
         status_code_df.to_csv(os.path.join(directory, 'status_codes.csv'))
 
-        # Save time budget to a CSV file
-        time_budget_df = pd.DataFrame(dict([(k, pd.Series(v)) for k, v in self.time_budget.items()]))
-        # series i - (i - 1)
-        time_budget_df = time_budget_df.diff().dropna()
+        histories = {op: w.history() for op, w in self.windows.items()}
+
+        # Save time budget to a CSV file, row i is the time spent on the i-th window
+        time_budget_df = pd.DataFrame({op: pd.Series(durations, index=numbers + 1) for op, (numbers, _, durations) in histories.items()})
+        time_budget_df = time_budget_df.dropna()
         time_budget_df.to_csv(os.path.join(directory, 'time_budget.csv'))
 
+        # Save on-line aggregates of the windows to a CSV file
+        summary_df = pd.DataFrame.from_dict({
+            op: {"windows": w.num_windows, "mean_duration": w.mean_duration,
+                 **{f"rate_{c}": r for c, r in zip(WindowStore.COLUMNS, w.rates)},
+                 **{f"moving_rate_{c}": r for c, r in zip(WindowStore.COLUMNS, w.moving_rates)}}
+            for op, w in self.windows.items()
+        }, orient='index')
+        summary_df.to_csv(os.path.join(directory, 'windows_summary.csv'))
+
+        # Save connection pool statistics of the http transport to a CSV file
+        transport = kwargs.get("transport", None)
+        if transport is not None:
+            transport_df = pd.DataFrame.from_dict(transport, orient='index')
+            transport_df.to_csv(os.path.join(directory, 'transport.csv'))
+
+        # Save hit/miss counters of the covering array cache to a CSV file
+        generator = kwargs.get("generator", None)
+        if generator is not None:
+            generator_df = pd.DataFrame([generator])
+            generator_df.to_csv(os.path.join(directory, 'covering_array_cache.csv'), index=False)
+
         # Save status codes by windows to a CSV file
-        for op, codes in self.status_code_by_windows.items():
+        for op, (numbers, counts, _) in histories.items():
             # Create subdirectory for each operation
             op_dir = os.path.join(directory, self.remove_slash_in_name(op))
             os.makedirs(op_dir, exist_ok=True)
 
-            codes_df = pd.DataFrame(codes)
+            codes_df = pd.DataFrame(counts, columns=list(WindowStore.COLUMNS), index=numbers)
             codes_df.to_csv(os.path.join(op_dir, 'status_code_by_windows.csv'))
 
         # Save error monitors and bug monitors details
@@ -142,40 +289,50 @@ class Statistics(Report):
             op_dir = os.path.join(directory, self.remove_slash_in_name(op))
             os.makedirs(op_dir, exist_ok=True)
 
-            forbidden_tuples = monitor.get_forbidden_tuples(threshold=0.5)  # Example threshold
+            forbidden_tuples = self.decode_tuples(op, monitor.get_forbidden_tuples(threshold=0.5))  # Example threshold
             forbidden_tuples_df = pd.DataFrame(forbidden_tuples)
             forbidden_tuples_df.to_csv(os.path.join(op_dir, 'error_monitors_forbidden_tuples.csv'))
 
             for m in monitor.cp_models:
-                m.report(os.path.join(op_dir, 'model', "error"))
+                m.report(os.path.join(op_dir, 'model', "error"), self.tables.get(op))
 
         for op, monitor in self.bug_monitors.items():
             # Create subdirectory for each operation
             op_dir = os.path.join(directory, self.remove_slash_in_name(op))
             os.makedirs(op_dir, exist_ok=True)
 
-            forbidden_tuples = monitor.get_forbidden_tuples(threshold=0.7)  # Example threshold
+            forbidden_tuples = self.decode_tuples(op, monitor.get_forbidden_tuples(threshold=0.7))  # Example threshold
             forbidden_tuples_df = pd.DataFrame(forbidden_tuples)
             forbidden_tuples_df.to_csv(os.path.join(op_dir, 'bug_monitors_forbidden_tuples.csv'))
 
             for m in monitor.cp_models:
-                m.report(os.path.join(op_dir, 'model', "bug"))
+                m.report(os.path.join(op_dir, 'model', "bug"), self.tables.get(op))
 
 
 class ErrorMonitor:
     class CondProbModel(Report):
         _STEP = 1
         _INIT_SAMPLE = 0
+        _INIT_CAPACITY = 16
 
         def __init__(self, op_id: str, factors: list[str], fragment: str):
             self.op_id: str = op_id
             self.factors: tuple[str] = tuple(factors)
             self.fragment: str = fragment
 
-            # Increase computational efficiency
-            self.stats_map_index: dict[tuple[str], int] = dict()
-            self.index_map_T: list = []
-            self.index_map_F: list = []
+            # counters of T (the fragment is triggered) and F cases of each tuple of equivalences (their codes, see EquivalenceTable),
+            # contiguous arrays grown by doubling, the first self.size entries are used
+            self.stats_map_index: dict[tuple[int, ...], int] = dict()
+            self._keys: list[tuple[int, ...]] = []
+            self._T: np.ndarray = np.zeros(ErrorMonitor.CondProbModel._INIT_CAPACITY, dtype=np.int64)
+            self._F: np.ndarray = np.zeros(ErrorMonitor.CondProbModel._INIT_CAPACITY, dtype=np.int64)
+
+            # forbidden tuples are maintained incrementally for the thresholds asked so far:
+            # only the tuples counted since the last evaluation are compared with the thresholds again
+            self._dirty: list[np.ndarray] = []
+            self._selected: dict[float, np.ndarray] = dict()
+            self._forbidden: dict[float, list[dict[str, str]]] = dict()
+            self._changed: set[float] = set()
 
         def __str__(self):
             return f'ErrorMonitor({self.op_id}, {self.fragment})'
@@ -183,66 +340,118 @@ class ErrorMonitor:
         def __repr__(self):
             return self.__str__()
 
-        def add_T_case(self, assignment: dict[str, str]):
-            e_ids = tuple(assignment[f] for f in self.factors)
-            if e_ids not in self.stats_map_index.keys():
-                idx = len(self.index_map_T)
+        @property
+        def size(self) -> int:
+            return len(self._keys)
+
+        @property
+        def index_map_T(self) -> np.ndarray:
+            return self._T[:self.size]
+
+        @property
+        def index_map_F(self) -> np.ndarray:
+            return self._F[:self.size]
+
+        def _index_of(self, e_ids: tuple[int, ...]) -> int:
+            idx = self.stats_map_index.get(e_ids)
+            if idx is None:
+                idx = self.size
+                if idx == len(self._T):
+                    self._T = np.concatenate((self._T, np.zeros(idx, dtype=np.int64)))
+                    self._F = np.concatenate((self._F, np.zeros(idx, dtype=np.int64)))
+                self._T[idx] = ErrorMonitor.CondProbModel._INIT_SAMPLE
+                self._F[idx] = ErrorMonitor.CondProbModel._INIT_SAMPLE
                 self.stats_map_index[e_ids] = idx
-                self.index_map_T.append(ErrorMonitor.CondProbModel._INIT_SAMPLE + ErrorMonitor.CondProbModel._STEP)
-                self.index_map_F.append(ErrorMonitor.CondProbModel._INIT_SAMPLE)
-            else:
-                idx = self.stats_map_index[e_ids]
-                self.index_map_T[idx] += ErrorMonitor.CondProbModel._STEP
+                self._keys.append(e_ids)
+            return idx
+
+        def add_cases(self, assignments: list[dict[str, str]], triggered: list[bool]):
+            """count a batch of cases, triggered[i] tells whether the i-th case triggers the fragment"""
+            if len(assignments) == 0:
+                return
+            idx = np.fromiter((self._index_of(tuple(a[f] for f in self.factors)) for a in assignments), dtype=np.intp, count=len(assignments))
+            triggered = np.asarray(triggered, dtype=bool)
+            np.add.at(self._T, idx[triggered], ErrorMonitor.CondProbModel._STEP)
+            np.add.at(self._F, idx[~triggered], ErrorMonitor.CondProbModel._STEP)
+            self._dirty.append(idx)
+
+        def add_T_case(self, assignment: dict[str, str]):
+            self.add_cases([assignment], [True])
 
         def add_F_case(self, assignment: dict[str, str]):
-            e_ids = tuple(assignment[f] for f in self.factors)
-            if e_ids not in self.stats_map_index.keys():
-                idx = len(self.index_map_T)
-                self.stats_map_index[e_ids] = idx
-                self.index_map_F.append(ErrorMonitor.CondProbModel._INIT_SAMPLE + ErrorMonitor.CondProbModel._STEP)
-                self.index_map_T.append(ErrorMonitor.CondProbModel._INIT_SAMPLE)
-            else:
-                idx = self.stats_map_index[e_ids]
-                self.index_map_F[idx] += ErrorMonitor.CondProbModel._STEP
+            self.add_cases([assignment], [False])
 
         def update(self, data: list[dict], fragments: list[set[str]]):
+            assignments = []
+            triggered = []
             for entry, f_set in zip(data, fragments):
                 if any(entry.get(f, None) is None for f in self.factors):
                     continue
-                if self.fragment in f_set:
-                    self.add_T_case(entry)
-                else:
-                    self.add_F_case(entry)
+                assignments.append(entry)
+                triggered.append(self.fragment in f_set)
+            self.add_cases(assignments, triggered)
             self.update_max_prob()
 
         def update_max_prob(self):
             pass
 
-        def get_forbidden_tuples(self, threshold: float, with_prob: bool = False):
-            T = np.array(self.index_map_T)
-            F = np.array(self.index_map_F)
-            prob_array = T / (T + F)
+        def _sync(self):
+            """compare the tuples counted since the last call with the thresholds"""
+            if len(self._dirty) == 0:
+                return
+            dirty = np.unique(np.concatenate(self._dirty))
+            self._dirty = []
+            T = self._T[dirty]
+            prob_array = T / (T + self._F[dirty])
+            for threshold, mask in self._selected.items():
+                if len(mask) < len(self._T):
+                    mask = np.concatenate((mask, np.zeros(len(self._T) - len(mask), dtype=bool)))
+                    self._selected[threshold] = mask
+                selected = prob_array >= threshold
+                if np.any(mask[dirty] != selected):
+                    mask[dirty] = selected
+                    self._forbidden.pop(threshold, None)
+                    self._changed.add(threshold)
+
+        def _select(self, threshold: float) -> list[dict[str, str]]:
+            self._sync()
+            if threshold not in self._selected:
+                mask = np.zeros(len(self._T), dtype=bool)
+                T = self.index_map_T
+                mask[:self.size] = T / (T + self.index_map_F) >= threshold
+                self._selected[threshold] = mask
+                self._changed.add(threshold)
+            if threshold not in self._forbidden:
+                self._forbidden[threshold] = [dict(zip(self.factors, self._keys[idx])) for idx in np.flatnonzero(self._selected[threshold])]
+            return self._forbidden[threshold]
+
+        def refresh(self, threshold: float) -> bool:
+            """bring the forbidden tuples at threshold up to date, return whether they changed since the last refresh"""
+            self._select(threshold)
+            changed = threshold in self._changed
+            self._changed.discard(threshold)
+            return changed
 
-            idxs = np.where(prob_array >= threshold)[0]
+        def get_forbidden_tuples(self, threshold: float, with_prob: bool = False):
+            if not with_prob:
+                return list(self._select(threshold))
 
-            if with_prob:
-                return [(dict(zip(self.factors, e_ids)), prob_array[idx]) for e_ids, idx in self.stats_map_index.items() if idx in idxs]
-            else:
-                return [dict(zip(self.factors, e_ids)) for e_ids, idx in self.stats_map_index.items() if idx in idxs]
+            T = self.index_map_T
+            prob_array = T / (T + self.index_map_F)
+            return [(dict(zip(self.factors, self._keys[idx])), prob_array[idx]) for idx in np.flatnonzero(prob_array >= threshold)]
 
-        def report(self, directory: str):
+        def report(self, directory: str, table: Optional[EquivalenceTable] = None):
             os.makedirs(directory, exist_ok=True)
 
             # create DataFrame
-            index = sorted(list(self.stats_map_index.items()), key=lambda x: x[1])
-            T = np.array(self.index_map_T)
-            F = np.array(self.index_map_F)
+            T = self.index_map_T
+            F = self.index_map_F
             prob_array = T / (T + F)
             data = {
-                'Index': [x[0] for x in index],
-                'T': self.index_map_T,
-                'F': self.index_map_F,
-                'P': prob_array.tolist()
+                'Index': [table.decode_key(k) for k in self._keys] if table is not None else list(self._keys),
+                'T': T,
+                'F': F,
+                'P': prob_array
             }
             df = pd.DataFrame(data)
 
@@ -267,34 +476,36 @@ class ErrorMonitor:
             self._models: list[ErrorMonitor.CondProbModel] = [ErrorMonitor.CondProbModel(op_id, [p], fragment) for p in all_parameters]
 
             self._max_probs: np.array = np.array([0.0] * len(self._models))
+            # threshold -> index of the model whose forbidden tuples were returned by the last refresh
+            self._choices: dict[float, int] = dict()
 
-        def add_T_case(self, assignment: dict[str, str]):
-            for m in self._models:
-                m.add_T_case(assignment)
-
-        def add_F_case(self, assignment: dict[str, str]):
+        def add_cases(self, assignments: list[dict[str, str]], triggered: list[bool]):
             for m in self._models:
-                m.add_F_case(assignment)
+                m.add_cases(assignments, triggered)
 
         def update_max_prob(self):
             """update the max prob of allErrorMonitor.Models"""
             for i, m in enumerate(self._models):
-                T: np.array = np.array(m.index_map_T)
-                F = np.array(m.index_map_F)
+                if m.size == 0:
+                    continue
+                T = m.index_map_T
+                s = T + m.index_map_F
 
                 # Exclude outliers, for example, T = [12, 508], F = [0, 600]. The first one has not been used for a long time, but its trigger probability is 1
-                # For such anomalies, set T to 0 and F to 1, so that the probability of triggering an error is always 0
+                # For such anomalies, the probability of triggering an error is always 0
                 # Abnormal: (T+F) * 5 < np.max(T + F)
-                s = T + F
-                max_s = np.max(s)
-                excluded = np.where(s * 5 < max_s)[0]
-                for idx in excluded:
-                    T[idx] = 0
-                    F[idx] = 1
-                    s[idx] = 1
+                prob = np.where(s * 5 < s.max(), 0.0, T / s)
+                self._max_probs[i] = prob.max()
 
-                prob = T / s
-                self._max_probs[i] = np.max(prob)
+        def refresh(self, threshold: float) -> bool:
+            changed = [m.refresh(threshold) for m in self._models]
+            if len(self._max_probs) == 0:
+                return False
+            idx = int(np.argmax(self._max_probs))
+            if self._choices.get(threshold) != idx:
+                self._choices[threshold] = idx
+                return True
+            return changed[idx]
 
         def get_forbidden_tuples(self, threshold: float, with_prob: bool = False):
             if len(self._max_probs) == 0:
@@ -302,7 +513,7 @@ class ErrorMonitor:
             idx = np.argmax(self._max_probs)
             return self._models[idx].get_forbidden_tuples(threshold, with_prob)
 
-        def report(self, directory: str):
+        def report(self, directory: str, table: Optional[EquivalenceTable] = None):
             os.makedirs(directory, exist_ok=True)
 
             with open(os.path.join(directory, f'{hash(self.fragment)}.txt'), 'a+') as f:
@@ -314,15 +525,14 @@ class ErrorMonitor:
 
                 for m in self._models:
                     # create DataFrame
-                    index = sorted(list(m.stats_map_index.items()), key=lambda x: x[1])
-                    T = np.array(m.index_map_T)
-                    F = np.array(m.index_map_F)
+                    T = m.index_map_T
+                    F = m.index_map_F
                     prob_array = T / (T + F)
                     data = {
-                        'Index': [x[0] for x in index],
-                        'T': m.index_map_T,
-                        'F': m.index_map_F,
-                        'P': prob_array.tolist()
+                        'Index': [table.decode_key(k) for k in m._keys] if table is not None else list(m._keys),
+                        'T': T,
+                        'F': F,
+                        'P': prob_array
                     }
                     df = pd.DataFrame(data)
 
@@ -340,8 +550,12 @@ class ErrorMonitor:
         self.cp_models: list[ErrorMonitor.CondProbModel] = list()  # key: fragment, value: list of models
 
         self.all_fragments: set = set()
+        self.last_discovered: set = set()
         self.since_last_discover: int = 0
 
+        # threshold -> (version, forbidden tuples), the version is increased when the forbidden tuples change
+        self._constraints: dict[float, tuple[int, list[dict[str, str]]]] = dict()
+
     def update(self, assignments: list[dict[str, str]], fragments: list[set[str]], fragment_map_params: dict[str, list]):
         """
         @param assignments:   inputs of APIs
@@ -349,17 +563,20 @@ class ErrorMonitor:
         @param fragment_map_params:  unique fragments with their error-inducing params,
         """
         all_params = list(assignments[0].keys())
-        self.update_conditional_probs(assignments, fragments, fragment_map_params, all_params)
+        models_changed = self.update_conditional_probs(assignments, fragments, fragment_map_params, all_params)
+        self._refresh_constraints(models_changed)
 
         new_found = set(fragment_map_params.keys())
         discovered = new_found - self.all_fragments
+        self.last_discovered = discovered
         if len(discovered) > 0:
             self.since_last_discover = 0
         else:
             self.since_last_discover += 1
         self.all_fragments = new_found
 
-    def update_conditional_probs(self, data: list[dict[str, str]], fragments: list[set[str]], fragment_inducing_params: dict[str, list], all_params: list[str]):
+    def update_conditional_probs(self, data: list[dict[str, str]], fragments: list[set[str]], fragment_inducing_params: dict[str, list], all_params: list[str]) -> bool:
+        """update the models of fragments, return whether models were added or removed"""
         removed = []
         existed = set()
         for model in self.cp_models:
@@ -373,8 +590,10 @@ class ErrorMonitor:
             self.cp_models.remove(model)
 
         # add new models
+        added = False
         for fragment, params in fragment_inducing_params.items():
             if fragment not in existed:
+                added = True
                 existed.add(fragment)
                 if len(params) == 0:
                     self.cp_models.append(ErrorMonitor.UncertainCPModel(self.op_id, fragment, all_params))
@@ -385,16 +604,46 @@ class ErrorMonitor:
         for model in self.cp_models:
             if model.fragment in existed:
                 model.update(data, fragments)
+        return added or len(removed) > 0
 
     # @time_count(logger=_logger)
     def get_error_fragments(self) -> dict[str, set[str]]:
         return {m.fragment: set(m.factors) for m in self.cp_models}
 
-    def get_forbidden_tuples(self, threshold: float) -> list[dict[str, str]]:
-        # logger.debug(f"get forbidden tuples for {self.op_id} with threshold {threshold}")
+    def _collect_forbidden_tuples(self, threshold: float) -> list[dict[str, str]]:
         t: list[dict[str, str]] = []
         for model in self.cp_models:
             t.extend(model.get_forbidden_tuples(threshold))
+        return t
+
+    def _refresh_constraints(self, models_changed: bool):
+        for threshold, (version, tuples) in self._constraints.items():
+            changed = [m.refresh(threshold) for m in self.cp_models]
+            if models_changed or any(changed):
+                new_tuples = self._collect_forbidden_tuples(threshold)
+                # a model may come back to the tuples it had, or a new model may have none, the version is kept then
+                if {frozenset(t.items()) for t in new_tuples} != {frozenset(t.items()) for t in tuples}:
+                    version += 1
+                self._constraints[threshold] = (version, new_tuples)
+
+    def get_constraints(self, threshold: float) -> tuple[int, list[dict[str, str]]]:
+        """
+        the forbidden tuples at threshold with their version, kept up to date by update,
+        the list is replaced rather than modified, and the version changes only when the set of forbidden tuples does
+        """
+        if threshold not in self._constraints:
+            for m in self.cp_models:
+                m.refresh(threshold)
+            self._constraints[threshold] = (0, self._collect_forbidden_tuples(threshold))
+        return self._constraints[threshold]
+
+    def compute_forbidden_tuples(self, threshold: float) -> list[dict[str, str]]:
+        """the forbidden tuples at threshold computed from the models, unlike get_constraints the threshold is not kept up to date by update"""
+        return [t for m in self.cp_models for t, _ in m.get_forbidden_tuples(threshold, with_prob=True)]
+
+    def get_forbidden_tuples(self, threshold: float) -> list[dict[str, str]]:
+        # logger.debug(f"get forbidden tuples for {self.op_id} with threshold {threshold}")
+        t = list(self.get_constraints(threshold)[1])
 
         # if _logger.isEnabledFor(logging.DEBUG):
         #     for d in t:
@@ -1,22 +1,156 @@
 import string
+import sys
+import time
+from collections import OrderedDict
 from logging import getLogger
+from typing import Any, Callable, Iterable, Optional, TYPE_CHECKING
 
-import spacy
-from spacy.matcher import PhraseMatcher
-from spacy.tokens import Doc, Span
+if TYPE_CHECKING:
+    from spacy.language import Language
+    from spacy.matcher import PhraseMatcher
+    from spacy.tokens import Doc, Span
 
-_nlp = spacy.load("en_core_web_sm", disable=['ner'])
+_logger = getLogger(__name__)
 
+# the spaCy model is loaded on first use, see get_nlp
+_nlp: Optional["Language"] = None
 
-def get_parameters(doc: Doc) -> list[str]:
-    return [e._.global_name for e in doc.ents if e._.global_name is not None]
+# "full" runs the whole pipeline at every call site,
+# "fast" only runs the components a call site consumes, see configure
+_MODE = "fast"
+_SUBJECT_PIPES = ("tok2vec", "parser")
+_LEMMA_PIPES = ("tok2vec", "tagger", "attribute_ruler", "lemmatizer")
+
+# texts of one batch of responses are parsed together by nlp.pipe, see configure
+_PIPE_BATCH_SIZE = 256
+_PIPE_N_PROCESS = 1
+
+# phrase matchers reused across calls, matching on LOWER only requires tokenization
+_MAX_VALUE_PATTERNS = 5000
+_value_matcher: Optional["PhraseMatcher"] = None
+_param_matchers: dict[frozenset, "PhraseMatcher"] = dict()
+
+
+def get_nlp() -> "Language":
+    """load the spaCy model and register the extensions on first use, so that importing this module stays cheap"""
+    global _nlp
+    if _nlp is None:
+        import spacy
+        from spacy.tokens import Doc, Span
+
+        start = time.time()
+        _nlp = spacy.load("en_core_web_sm", exclude=['ner'])
+        Span.set_extension("global_name", default=None, force=True)
+        Doc.set_extension("parameters", getter=get_parameters, force=True)
+        _logger.debug(f"Loaded spaCy model in {time.time() - start:.2f}s, pipes: {_nlp.pipe_names}")
+    return _nlp
+
+
+def _disabled_pipes(enabled: tuple[str, ...]) -> list[str]:
+    if _MODE != "fast":
+        return []
+    return [p for p in get_nlp().pipe_names if p not in enabled]
+
+
+class ParseCache:
+    """
+    LRU cache of parsing results (tokenized Docs, subject flags) keyed by (kind, text),
+    bounded by an estimation of its memory, so that recurring error messages are parsed only once
+    """
+    _LOG_EVERY = 10000
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._items: OrderedDict[tuple[str, str], tuple[Any, int]] = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+    def get(self, kind: str, texts: Iterable[str], parse: Callable[[list[str]], Iterable[Any]], size_of: Callable[[str, Any], int]) -> dict[str, Any]:
+        """look up the results of texts, and parse the missing ones with one call to parse"""
+        results = dict()
+        missing = []
+        for t in dict.fromkeys(texts):
+            item = self._items.get((kind, t))
+            if item is None:
+                missing.append(t)
+            else:
+                self._items.move_to_end((kind, t))
+                results[t] = item[0]
+        self.hits += len(results)
+        self.misses += len(missing)
+
+        if len(missing) > 0:
+            for t, value in zip(missing, parse(missing)):
+                results[t] = value
+                self._put(kind, t, value, size_of(t, value))
+
+        total = self.hits + self.misses
+        if total // self._LOG_EVERY > (total - len(results)) // self._LOG_EVERY:
+            _logger.debug(f"Parse cache: hit rate {self.hit_rate:.2%}, {len(self._items)} items, {self._bytes} bytes")
+        return results
+
+    def _put(self, kind: str, text: str, value: Any, size: int):
+        if size > self.max_bytes:
+            return
+        self._items[(kind, text)] = (value, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, (_, evicted) = self._items.popitem(last=False)
+            self._bytes -= evicted
+
+    def resize(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        while self._bytes > self.max_bytes and len(self._items) > 0:
+            _, (_, evicted) = self._items.popitem(last=False)
+            self._bytes -= evicted
+
+
+# approximate memory of a token of a Doc
+_TOKEN_BYTES = 128
+_parse_cache = ParseCache(64 * 1024 * 1024)
+
+
+def configure(batch_size: int = None, n_process: int = None, cache_mb: int = None, mode: str = None):
+    """
+    set the batch size and the number of processes used by spaCy to parse the texts of responses, the memory limit of the parse cache,
+    and the pipeline mode: "fast" only runs the components each call site needs, "full" runs all of them
+    """
+    global _PIPE_BATCH_SIZE, _PIPE_N_PROCESS, _MODE
+    if batch_size is not None and batch_size > 0:
+        _PIPE_BATCH_SIZE = batch_size
+    if n_process is not None and n_process > 0:
+        _PIPE_N_PROCESS = n_process
+    if cache_mb is not None and cache_mb >= 0:
+        _parse_cache.resize(cache_mb * 1024 * 1024)
+    if mode is not None:
+        if mode not in ("fast", "full"):
+            raise ValueError(f"Unknown NLP mode: {mode}")
+        _MODE = mode
 
 
-Span.set_extension("global_name", default=None)
-Doc.set_extension("parameters", getter=get_parameters)
+def tokenize_texts(texts: Iterable[str]) -> dict[str, "Doc"]:
+    """tokenized Docs of texts, enough for phrase matching on LOWER"""
+    return _parse_cache.get("doc", texts,
+                            lambda missing: get_nlp().tokenizer.pipe(missing, batch_size=_PIPE_BATCH_SIZE),
+                            lambda t, doc: sys.getsizeof(t) + len(doc) * _TOKEN_BYTES)
+
+
+def lemmatize(text: str) -> str:
+    """concatenated lemmas of the tokens of text"""
+    return ''.join(t.lemma_ for t in get_nlp()(text, disable=_disabled_pipes(_LEMMA_PIPES)))
+
+
+def get_parameters(doc: "Doc") -> list[str]:
+    return [e._.global_name for e in doc.ents if e._.global_name is not None]
 
 
-def is_a_noun(doc: Doc, start: int, end: int):
+def is_a_noun(doc: "Doc", start: int, end: int):
     return any([token.pos_ in ["NOUN", "PRON", "PROPN"] for token in doc[start:end]])
 
 
@@ -72,17 +206,35 @@ def remove_digits(text: str) -> str:
     return res
 
 
+def _match_values(doc: "Doc", values: set[str]) -> list["Span"]:
+    """spans of doc matching any of the values, each value is a pattern of the shared matcher labeled by itself"""
+    global _value_matcher
+    if _value_matcher is None or len(_value_matcher) > _MAX_VALUE_PATTERNS:
+        from spacy.matcher import PhraseMatcher
+        _value_matcher = PhraseMatcher(get_nlp().vocab, attr="LOWER")
+    for v in values:
+        if v not in _value_matcher:
+            pattern = get_nlp().make_doc(v)
+            if len(pattern) > 0:
+                _value_matcher.add(v, [pattern])
+
+    spans = dict()
+    for span in _value_matcher(doc, as_spans=True):
+        if span.label_ in values and (span.start, span.end) not in spans:
+            spans[(span.start, span.end)] = span
+    return list(spans.values())
+
+
 # @time_count(_logger)
 def remove_values(texts: list[str], domains: dict[str, str]) -> list[str]:
-    matcher = PhraseMatcher(_nlp.vocab, attr="LOWER")
-    matcher.add("VALUE", [_nlp.make_doc(str(v)) for v in domains.values()])
+    values = {str(v) for v in domains.values()}
 
+    docs = tokenize_texts(texts)
     texts_without_values = []
-    for t in texts:
-        doc = _nlp(t)
+    for doc in (docs[t] for t in texts):
         last_char = 0
         pattern = ""
-        matches: list[Span] = matcher(doc, as_spans=True)
+        matches: list["Span"] = _match_values(doc, values)
         for span in sorted(matches, key=lambda x: x.start_char):
             param = next((p for p in domains.keys() if domains[p] == span.text), '')
             pattern += doc.text[last_char:span.start_char] + f"{param} (__VALUE__)"
@@ -107,16 +259,26 @@ def clean_text(text: str) -> str:
     return text.strip()
 
 
+def _get_param_matcher(names) -> "PhraseMatcher":
+    key = frozenset(names)
+    if key not in _param_matchers:
+        from spacy.matcher import PhraseMatcher
+        matcher = PhraseMatcher(get_nlp().vocab, attr="LOWER")
+        matcher.add("PARAM", [get_nlp().make_doc(n) for n in key])
+        _param_matchers[key] = matcher
+    return _param_matchers[key]
+
+
 # @time_count(_logger)
 def identify_associated_parameters(strings: set[str], param_to_match: dict) -> list[tuple[str, set[str]]]:
     results = list()
-    matcher = PhraseMatcher(_nlp.vocab, attr="LOWER")
-    matcher.add("PARAM", [_nlp.make_doc(n) for n in param_to_match.keys()])
+    matcher = _get_param_matcher(param_to_match.keys())
 
+    docs = tokenize_texts(strings)
     for s in strings:
+        doc = docs[s]
         involved = set()
-        doc = _nlp(s)
-        matches: list[Span] = matcher(doc, as_spans=True)
+        matches: list["Span"] = matcher(doc, as_spans=True)
 
         for span in matches:
             g_n = param_to_match.get(span.text, None)
@@ -130,35 +292,59 @@ def remove_punctuation(s: str) -> str:
     return s.translate(str.maketrans('', '', string.punctuation))
 
 
-# @time_count(_logger)
-def parse_json(j, results: list[str], param_to_match: dict, extra_noun: str = ''):
-    def is_special_items(_k, _v):
-        if _k.lower() in ("timestamp", "time"):
-            return True
-        if _k.lower() in ("path", "uri", "url") and isinstance(_v, str) and _v.startswith("/"):
-            return True
-        if _k.lower() in ("status", "status code", "status_code"):
-            return True
-        if _v in [None, "", [], {}, [{}]]:
-            return True
-
-        return False
+def _is_special_items(_k, _v):
+    if _k.lower() in ("timestamp", "time"):
+        return True
+    if _k.lower() in ("path", "uri", "url") and isinstance(_v, str) and _v.startswith("/"):
+        return True
+    if _k.lower() in ("status", "status code", "status_code"):
+        return True
+    if _v in [None, "", [], {}, [{}]]:
+        return True
+
+    return False
 
+
+def flatten_json(j, leaves: list[tuple[str, str]], extra_noun: str = ''):
+    """collect (key, text) of the leaves of a json, skipping the items that never carry error messages"""
     if isinstance(j, dict):
         for k, v in j.items():
-            if not is_special_items(k, v):
-                parse_json(v, results, param_to_match, k)
+            if not _is_special_items(k, v):
+                flatten_json(v, leaves, k)
     elif isinstance(j, list):
         if len(j) > 0:
             for item in j:
-                parse_json(item, results, param_to_match, extra_noun)
+                flatten_json(item, leaves, extra_noun)
     else:
-        j = str(j)
-        if is_missing_subject(_nlp(j)) or any(p in extra_noun for p in param_to_match.keys()):
+        leaves.append((extra_noun, str(j)))
+
+
+def missing_subjects(texts: Iterable[str]) -> dict[str, bool]:
+    """check whether each text misses a subject, texts not in the parse cache are parsed with one call to nlp.pipe"""
+    def parse(missing: list[str]):
+        docs = get_nlp().pipe(missing, batch_size=_PIPE_BATCH_SIZE, n_process=_PIPE_N_PROCESS if len(missing) > _PIPE_BATCH_SIZE else 1,
+                              disable=_disabled_pipes(_SUBJECT_PIPES))
+        return (is_missing_subject(doc) for doc in docs)
+
+    return _parse_cache.get("subject", texts, parse, lambda t, _: sys.getsizeof(t))
+
+
+def reformat_leaves(leaves: list[tuple[str, str]], param_to_match: dict, subjects: dict[str, bool]) -> list[str]:
+    results = []
+    for extra_noun, j in leaves:
+        if subjects[j] or any(p in extra_noun for p in param_to_match.keys()):
             results.append(f"{extra_noun} ({j})")
         else:
             results.append(j)
+    return results
+
+
+# @time_count(_logger)
+def parse_json(j, results: list[str], param_to_match: dict, extra_noun: str = ''):
+    leaves = []
+    flatten_json(j, leaves, extra_noun)
+    results.extend(reformat_leaves(leaves, param_to_match, missing_subjects(t for _, t in leaves)))
 
 
-def is_missing_subject(sentence: Doc):
+def is_missing_subject(sentence: "Doc"):
     return not any(token.dep_ == "nsubj" for token in sentence)
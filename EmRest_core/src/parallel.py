@@ -0,0 +1,183 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from logging import getLogger
+from typing import Any, Optional
+
+import pandas as pd
+from requests.exceptions import ConnectionError
+
+from src.graph import ResourceGraph, resource_node_of
+from src.manager import Manager
+from src.monitor import Statistics
+from src.rest import RestOp
+
+_logger = getLogger(__name__)
+
+# outputs of the workers are in <output_path>/<exp_name>/workers/<exp_name>_w<i>
+WORKERS_DIR = "workers"
+
+
+class ResourceChannel:
+    """
+    Publish/subscribe channel of the resources created by the workers of a parallel run.
+    A worker publishes the 2xx responses of its operations to the hub, the coordinator forwards them to the inboxes of the other workers,
+    which add them to their own resource pool, see Manager.sync_resources.
+    """
+
+    def __init__(self, index: int, inbox: multiprocessing.Queue, hub: multiprocessing.Queue):
+        self.index = index
+        self._inbox = inbox
+        self._hub = hub
+        self.published = 0
+        self.received = 0
+
+    def publish(self, op_uri: str, responses: list[Any]):
+        self._hub.put((self.index, op_uri, list(responses)))
+        self.published += 1
+
+    def receive(self) -> list[tuple[str, list[Any]]]:
+        messages = []
+        while True:
+            try:
+                messages.append(self._inbox.get_nowait())
+            except queue.Empty:
+                break
+        self.received += len(messages)
+        return messages
+
+
+def _forward(hub: multiprocessing.Queue, inboxes: list[multiprocessing.Queue]):
+    while True:
+        message = hub.get()
+        if message is None:
+            return
+        sender, op_uri, responses = message
+        for i, inbox in enumerate(inboxes):
+            if i != sender:
+                inbox.put((op_uri, responses))
+
+
+def shard_operations(operations: list[RestOp], graph: Optional[ResourceGraph], workers: int) -> list[list[str]]:
+    """
+    split the operations into at most `workers` shards of similar sizes,
+    the operations of a resource node stay in the same shard so that most bindings are found without going through the channel
+    """
+    groups: dict[str, list[str]] = dict()
+    for op in operations:
+        node = graph.node_of[op.id] if graph is not None else resource_node_of(op.path.computed_to_string)
+        groups.setdefault(node, []).append(op.id)
+
+    shards: list[list[str]] = [[] for _ in range(max(1, workers))]
+    for ops in sorted(groups.values(), key=len, reverse=True):
+        min(shards, key=len).extend(ops)
+    return [s for s in shards if len(s) > 0]
+
+
+def _work(index: int, op_ids: list[str], started: float, exp_name: str, spec_file: str, budget: float, output_path: str, pict: str, server: Optional[str],
+          kwargs: dict, inbox: multiprocessing.Queue, hub: multiprocessing.Queue, results: multiprocessing.Queue):
+    # imported in the worker process, src.alg imports this module lazily
+    from src import alg
+
+    name = f"{exp_name}_w{index}"
+    directory = os.path.join(output_path, exp_name, WORKERS_DIR)
+    logger = alg.configure(name, directory, **kwargs)
+    # the budget is shared with the coordinator and the other workers
+    alg.globalTimer.set_timeout(budget)
+    alg.globalTimer.resume(time.time() - started)
+
+    manager = Manager.from_spec(spec_file, server=server)
+    manager.restrict(set(op_ids))
+    manager.channel = ResourceChannel(index, inbox, hub)
+    logger.info(f"Worker {index} tests {len(manager.unique)} operations")
+    # snapshots are not supported by parallel runs
+    algorithm = alg.create_algorithm(name, manager, pict, directory, **dict(kwargs, snapshot_every=0))
+    reachable = True
+    try:
+        algorithm.main()
+    except ConnectionError as e:
+        reachable = False
+        logger.error(f"Worker {index} stopped, the server is not reachable: {e}")
+    finally:
+        logger.info(f"Worker {index} published {manager.channel.published} and received {manager.channel.received} batches of resources")
+        results.put((index, algorithm.statistics, algorithm.transport_stats, algorithm.generator_stats, reachable))
+
+
+def _sum_stats(stats: list[Optional[dict]]) -> Optional[dict]:
+    """sum the counters of the workers, nested dicts (e.g. the pools of each host) are summed key by key"""
+    stats = [s for s in stats if s is not None]
+    if len(stats) == 0:
+        return None
+    total = dict()
+    for s in stats:
+        for k, v in s.items():
+            if isinstance(v, dict):
+                total[k] = _sum_stats([total.get(k), v])
+            else:
+                total[k] = total.get(k, 0) + v
+    return total
+
+
+def run_parallel(exp_name: str, spec_file: str, budget: float, output_path: str, pict: str, server: str = None, **kwargs):
+    """
+    test the shards of the operations in `workers` processes, each with its own equivalences and monitors, sharing their resources through a
+    ResourceChannel, then merge the statistics of the workers into one report in <output_path>/<exp_name>/data
+    @return: whether all workers tested their shard until the end, i.e. the server stayed reachable and no worker crashed
+    """
+    started = time.time()
+    manager = Manager.from_spec(spec_file, server=server)
+    shards = shard_operations(manager.unique, manager.graph, kwargs.get('workers') or 1)
+    _logger.info(f"Parallel run of {len(manager.unique)} operations in {len(shards)} workers: {[len(s) for s in shards]}")
+
+    context = multiprocessing.get_context("spawn")
+    hub = context.Queue()
+    inboxes = [context.Queue() for _ in shards]
+    for inbox in inboxes:
+        # the resources forwarded to a worker that has stopped are never read, do not wait for them when exiting
+        inbox.cancel_join_thread()
+    results = context.Queue()
+    processes = [context.Process(target=_work, name=f"{exp_name}_w{i}",
+                                 args=(i, shard, started, exp_name, spec_file, budget, output_path, pict, server, kwargs, inboxes[i], hub, results))
+                 for i, shard in enumerate(shards)]
+    for p in processes:
+        p.start()
+    forwarder = threading.Thread(target=_forward, args=(hub, inboxes), daemon=True)
+    forwarder.start()
+
+    # results are collected before joining the workers, that can not exit before their results are read
+    statistics: dict[int, Statistics] = dict()
+    transport_stats, generator_stats = [], []
+    unreachable = []
+    while len(statistics) < len(processes):
+        try:
+            index, s, transport, generator, reachable = results.get(timeout=1)
+            statistics[index] = s
+            transport_stats.append(transport)
+            generator_stats.append(generator)
+            if not reachable:
+                unreachable.append(index)
+        except queue.Empty:
+            if not any(p.is_alive() for p in processes) and results.empty():
+                break
+    for p in processes:
+        p.join()
+    hub.put(None)
+    forwarder.join()
+
+    missing = [i for i in range(len(shards)) if i not in statistics]
+    if len(missing) > 0:
+        _logger.error(f"Workers {missing} stopped without results, their operations are not reported")
+
+    merged = Statistics([op.id for op in manager.unique])
+    for index, s in statistics.items():
+        merged.adopt(s, shards[index])
+    directory = os.path.join(output_path, exp_name, 'data')
+    merged.report(directory, transport=_sum_stats(transport_stats), generator=_sum_stats(generator_stats))
+    pd.DataFrame([(op, i) for i, shard in enumerate(shards) for op in shard], columns=["operation", "worker"]) \
+        .to_csv(os.path.join(directory, 'shards.csv'), index=False)
+    if len(unreachable) > 0:
+        _logger.error(f"Workers {sorted(unreachable)} stopped, the server is not reachable")
+    _logger.info(f"Parallel run finished in {time.time() - started:.0f}s")
+    return len(missing) == 0 and len(unreachable) == 0
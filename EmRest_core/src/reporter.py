@@ -0,0 +1,224 @@
+import json
+import os
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import time
+from logging import getLogger
+from typing import Optional
+
+import click
+import pandas as pd
+
+from src.monitor import Report, Statistics, WindowStore
+
+_logger = getLogger(__name__)
+
+
+class StreamReporter(Report):
+    """
+    Append one JSON line per batch of test cases (status codes, new fragments, timing)
+    to a log while the run proceeds, so that the results survive a crash of EmRest or of the server.
+    Every `checkpoint_every` batches the forbidden tuples that changed are appended, the log is synced to disk and progress.json is rewritten.
+    report() rebuilds the CSV files of Statistics.report from the log, except the models of the monitors.
+    """
+    LOG_FILE = "batches.jsonl"
+    PROGRESS_FILE = "progress.json"
+    # thresholds of the forbidden tuples written by Statistics.report, they are computed at checkpoints only:
+    # asking the monitors for them on every batch would keep them up to date on every update
+    ERROR_THRESHOLD = 0.5
+    BUG_THRESHOLD = 0.7
+
+    def __init__(self, directory: str, checkpoint_every: int = 50):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.checkpoint_every = max(1, checkpoint_every)
+        self.num_batches = 0
+        self._started = time.time()
+        # op -> forbidden tuples last written, of the error monitor and of the bug monitor
+        self._written: dict[str, tuple[set[frozenset], set[frozenset]]] = dict()
+        # opened by start, which overwrites the log of a previous run, or by resume, which continues it
+        self._file = None
+        # the batches are also sent to the coordinator of a distributed run, see src.distributed.RemoteChannel
+        self.channel = None
+
+    def start(self, operations: list[str]):
+        self._file = open(os.path.join(self.directory, self.LOG_FILE), 'w', encoding='utf-8')
+        self._write({"type": "start", "time": self._started, "operations": operations})
+
+    def resume(self, num_batches: int):
+        """continue a run resumed from a snapshot taken after num_batches batches, the batches logged after it are discarded by finalize"""
+        self.num_batches = num_batches
+        # the forbidden tuples written after the snapshot are written again by the next checkpoint
+        self._written.clear()
+        self._file = open(os.path.join(self.directory, self.LOG_FILE), 'a', encoding='utf-8')
+        self._write({"type": "resume", "time": self._started, "batches": num_batches})
+
+    def record(self, statistics: Statistics, op_id: str, stage: str):
+        """append the last batch of op_id, after it has been uploaded to statistics"""
+        counts, duration = statistics.windows[op_id].last
+        error_monitor = statistics.error_monitors[op_id]
+        bug_monitor = statistics.bug_monitors[op_id]
+        entry = {
+            "type": "batch",
+            "time": time.time(),
+            "op": op_id,
+            "stage": stage,
+            "duration": duration,
+            **dict(zip(WindowStore.COLUMNS, (int(c) for c in counts))),
+            "new_error_fragments": sorted(error_monitor.last_discovered),
+            "new_bug_fragments": sorted(bug_monitor.last_discovered),
+        }
+
+        self._send(entry)
+        self.num_batches += 1
+        if self.num_batches % self.checkpoint_every == 0:
+            self.checkpoint(statistics)
+
+    def append(self, entry: dict):
+        """append an entry recorded by another reporter, e.g. by a worker of a distributed run"""
+        self._write(entry)
+        if entry["type"] != "batch":
+            return
+        self.num_batches += 1
+        if self.num_batches % self.checkpoint_every == 0:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def checkpoint(self, statistics: Statistics):
+        """append the forbidden tuples that changed, sync the log to disk and rewrite progress.json atomically"""
+        self._record_constraints(statistics)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        progress = {
+            "time": time.time(),
+            "elapsed": time.time() - self._started,
+            "batches": self.num_batches,
+            "status_code": statistics.status_code,
+            "failed_operations": statistics.failed_operations,
+        }
+        path = os.path.join(self.directory, self.PROGRESS_FILE)
+        with open(path + ".tmp", 'w') as f:
+            json.dump(progress, f, indent=2)
+        os.replace(path + ".tmp", path)
+
+    def close(self, statistics: Optional[Statistics] = None):
+        if self._file is None or self._file.closed:
+            return
+        if statistics is not None:
+            self.checkpoint(statistics)
+        self._file.close()
+
+    def _record_constraints(self, statistics: Statistics):
+        for op_id, error_monitor in statistics.error_monitors.items():
+            error_tuples = error_monitor.compute_forbidden_tuples(self.ERROR_THRESHOLD)
+            bug_tuples = statistics.bug_monitors[op_id].compute_forbidden_tuples(self.BUG_THRESHOLD)
+            written = ({frozenset(t.items()) for t in error_tuples}, {frozenset(t.items()) for t in bug_tuples})
+            last = self._written.get(op_id)
+            if last == written:
+                continue
+            entry = {"type": "constraints", "time": time.time(), "op": op_id}
+            if last is None or last[0] != written[0]:
+                entry["error_forbidden_tuples"] = statistics.decode_tuples(op_id, error_tuples)
+            if last is None or last[1] != written[1]:
+                entry["bug_forbidden_tuples"] = statistics.decode_tuples(op_id, bug_tuples)
+            self._written[op_id] = written
+            self._send(entry)
+
+    def _send(self, entry: dict):
+        self._write(entry)
+        if self.channel is not None:
+            self.channel.record(entry)
+
+    def _write(self, entry: dict):
+        self._file.write(json.dumps(entry, default=str) + "\n")
+        self._file.flush()
+
+    def report(self, directory: str):
+        StreamReporter.finalize(os.path.join(self.directory, self.LOG_FILE), directory)
+
+    @staticmethod
+    def finalize(log_file: str, directory: str):
+        """write status_codes.csv, time_budget.csv and, for each operation, status_code_by_windows.csv and the forbidden tuples from a log"""
+        _logger.info(f"Building the report of {log_file} in {directory}")
+        windows: dict[str, list[tuple[int, ...]]] = dict()
+        durations: dict[str, list[float]] = dict()
+        error_tuples: dict[str, list[dict]] = dict()
+        bug_tuples: dict[str, list[dict]] = dict()
+
+        def read_entries():
+            with open(log_file, encoding='utf-8') as _f:
+                for i, line in enumerate(_f):
+                    try:
+                        yield i, json.loads(line)
+                    except json.JSONDecodeError:
+                        # the last line of a crashed run may be truncated
+                        continue
+
+        # batches and forbidden tuples logged after the snapshot a run was resumed from are replaced by the ones of the resumed run
+        batch_lines: list[int] = []
+        constraint_lines: list[int] = []
+        discarded: set[int] = set()
+        for i, entry in read_entries():
+            if entry["type"] == "start":
+                # a log may still hold the batches of an earlier run, only the last run is reported
+                batch_lines.clear()
+                constraint_lines.clear()
+                discarded.clear()
+            elif entry["type"] == "batch":
+                batch_lines.append(i)
+            elif entry["type"] == "constraints":
+                constraint_lines.append(i)
+            elif entry["type"] == "resume":
+                discarded.update(batch_lines[entry["batches"]:])
+                del batch_lines[entry["batches"]:]
+                last_kept = batch_lines[-1] if len(batch_lines) > 0 else -1
+                discarded.update(c for c in constraint_lines if c > last_kept)
+                constraint_lines = [c for c in constraint_lines if c <= last_kept]
+
+        for i, entry in read_entries():
+            if entry["type"] == "start":
+                windows.clear()
+                durations.clear()
+                error_tuples.clear()
+                bug_tuples.clear()
+                for op in entry["operations"]:
+                    windows.setdefault(op, [])
+                    durations.setdefault(op, [])
+                continue
+            if entry["type"] not in ("batch", "constraints") or i in discarded:
+                continue
+            op = entry["op"]
+            if entry["type"] == "batch":
+                windows.setdefault(op, []).append(tuple(entry[c] for c in WindowStore.COLUMNS))
+                durations.setdefault(op, []).append(entry["duration"])
+            # written with the batches by earlier versions, with the checkpoints since
+            if "error_forbidden_tuples" in entry:
+                error_tuples[op] = entry["error_forbidden_tuples"]
+            if "bug_forbidden_tuples" in entry:
+                bug_tuples[op] = entry["bug_forbidden_tuples"]
+
+        os.makedirs(directory, exist_ok=True)
+        status_code = {op: dict(zip(WindowStore.COLUMNS, (int(sum(c)) for c in zip(*w)) if len(w) > 0 else (0, 0, 0))) for op, w in windows.items()}
+        pd.DataFrame.from_dict(status_code, orient='index').to_csv(os.path.join(directory, 'status_codes.csv'))
+
+        time_budget_df = pd.DataFrame({op: pd.Series(d, index=range(1, len(d) + 1), dtype=float) for op, d in durations.items()})
+        time_budget_df.dropna().to_csv(os.path.join(directory, 'time_budget.csv'))
+
+        for op, w in windows.items():
+            op_dir = os.path.join(directory, Report.remove_slash_in_name(op))
+            os.makedirs(op_dir, exist_ok=True)
+            pd.DataFrame(w, columns=list(WindowStore.COLUMNS), dtype='int64').to_csv(os.path.join(op_dir, 'status_code_by_windows.csv'))
+            pd.DataFrame(error_tuples.get(op, [])).to_csv(os.path.join(op_dir, 'error_monitors_forbidden_tuples.csv'))
+            pd.DataFrame(bug_tuples.get(op, [])).to_csv(os.path.join(op_dir, 'bug_monitors_forbidden_tuples.csv'))
+
+
+@click.command()
+@click.option('--log_file', type=str, required=True, help='Path to the batches.jsonl of a run')
+@click.option('--output_path', type=str, required=True, help='Directory of the CSV files')
+def command(log_file: str, output_path: str):
+    StreamReporter.finalize(log_file, output_path)
+
+
+if __name__ == '__main__':
+    command()
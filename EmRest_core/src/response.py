@@ -1,60 +1,194 @@
 import re
+from collections import OrderedDict, deque
+from functools import lru_cache
 from logging import getLogger
-from typing import Any
+from typing import Any, Iterable, Iterator, Optional
 
-from src.nlp import parse_json, remove_values, remove_digits, clean_string, identify_associated_parameters
+from src.nlp import flatten_json, missing_subjects, reformat_leaves, remove_values, remove_digits, clean_string, identify_associated_parameters
 from src.log import time_count
 
 _logger = getLogger(__name__)
 
 
-def _reformat_response(tokens: dict[str, str], assignment: dict[str, str], response: Any) -> set[str]:
-    """flat the response, and remove values, digits in response, to achieve a pattern"""
+def _flatten_response(response: Any) -> list[tuple[str, str]]:
+    """flat the response into (key, text) leaves"""
+    leaves = []
     if response in (None, '', [], {}):
-        return set()
-    parsed = []
+        return leaves
     response_str = str(response)
     if len(response_str) > 4096:
         response = response_str[:4096]
-    parse_json(response, parsed, tokens)
-    texts_without_values = remove_values(parsed, assignment)
-    text_without_digits = [remove_digits(t) for t in texts_without_values]
-    return set(text_without_digits)
+    flatten_json(response, leaves)
+    return leaves
+
+
+def _reformat_responses(tokens: dict[str, str], assignments: list[dict[str, str]], responses: list[Any]) -> list[set[str]]:
+    """flat the responses, and remove values, digits in responses, to achieve patterns.
+    Texts of all responses are parsed by spaCy in one batch"""
+    leaves = [_flatten_response(r) for r in responses]
+    subjects = missing_subjects(t for l in leaves for _, t in l)
+
+    reformatted = []
+    for assignment, l in zip(assignments, leaves):
+        if len(l) == 0:
+            reformatted.append(set())
+            continue
+        parsed = reformat_leaves(l, tokens, subjects)
+        texts_without_values = remove_values(parsed, assignment)
+        text_without_digits = [remove_digits(t) for t in texts_without_values]
+        reformatted.append(set(text_without_digits))
+    return reformatted
+
+
+class _AhoCorasick:
+    """Aho–Corasick automaton over a set of strings, reports every occurrence of them in one pass over a text"""
+
+    def __init__(self, patterns: Iterable[str]):
+        self._goto: list[dict[str, int]] = [dict()]
+        self._fail: list[int] = [0]
+        self._out: list[list[str]] = [[]]
+        for p in patterns:
+            if p == '':
+                continue
+            node = 0
+            for c in p:
+                nxt = self._goto[node].get(c)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][c] = nxt
+                    self._goto.append(dict())
+                    self._fail.append(0)
+                    self._out.append([])
+                node = nxt
+            self._out[node].append(p)
+
+        queue = deque(self._goto[0].values())
+        while len(queue) > 0:
+            node = queue.popleft()
+            for c, nxt in self._goto[node].items():
+                queue.append(nxt)
+                f = self._fail[node]
+                while f != 0 and c not in self._goto[f]:
+                    f = self._fail[f]
+                self._fail[nxt] = self._goto[f].get(c, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find(self, text: str) -> Iterator[tuple[int, str]]:
+        """(start, pattern) of all occurrences"""
+        node = 0
+        for i, c in enumerate(text):
+            while node != 0 and c not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(c, 0)
+            for p in self._out[node]:
+                yield i - len(p) + 1, p
+
+
+def _is_word(c: str) -> bool:
+    return c.isalnum() or c == '_'
+
+
+def _at_boundary(text: str, i: int) -> bool:
+    """same as \\b of re at position i of text"""
+    before = i > 0 and _is_word(text[i - 1])
+    after = i < len(text) and _is_word(text[i])
+    return before != after
+
+
+@lru_cache(maxsize=4096)
+def _separator(s: str) -> re.Pattern:
+    return re.compile(r'\b' + re.escape(s) + r'\b')
+
+
+class Fragmentizer:
+    """
+    Fragmentize the strings in the responses of an operation into error-specific fragments, incrementally.
+
+    A string is split by the longest other string it contains (on word boundaries), until no string contains another one.
+    The fragment sets returned are such fixpoints, so when one of them is passed back as the existing fragments,
+    only the new strings, and the fragments containing a new string, are split again.
+    Containment is found by Aho–Corasick automata over the strings instead of a regex per pair of strings.
+    """
+    _MAX_KNOWN = 4
+    _MAX_AUTOMATA = 8
+
+    def __init__(self):
+        # fixpoints returned recently -> automata over a superset of their fragments, i.e., the ones built while fragmentizing
+        self._known: OrderedDict[frozenset[str], list[_AhoCorasick]] = OrderedDict()
+
+    def __getstate__(self):
+        # the automata are caches, they are not saved in snapshots
+        return {"_known": OrderedDict()}
+
+    def fragmentize(self, strings: set[str], existed: set[str]) -> set[str]:
+        if len(strings) == 0:
+            return set(existed)
+        existed = frozenset(existed)
+        if existed in self._known:
+            self._known.move_to_end(existed)
+            automata = list(self._known[existed])
+            new = set(strings) - existed
+            current = set(existed) | new
+        else:
+            automata = []
+            new = set(strings) | existed
+            current = set(new)
+
+        # each round splits the strings of the current set by the others, as one pass of the all-pairs fixpoint did:
+        # the strings that were not split in the previous round can only be split by the new ones
+        while len(new) > 0:
+            new_automaton = _AhoCorasick(new)
+            automata.append(new_automaton)
+            parts = set()
+            removed = set()
+            for to_split in current:
+                if to_split in new:
+                    separator = self._longest_separator(to_split, current, automata)
+                else:
+                    separator = self._longest_separator(to_split, new, [new_automaton])
+                if separator is None:
+                    continue
+                for part in _separator(separator).split(to_split):
+                    part = clean_string(part)
+                    if part != '':
+                        parts.add(part)
+                removed.add(to_split)
+            survivors = current - removed
+            new = parts - survivors
+            current = survivors | parts
+
+        fragments = frozenset(current)
+        if fragments not in self._known:
+            if len(automata) > self._MAX_AUTOMATA:
+                automata = [_AhoCorasick(fragments)]
+            self._known[fragments] = automata
+            if len(self._known) > self._MAX_KNOWN:
+                self._known.popitem(last=False)
+        return set(current)
+
+    @staticmethod
+    def _longest_separator(text: str, candidates: set[str], automata: list[_AhoCorasick]) -> Optional[str]:
+        """the longest string of candidates occurring in text on word boundaries, ties are broken alphabetically"""
+        best = None
+        for automaton in automata:
+            for start, p in automaton.find(text):
+                if p == text or p not in candidates:
+                    continue
+                if best is not None and (len(p) < len(best) or (len(p) == len(best) and p >= best)):
+                    continue
+                if _at_boundary(text, start) and _at_boundary(text, start + len(p)):
+                    best = p
+        if best is None and '' in candidates and text != '' and any(_is_word(c) for c in text):
+            best = ''
+        return best
 
 
 @time_count(_logger)
-def _fragmentize(strings: set[str], existed: set[str]) -> set[str]:
+def _fragmentize(strings: set[str], existed: set[str], fragmentizer: Fragmentizer = None) -> set[str]:
     """Given a set of strings in a response, fragmentize them into smaller parts, i.e., error-specific fragments"""
-    if len(strings) == 0:
-        return set(existed)
-    _E = strings.union(existed)
-    while True:
-        _E = set(_E)
-        _E = sorted(_E, key=lambda x: len(x), reverse=True)
-
-        _E_new = set()
-        _E_removed = set()
-        for i in range(len(_E) - 1):
-            for j in range(i + 1, len(_E)):
-                to_spilt = _E[i]
-                separator = _E[j]
-                pattern = re.compile(r'\b' + re.escape(separator) + r'\b')
-                if pattern.search(to_spilt) is not None:
-                    # _logger.error(f'found separator {separator} in {to_spilt}')
-                    for part in pattern.split(to_spilt):
-                        part = clean_string(part)
-                        if part != '':
-                            _E_new.add(part)
-                    _E_removed.add(to_spilt)
-                    break
-
-        if len(_E_new) == 0 and len(_E_removed) == 0:
-            break
-        for e in _E_removed:
-            _E.remove(e)
-        for e in _E_new:
-            _E.append(e)
-    return set(_E)
+    if fragmentizer is None:
+        fragmentizer = Fragmentizer()
+    return fragmentizer.fragmentize(strings, existed)
 
 
 def handle_response(tokens: dict[str, str],
@@ -63,24 +197,23 @@ def handle_response(tokens: dict[str, str],
                     status_codes: list[int],
                     responses: list[Any],
                     existing_error_fragment_map_params: dict[str, set[str]],
-                    existing_bug_fragment_map_params: dict[str, set[str]]):
-    reformatted_strings: list[set[str]] = list()
+                    existing_bug_fragment_map_params: dict[str, set[str]],
+                    fragmentizer: Fragmentizer = None):
+    to_reformat = [i for i, code in enumerate(status_codes) if code // 100 in (4, 5)]
+    reformatted = _reformat_responses(tokens, [assignments[i] for i in to_reformat], [responses[i] for i in to_reformat])
+
+    reformatted_strings: list[set[str]] = [set() for _ in status_codes]
     unique_error_strings: set[str] = set()
     unique_bug_strings: set[str] = set()
-    for source, assignment, code, response in zip(input_sources, assignments, status_codes, responses):
-        if code // 100 == 4:
-            rr = _reformat_response(tokens, assignment, response)
-            reformatted_strings.append(rr)
+    for i, rr in zip(to_reformat, reformatted):
+        reformatted_strings[i] = rr
+        if status_codes[i] // 100 == 4:
             unique_error_strings.update(rr)
-        elif code // 100 == 5:
-            rr = _reformat_response(tokens, assignment, response)
-            reformatted_strings.append(rr)
-            unique_bug_strings.update(rr)
         else:
-            reformatted_strings.append(set())
+            unique_bug_strings.update(rr)
 
     # string -> fragment
-    new_error_fragments = _fragmentize(unique_error_strings, set(existing_error_fragment_map_params.keys()))
+    new_error_fragments = _fragmentize(unique_error_strings, set(existing_error_fragment_map_params.keys()), fragmentizer)
     existing_error_fragment_map_params = {f: v for f, v in existing_error_fragment_map_params.items() if f in new_error_fragments}
     # fragment -> associated parameters
     error_to_identify = {f for f in new_error_fragments if f not in existing_error_fragment_map_params.keys()}
@@ -88,7 +221,7 @@ def handle_response(tokens: dict[str, str],
         existing_error_fragment_map_params[f] = p_set
 
     # string -> fragment
-    new_bug_fragments = _fragmentize(unique_bug_strings, set(existing_bug_fragment_map_params.keys()))
+    new_bug_fragments = _fragmentize(unique_bug_strings, set(existing_bug_fragment_map_params.keys()), fragmentizer)
     existing_bug_fragment_map_params = {f: v for f, v in existing_bug_fragment_map_params.items() if f in new_bug_fragments}
     # fragment -> associated parameters
     bug_to_identify = {f for f in new_bug_fragments if f not in existing_bug_fragment_map_params.keys()}
@@ -1,10 +1,10 @@
 import abc
 from enum import Enum
-from typing import Any, Optional
+from typing import Any, Callable, Optional
 from urllib.parse import quote
 from functools import cached_property
 
-from src.factor import AbstractFactor, ArrayFactor
+from src.factor import AbstractFactor, ArrayFactor, ObjectFactor
 
 
 class RestParam(metaclass=abc.ABCMeta):
@@ -154,34 +154,29 @@ class RestPath:
         if self.end_with_slash:
             self.computed_to_string += "/"
 
-    def resolve_path_param(self, path_params: list[RestParam], values: dict[str, Any]) -> str:
-        path = ""
+    def compile_path_param(self, path_params: list[RestParam]) -> tuple[list[str], list[tuple[int, str]]]:
+        """
+        pieces of the path and the slots of its parameters, filled by fill_path_param
+        @return: literal pieces with empty pieces for the parameters, (index of the piece, global name of the path parameter) of each parameter
+        """
+        by_name: dict[str, RestParam] = dict()
+        for p in path_params:
+            if isinstance(p, PathParam):
+                by_name.setdefault(p.factor.name, p)
 
+        pieces: list[str] = []
+        slots: list[tuple[int, str]] = []
         for e in self.elements:
-            path += "/"
-
+            pieces.append("/")
             for t in e.tokens:
                 if not t.is_parameter:
-                    path += t.name
+                    pieces.append(t.name)
                 else:
-                    p = next((p for p in path_params if isinstance(p, PathParam) and p.factor.name == t.name), None)
-
+                    p = by_name.get(t.name)
                     if p is None:
                         raise ValueError(f"Cannot resolve path parameter '{t.name}'")
-
-                    value = values.get(p.factor.global_name, "__null__")
-
-                    if value is None or not str(value).strip() or value == "__null__":
-                        """
-                        We should avoid having path params that are blank,
-                        as they would easily lead to useless 404/405 errors
-
-                        TODO handle this case better, eg avoid having blank in
-                        the first place
-                        """
-                        value = "1"
-
-                    path += str(value)
+                    slots.append((len(pieces), p.factor.global_name))
+                    pieces.append("")
 
         """
         Reserved characters need to be encoded.
@@ -191,8 +186,31 @@ class RestPath:
         It seems unclear how to properly build it as a single string...
         """
         if self.end_with_slash:
-            return path + "/"
-        return path
+            pieces.append("/")
+        return pieces, slots
+
+    @staticmethod
+    def fill_path_param(pieces: list[str], slots: list[tuple[int, str]], values: dict[str, Any]) -> str:
+        pieces = pieces.copy()
+        for i, global_name in slots:
+            value = values.get(global_name, "__null__")
+
+            if value is None or not str(value).strip() or value == "__null__":
+                """
+                We should avoid having path params that are blank,
+                as they would easily lead to useless 404/405 errors
+
+                TODO handle this case better, eg avoid having blank in
+                the first place
+                """
+                value = "1"
+
+            pieces[i] = str(value)
+        return "".join(pieces)
+
+    def resolve_path_param(self, path_params: list[RestParam], values: dict[str, Any]) -> str:
+        pieces, slots = self.compile_path_param(path_params)
+        return self.fill_path_param(pieces, slots, values)
 
     @staticmethod
     def resolve_query_param(params: list[RestParam]) -> list[str]:
@@ -272,9 +290,19 @@ class RestOp:
 
         self.producer_name = next(e for e in self.path.elements[::-1] if not e.is_parameter)
 
+    def __getstate__(self):
+        # the compiled template holds closures, it is compiled again when needed
+        state = self.__dict__.copy()
+        state.pop("template", None)
+        return state
+
+    @cached_property
+    def template(self) -> "RequestTemplate":
+        """compiled once, the parameters must not change afterwards"""
+        return RequestTemplate(self)
+
     def resolve_url(self, values: dict[str, Any]) -> str:
-        path = self.path.resolve_path_param(self.parameters, values)
-        return f"{self._host.strip('/')}/{path.lstrip('/')}"
+        return self.template.url(values)
 
     def get_leaf_factors(self) -> list[AbstractFactor]:
         leaves = []
@@ -316,6 +344,97 @@ class RestOp:
         return self.verb == other.verb and self.path == other.path
 
 
+class RequestTemplate:
+    """
+    Request of an operation compiled from its path and parameters: the pieces of the url with the slots of the path parameters,
+    and one builder per query, header and body parameter generated from the tree of its factor.
+    A request is filled from the values of the leaf factors in one pass, see WeightAlgorithm.assemble.
+    """
+    QUERY = 0
+    HEADER = 1
+    BODY = 2
+
+    def __init__(self, op: RestOp):
+        self._prefix = f"{op._host.strip('/')}/"
+        self._pieces, self._slots = op.path.compile_path_param(op.parameters)
+        # (kind, name, builder, content type) of the parameters in their order
+        self._params: list[tuple[int, str, Callable[[dict[str, Any]], Any], Optional[ContentType]]] = []
+        for p in op.parameters:
+            if isinstance(p, QueryParam):
+                self._params.append((RequestTemplate.QUERY, p.factor.name, self._compile(p.factor), None))
+            elif isinstance(p, HeaderParam):
+                self._params.append((RequestTemplate.HEADER, p.factor.name, self._compile(p.factor), None))
+            elif isinstance(p, BodyParam):
+                self._params.append((RequestTemplate.BODY, p.factor.name, self._compile(p.factor), p.content_type))
+
+    @staticmethod
+    def _compile(factor: Optional[AbstractFactor]) -> Callable[[dict[str, Any]], Any]:
+        """
+        builder of the value of factor: the value given to factor itself if any,
+        otherwise a list of the item of an array, or the object of the properties of an object that are not None
+        """
+        if factor is None:
+            return lambda values: None
+        global_name = factor.global_name
+
+        if isinstance(factor, ArrayFactor):
+            build_item = RequestTemplate._compile(factor.item)
+
+            def build_array(values: dict[str, Any]):
+                if global_name in values:
+                    return values[global_name]
+                item = build_item(values)
+                return [item] if item is not None else []
+
+            return build_array
+
+        if isinstance(factor, ObjectFactor):
+            properties = [(p.name, RequestTemplate._compile(p)) for p in factor.properties]
+
+            def build_object(values: dict[str, Any]):
+                if global_name in values:
+                    return values[global_name]
+                obj = {}
+                for name, build in properties:
+                    val = build(values)
+                    if val is not None:
+                        obj[name] = val
+                return obj
+
+            return build_object
+
+        def build_leaf(values: dict[str, Any]):
+            value = values.get(global_name, None)
+            return value if value not in ("__null__", None) else None
+
+        return build_leaf
+
+    def url(self, values: dict[str, Any]) -> str:
+        path = RestPath.fill_path_param(self._pieces, self._slots, values)
+        return self._prefix + path.lstrip('/')
+
+    def fill(self, values: dict[str, Any], content_type: Optional[ContentType] = None) -> tuple[str, dict[str, Any], dict[str, Any], Optional[ContentType], Optional[Any]]:
+        """
+        @return: url, query parameters, header parameters, content type (the given one, otherwise the one of the body parameter) and body
+        """
+        query_pairs = {}
+        header_pairs = {}
+        body = None
+        for kind, name, build, param_content_type in self._params:
+            value = build(values)
+            if value is None:
+                continue
+            if kind == RequestTemplate.QUERY:
+                query_pairs[name] = value
+            elif kind == RequestTemplate.HEADER:
+                header_pairs[name] = value
+            else:
+                body = value
+                if content_type is None:
+                    content_type = param_content_type
+        return self.url(values), query_pairs, header_pairs, content_type, body
+
+
 class RestResponse:
     def __init__(self, status_code: Optional[int] = None, description: Optional[str] = None):
         self.status_code: Optional[int] = status_code
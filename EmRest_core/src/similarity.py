@@ -0,0 +1,104 @@
+import re
+from collections import OrderedDict
+from functools import lru_cache
+from logging import getLogger
+from typing import Iterable
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+_logger = getLogger(__name__)
+
+# fuzzywuzzy's full_process: drop non-ascii characters, replace the non-word characters with spaces, lower case and strip
+_NON_WORD = re.compile(r"(?ui)\W")
+
+# threads of rapidfuzz for the matrices of at least _PARALLEL_CELLS similarities, -1 uses all cores, see configure
+_WORKERS = 1
+_PARALLEL_CELLS = 10000
+
+
+def configure(workers: int = None):
+    global _WORKERS
+    if workers is not None and workers != 0:
+        _WORKERS = workers
+
+
+@lru_cache(maxsize=65536)
+def full_process(s: str) -> str:
+    return _NON_WORD.sub(" ", s.encode("ascii", "ignore").decode("ascii")).lower().strip()
+
+
+class SimilarityCache:
+    """
+    Token-set similarities of processed strings, in [0, 1] and rounded to percents as fuzzywuzzy's fuzz.token_set_ratio.
+    The missing similarities of a matrix are computed by one call to rapidfuzz's process.cdist.
+    """
+
+    def __init__(self, max_size: int = 1 << 20):
+        self.max_size = max_size
+        self._similarities: dict[tuple[str, str], float] = dict()
+
+    def __len__(self):
+        return len(self._similarities)
+
+    def matrix(self, queries: list[str], choices: list[str]) -> np.ndarray:
+        """similarities of the processed queries (rows) and choices (columns)"""
+        missing = [(q, c) for q in queries for c in choices if (q, c) not in self._similarities]
+        if len(missing) > 0:
+            rows = list(dict.fromkeys(q for q, _ in missing))
+            columns = list(dict.fromkeys(c for _, c in missing))
+            scores = process.cdist(rows, columns, scorer=fuzz.token_set_ratio, dtype=np.float64,
+                                   workers=_WORKERS if len(rows) * len(columns) >= _PARALLEL_CELLS else 1)
+            scores = np.rint(scores) / 100
+            if len(self._similarities) + scores.size > self.max_size:
+                _logger.debug(f"Similarity cache is full ({len(self._similarities)} items), cleared")
+                self._similarities.clear()
+            for i, q in enumerate(rows):
+                self._similarities.update(zip(((q, c) for c in columns), scores[i].tolist()))
+
+        result = np.empty((len(queries), len(choices)), dtype=np.float64)
+        for i, q in enumerate(queries):
+            for j, c in enumerate(choices):
+                result[i, j] = self._similarities[(q, c)]
+        return result
+
+
+_cache = SimilarityCache()
+# matrices of the same queries and choices, recomputed at every initialization of the equivalences of an operation
+_MAX_MATRICES = 256
+_matrices: OrderedDict[tuple[tuple[str, ...], tuple[str, ...]], np.ndarray] = OrderedDict()
+
+
+def similarity_matrix(queries: Iterable[str], choices: Iterable[str]) -> tuple[dict[str, int], dict[str, int], np.ndarray]:
+    """
+    token-set similarities of all queries and all choices
+    @return: index of each query (row), index of each choice (column), matrix of similarities
+    """
+    rows = {q: i for i, q in enumerate(dict.fromkeys(queries))}
+    columns = {c: j for j, c in enumerate(dict.fromkeys(choices))}
+    if len(rows) == 0 or len(columns) == 0:
+        return rows, columns, np.zeros((len(rows), len(columns)))
+    key = (tuple(rows), tuple(columns))
+    matrix = _matrices.get(key)
+    if matrix is None:
+        matrix = _cache.matrix([full_process(q) for q in rows], [full_process(c) for c in columns])
+        _matrices[key] = matrix
+        if len(_matrices) > _MAX_MATRICES:
+            _matrices.popitem(last=False)
+    else:
+        _matrices.move_to_end(key)
+    return rows, columns, matrix
+
+
+def score_matrix(queries: list[str], choices: list[str]) -> np.ndarray:
+    """similarities of all queries and all choices without caching them, for the large matrices computed once"""
+    if len(queries) == 0 or len(choices) == 0:
+        return np.zeros((len(queries), len(choices)))
+    scores = process.cdist([full_process(q) for q in queries], [full_process(c) for c in choices], scorer=fuzz.token_set_ratio,
+                           dtype=np.float64, workers=_WORKERS if len(queries) * len(choices) >= _PARALLEL_CELLS else 1)
+    return np.rint(scores) / 100
+
+
+def token_set_similarity(a: str, b: str) -> float:
+    """similarity of one pair, as fuzz.token_set_ratio(a, b) / 100"""
+    return float(_cache.matrix([full_process(a)], [full_process(b)])[0, 0])
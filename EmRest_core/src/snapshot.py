@@ -0,0 +1,55 @@
+import os
+import pickle
+import random
+import time
+from logging import getLogger
+
+import numpy as np
+
+from src.manager import Manager
+from src.monitor import Statistics
+
+_logger = getLogger(__name__)
+
+# increased when the layout of the saved state changes, snapshots of other formats are rejected
+SNAPSHOT_FORMAT = 7
+
+
+class Snapshot:
+    """
+    State of a run needed to resume it: the manager (resources, equivalences and their weights, operation queues, without the generator),
+    the statistics (monitors and their models), the budget already used, the number of batches in the streaming report and the random states
+    """
+    FILE = "snapshot.pkl"
+
+    def __init__(self, manager: Manager, statistics: Statistics, used_budget: float, reported_batches: int):
+        self.format = SNAPSHOT_FORMAT
+        self.created = time.time()
+        self.manager = manager
+        self.statistics = statistics
+        self.used_budget = used_budget
+        self.reported_batches = reported_batches
+        self.random_state = random.getstate()
+        self.numpy_random_state = np.random.get_state()
+
+    def save(self, path: str):
+        """write the snapshot to a temporary file then rename it, a crash while saving keeps the previous snapshot"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        start = time.time()
+        with open(path + ".tmp", 'wb') as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+        _logger.info(f"Saved snapshot to {path} in {time.time() - start:.2f}s ({os.path.getsize(path)} bytes)")
+
+    @staticmethod
+    def load(path: str) -> "Snapshot":
+        with open(path, 'rb') as f:
+            snapshot = pickle.load(f)
+        if not isinstance(snapshot, Snapshot) or getattr(snapshot, "format", None) != SNAPSHOT_FORMAT:
+            raise ValueError(f"{path} is not a snapshot of format {SNAPSHOT_FORMAT}")
+        _logger.info(f"Loaded snapshot of {time.ctime(snapshot.created)}, {snapshot.used_budget:.0f}s of budget used")
+        return snapshot
+
+    def restore_random_states(self):
+        random.setstate(self.random_state)
+        np.random.set_state(self.numpy_random_state)
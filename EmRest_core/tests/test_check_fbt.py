@@ -0,0 +1,87 @@
+import random
+from itertools import product
+
+import pytest
+
+from src.generator import IPOG
+
+FACTORS = ["f0", "f1", "f2"]
+DOMAINS = [[10, 11], [20, 21, 22], [30, 31]]
+
+
+def _mappings(factors, domains):
+    name_mappings = {f"P{idx}": f for idx, f in enumerate(factors)}
+    value_mappings = {f: {e_idx: e for e_idx, e in enumerate(domains[f_idx])} for f_idx, f in enumerate(factors)}
+    return name_mappings, value_mappings
+
+
+def _forbidden_rows(factors, domains, tuples):
+    """rows of the domains containing one of the tuples, given by factor name and value"""
+    rows = set()
+    for values in product(*domains):
+        row = dict(zip(factors, values))
+        if any(all(f in row and row[f] == v for f, v in t.items()) for t in tuples):
+            rows.add(values)
+    return rows
+
+
+def _decode(name_mappings, value_mappings, kept):
+    return [{name_mappings[n]: value_mappings[name_mappings[n]][idx] for n, idx in t.items()} for t in kept]
+
+
+def test_redundant_tuples_are_dropped_and_counted():
+    name_mappings, value_mappings = _mappings(FACTORS, DOMAINS)
+    tuples = [
+        {"f0": 10},
+        {"f0": 10, "f1": 20},              # subsumed by {f0: 10}
+        {"f1": 21, "f2": 30},
+        {"f2": 30, "f1": 21},              # duplicated, items in another order
+        {"f1": 21, "f2": 30, "f0": 11},    # subsumed by {f1: 21, f2: 30}
+        {"f1": 99},                        # out of domain value
+        {"unknown": 10, "f0": 11},         # out of domain factor
+        {"f1": 22, "f2": 31},
+    ]
+    generator = IPOG()
+    kept = generator._check_fbt(name_mappings, value_mappings, tuples)
+
+    decoded = _decode(name_mappings, value_mappings, kept)
+    assert sorted(sorted(t.items()) for t in decoded) == sorted(sorted(t.items()) for t in [{"f0": 10}, {"f1": 21, "f2": 30}, {"f1": 22, "f2": 31}])
+    assert generator.constraint_stats == {"constraints": 8, "out_of_domain": 2, "duplicated": 1, "subsumed": 2}
+    assert _forbidden_rows(FACTORS, DOMAINS, decoded) == _forbidden_rows(FACTORS, DOMAINS, tuples)
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_kept_tuples_forbid_the_same_rows(seed):
+    rnd = random.Random(seed)
+    k = rnd.randint(1, 5)
+    factors = [f"f{i}" for i in range(k)]
+    domains = [list(range(100 * i, 100 * i + rnd.randint(1, 4))) for i in range(k)]
+    name_mappings, value_mappings = _mappings(factors, domains)
+
+    tuples = []
+    for _ in range(rnd.randint(0, 12)):
+        chosen = rnd.sample(factors, rnd.randint(1, k))
+        # some values are out of the domains
+        t = {f: rnd.choice(domains[factors.index(f)] + [-1]) for f in chosen}
+        tuples.append(t)
+        if rnd.random() < 0.3:
+            # a superset of the tuple
+            extra = rnd.choice(factors)
+            tuples.append(dict(t, **{extra: t.get(extra, rnd.choice(domains[factors.index(extra)]))}))
+        if rnd.random() < 0.2:
+            tuples.append(dict(reversed(list(t.items()))))
+
+    generator = IPOG()
+    kept = generator._check_fbt(name_mappings, value_mappings, tuples)
+    decoded = _decode(name_mappings, value_mappings, kept)
+    assert _forbidden_rows(factors, domains, decoded) == _forbidden_rows(factors, domains, tuples)
+
+    in_domain = [t for t in tuples if all(v in domains[factors.index(f)] for f, v in t.items())]
+    unique = {frozenset(t.items()) for t in in_domain}
+    # no kept tuple contains another one
+    assert not any(a != b and a.items() <= b.items() for a in decoded for b in decoded)
+    stats = generator.constraint_stats
+    assert stats["constraints"] == len(tuples)
+    assert stats["out_of_domain"] == len(tuples) - len(in_domain)
+    assert stats["duplicated"] == len(in_domain) - len(unique)
+    assert stats["subsumed"] == len(unique) - len(kept)
@@ -0,0 +1,70 @@
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+from src.distributed import Coordinator, CoordinatorClient
+from src.manager import Manager
+from src.monitor import Statistics
+from src.reporter import StreamReporter
+
+AUTHKEY = b"test"
+
+
+def _wait_for(condition, timeout: float = 10):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+def _statistics(op: str, successes: int) -> Statistics:
+    statistics = Statistics([op])
+    statistics.status_code[op]["20X"] = successes
+    return statistics
+
+
+def test_coordinator_serves_two_workers(tmp_path):
+    coordinator = Coordinator("exp", Manager([]), 60, str(tmp_path), [["a"], ["b"]])
+    server = threading.Thread(target=coordinator.serve, args=(("127.0.0.1", 0), AUTHKEY), daemon=True)
+    server.start()
+    _wait_for(lambda: coordinator._listener is not None)
+    address = coordinator._listener.address
+
+    first, second = CoordinatorClient(address, AUTHKEY), CoordinatorClient(address, AUTHKEY)
+    first_id, first_ops, remaining, _ = first.call("join", "host-1")
+    second_id, second_ops, _, _ = second.call("join", "host-2")
+    assert (first_ops, second_ops) == (["a"], ["b"])
+    assert 0 < remaining <= 60
+
+    # resources published by one worker are received by the other one at its next exchange
+    resource = {"id": 1, "name": "alice"}
+    assert first.call("exchange", first_id, [("/users", [resource])]) == []
+    assert second.call("exchange", second_id, []) == [("/users", [resource])]
+    assert second.call("exchange", second_id, []) == []
+    assert ("/users", [resource]) in coordinator._manager.export_resources()
+
+    second.call("record", second_id, {"type": "batch", "op": "b"})
+
+    # the shard of a worker whose connection is lost is leased again
+    first.close()
+    _wait_for(lambda: list(coordinator._pending) == [0])
+    third = CoordinatorClient(address, AUTHKEY)
+    third_id, third_ops, _, resources = third.call("join", "host-3")
+    assert third_ops == ["a"] and ("/users", [resource]) in resources
+
+    third.call("finish", third_id, _statistics("a", 3), True)
+    second.call("finish", second_id, _statistics("b", 5), True)
+    server.join(timeout=10)
+    assert not server.is_alive()
+    third.close()
+    second.close()
+
+    directory = os.path.join(tmp_path, "exp", "data")
+    status_codes = pd.read_csv(os.path.join(directory, "status_codes.csv"), index_col=0)
+    assert status_codes["20X"].to_dict() == {"a": 3, "b": 5}
+    with open(os.path.join(directory, StreamReporter.LOG_FILE)) as f:
+        entries = [json.loads(line) for line in f]
+    assert {"type": "batch", "op": "b", "worker": second_id} in entries
@@ -0,0 +1,47 @@
+import random
+
+import pytest
+
+from src.monitor import ErrorMonitor
+
+PARAMS = ["p0", "p1", "p2"]
+# fragment -> its error-inducing parameters, none means they are unknown
+FRAGMENTS = {"f0": ["p0"], "f1": ["p0", "p1"], "f2": []}
+
+
+def _recompute(monitor: ErrorMonitor, threshold: float) -> list[dict]:
+    """forbidden tuples of the models computed from their counters, without the masks kept by the models"""
+    return [t for m in monitor.cp_models for t, _ in m.get_forbidden_tuples(threshold, with_prob=True)]
+
+
+def _as_set(tuples: list[dict]) -> set[frozenset]:
+    return {frozenset(t.items()) for t in tuples}
+
+
+@pytest.mark.parametrize("seed", range(50))
+def test_constraints_follow_updates(seed):
+    rnd = random.Random(seed)
+    monitor = ErrorMonitor("op")
+    thresholds = [0.5, 0.7]
+    last: dict[float, tuple[int, set]] = dict()
+
+    for step in range(40):
+        # fragments come and go, as the fragmentizer splits them
+        active = {f: p for f, p in FRAGMENTS.items() if rnd.random() < 0.8}
+        assignments = [{p: rnd.randrange(3) for p in PARAMS} for _ in range(rnd.randint(1, 6))]
+        fragments = [{f for f in active if rnd.random() < (0.9 if a["p0"] == 0 else 0.2)} for a in assignments]
+        monitor.update(assignments, fragments, active)
+        if step == 10:
+            # a threshold asked for in the middle of the run
+            thresholds.append(0.9)
+
+        for threshold in thresholds:
+            version, tuples = monitor.get_constraints(threshold)
+            assert tuples == _recompute(monitor, threshold)
+            if threshold in last:
+                last_version, last_tuples = last[threshold]
+                if _as_set(tuples) == last_tuples:
+                    assert version == last_version
+                else:
+                    assert version > last_version
+            last[threshold] = (version, _as_set(tuples))
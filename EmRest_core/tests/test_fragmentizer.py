@@ -0,0 +1,80 @@
+import random
+import re
+
+import pytest
+
+from src.nlp import clean_string
+from src.response import Fragmentizer
+
+
+def _baseline_fragmentize(strings: set[str], existed: set[str]) -> set[str]:
+    """the all-pairs fixpoint of the baseline, ties between separators of the same length broken alphabetically"""
+    if len(strings) == 0:
+        return set(existed)
+    _E = strings.union(existed)
+    while True:
+        _E = sorted(set(_E), key=lambda x: (-len(x), x))
+        _E_new = set()
+        _E_removed = set()
+        for i in range(len(_E) - 1):
+            for j in range(i + 1, len(_E)):
+                to_split = _E[i]
+                pattern = re.compile(r'\b' + re.escape(_E[j]) + r'\b')
+                if pattern.search(to_split) is not None:
+                    for part in pattern.split(to_split):
+                        part = clean_string(part)
+                        if part != '':
+                            _E_new.add(part)
+                    _E_removed.add(to_split)
+                    break
+        if len(_E_new) == 0 and len(_E_removed) == 0:
+            break
+        for e in _E_removed:
+            _E.remove(e)
+        _E.extend(_E_new)
+    return set(_E)
+
+
+def _check_sequence(batches: list[set[str]]):
+    """the fragments of each batch, given the fragments of the previous ones, are the ones of the baseline"""
+    fragmentizer = Fragmentizer()
+    fragments, expected = set(), set()
+    for batch in batches:
+        fragments = fragmentizer.fragmentize(batch, fragments)
+        expected = _baseline_fragmentize(batch, expected)
+        assert fragments == expected
+
+
+def test_error_messages():
+    _check_sequence([
+        {"user id must be an integer", "name must be a string", "user not found"},
+        {"user id must be an integer", "quantity must be positive"},
+        # a separator seen after the strings it splits
+        {"must be"},
+        {"item id is required", "id is required"},
+        {"id", "user id is invalid: user id must be an integer"},
+        set(),
+        {"order.user id must be a string", "must be a string"},
+    ])
+
+
+def test_overlapping_separators():
+    # "a b" and "b c" overlap in "a b c", both have the same length
+    _check_sequence([{"x a b c y", "a b", "b c"}])
+    _check_sequence([{"x a b c y"}, {"b c"}, {"a b"}])
+    _check_sequence([{"aa aa aa", "aa aa"}, {"aa"}])
+    _check_sequence([{"user_id invalid", "id invalid", "user"}])
+
+
+WORDS = ["id", "user", "user id", "not", "found", "invalid", "name", "must", "be", "a", "string", "is", "required", "item", "the"]
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_random_messages(seed):
+    rnd = random.Random(seed)
+
+    def message():
+        words = [rnd.choice(WORDS) for _ in range(rnd.randint(1, 6))]
+        return rnd.choice(["", "'", "- "]) + " ".join(words) + rnd.choice(["", ".", ": value"])
+
+    _check_sequence([{message() for _ in range(rnd.randint(0, 4))} for _ in range(rnd.randint(1, 6))])
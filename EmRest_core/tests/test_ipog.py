@@ -0,0 +1,43 @@
+import random
+from itertools import combinations, product
+
+import numpy as np
+import pytest
+
+from src.generator import IPOG
+
+
+def _is_valid(row, constraints):
+    return not any(all(row[f] == v for f, v in c.items()) for c in constraints)
+
+
+def _missing_tuples(sizes, constraints, strength, rows):
+    """t-tuples contained in a valid row but in no row of the covering array"""
+    valid_rows = [r for r in product(*[range(s) for s in sizes]) if _is_valid(r, constraints)]
+    missing = []
+    for cols in combinations(range(len(sizes)), strength):
+        covered = {tuple(r[c] for c in cols) for r in rows}
+        missing += [(cols, t) for t in {tuple(r[c] for c in cols) for r in valid_rows} - covered]
+    return missing
+
+
+def test_constraints_killing_values():
+    sizes, constraints = [2, 2, 3], [{2: 1, 1: 1}, {2: 1, 1: 0}, {1: 0, 2: 2}, {2: 0}]
+    rows = IPOG.generate(sizes, constraints, 1, np.random.default_rng(0)).tolist()
+    assert sorted(rows) == [[0, 1, 2], [1, 1, 2]]
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_covers_valid_tuples(seed):
+    rnd = random.Random(seed)
+    k = rnd.randint(2, 6)
+    sizes = [rnd.randint(1, 4) for _ in range(k)]
+    strength = rnd.randint(1, min(3, k))
+    constraints = []
+    for _ in range(rnd.randint(0, 8)):
+        factors = rnd.sample(range(k), rnd.randint(1, min(3, k)))
+        constraints.append({f: rnd.randrange(sizes[f]) for f in factors})
+
+    rows = IPOG.generate(sizes, constraints, strength, np.random.default_rng(seed)).tolist()
+    assert all(_is_valid(r, constraints) for r in rows)
+    assert _missing_tuples(sizes, constraints, strength, rows) == []
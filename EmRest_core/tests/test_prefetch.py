@@ -0,0 +1,110 @@
+import random
+import stat
+import sys
+import threading
+
+import pytest
+
+from src.generator import Generator, IPOG, PICTPool, CachedGenerator
+from src.manager import Manager
+
+SPEC = """
+openapi: 3.0.0
+info: {title: t, version: "1"}
+servers: [{url: "http://127.0.0.1:8080/api/"}]
+paths:
+  /items:
+    get:
+      parameters:
+        - {name: limit, in: query, schema: {type: integer}}
+        - {name: name, in: query, schema: {type: string}}
+        - {name: sort, in: query, schema: {type: string, enum: [asc, desc]}}
+      responses:
+        "200": {description: ok}
+"""
+
+# prints every value of the first parameter with the first value of the others, in the output format of PICT
+FAKE_PICT = """
+import sys
+names, domains = [], []
+with open(sys.argv[1]) as f:
+    for line in f:
+        if ":" in line:
+            name, values = line.strip().split(":")
+            names.append(name)
+            domains.append(values.split(","))
+print("\\t".join(names))
+for v in domains[0]:
+    print("\\t".join([v] + [d[0] for d in domains[1:]]))
+"""
+
+
+@pytest.fixture
+def pict(tmp_path):
+    path = tmp_path / "pict"
+    path.write_text(f"#!{sys.executable}\n{FAKE_PICT}")
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    generator = PICTPool("exp", str(tmp_path), str(path))
+    yield generator
+    generator.close()
+
+
+def test_supports_prefetch(pict):
+    assert not IPOG().supports_prefetch
+    assert not CachedGenerator(IPOG()).supports_prefetch
+    assert pict.supports_prefetch
+    assert CachedGenerator(pict).supports_prefetch
+
+
+def test_prefetch_prepares_on_the_calling_thread(pict, monkeypatch):
+    prepared_by = []
+    prepare = pict._prepare
+
+    def _prepare(*args, **kwargs):
+        prepared_by.append(threading.current_thread())
+        return prepare(*args, **kwargs)
+    monkeypatch.setattr(pict, "_prepare", _prepare)
+
+    factors, domains = ["a", "b"], [[1, 2, 3], [4, 5]]
+    forbidden = [{"a": 1}, {"a": 1, "b": 4}, {"a": 9}]
+    pict.prefetch("get:/items", factors, domains, forbidden)
+    # counted before PICT runs, on the thread of the caller
+    assert prepared_by == [threading.current_thread()]
+    assert pict.count == 1
+    assert pict.constraint_stats == {"constraints": 3, "out_of_domain": 1, "duplicated": 0, "subsumed": 1}
+
+    cases = pict.handle("get:/items", factors, domains, list(reversed(forbidden)))
+    assert pict.prefetch_hits == 1
+    assert pict.count == 1
+    assert cases == [{"a": 1, "b": 4}, {"a": 2, "b": 4}, {"a": 3, "b": 4}]
+
+    # nothing to generate without factors
+    pict.prefetch("get:/items", [], [], [])
+    assert pict.count == 1 and len(pict._pending) == 0
+
+
+@pytest.fixture
+def manager(tmp_path) -> Manager:
+    spec_file = tmp_path / "spec.yaml"
+    spec_file.write_text(SPEC)
+    manager = Manager.from_spec(str(spec_file))
+    manager.initialize_equiv("get:/items")
+    return manager
+
+
+@pytest.mark.parametrize("generator", [IPOG(), CachedGenerator(IPOG())])
+def test_no_domains_selected_without_prefetch(manager, generator: Generator):
+    manager.equiv_generator = generator
+    random.seed(0)
+    state = random.getstate()
+    manager.prefetch_equivalences("get:/items", [], 2)
+    # no random draws are consumed for domains the generator would ignore
+    assert random.getstate() == state
+    assert manager.equiv_manager["get:/items"]._next_domains is None
+
+
+def test_domains_selected_with_prefetch(manager, pict):
+    manager.equiv_generator = pict
+    manager.prefetch_equivalences("get:/items", [], 2)
+    assert manager.equiv_manager["get:/items"]._next_domains is not None
+    assert len(pict._pending) == 1
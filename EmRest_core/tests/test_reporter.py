@@ -0,0 +1,55 @@
+import json
+import os
+import random
+
+import pandas as pd
+import pytest
+
+from src.monitor import Statistics
+from src.reporter import StreamReporter
+
+PARAMS = ["p0", "p1"]
+FRAGMENTS = {"f0": ["p0"], "f1": []}
+
+
+def _read_csv(path: str) -> set[frozenset]:
+    df = pd.read_csv(path, index_col=0, dtype=str)
+    return {frozenset((k, v) for k, v in row.items() if not pd.isna(v)) for row in df.to_dict(orient="records")}
+
+
+def _as_set(tuples: list[dict]) -> set[frozenset]:
+    return {frozenset((k, str(v)) for k, v in t.items()) for t in tuples}
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_forbidden_tuples_written_at_checkpoints(tmp_path, seed):
+    rnd = random.Random(seed)
+    statistics = Statistics(["op"])
+    monitor = statistics.error_monitors["op"]
+    reporter = StreamReporter(str(tmp_path / "data"), checkpoint_every=3)
+    reporter.start(["op"])
+
+    for _ in range(rnd.randint(1, 20)):
+        assignments = [{p: rnd.randrange(3) for p in PARAMS} for _ in range(rnd.randint(1, 6))]
+        fragments = [{f for f in FRAGMENTS if rnd.random() < (0.9 if a["p0"] == 0 else 0.2)} for a in assignments]
+        monitor.update(assignments, fragments, FRAGMENTS)
+        statistics.bug_monitors["op"].update(assignments, fragments, FRAGMENTS)
+        reporter.record(statistics, "op", "generate_and_execute")
+        # the thresholds of the report are not kept up to date by the monitors
+        assert StreamReporter.ERROR_THRESHOLD not in monitor._constraints
+        assert StreamReporter.BUG_THRESHOLD not in statistics.bug_monitors["op"]._constraints
+    reporter.close(statistics)
+
+    with open(tmp_path / "data" / StreamReporter.LOG_FILE) as f:
+        entries = [json.loads(line) for line in f]
+    assert sum(e["type"] == "batch" for e in entries) == reporter.num_batches
+    assert all("error_forbidden_tuples" not in e for e in entries if e["type"] == "batch")
+
+    StreamReporter.finalize(str(tmp_path / "data" / StreamReporter.LOG_FILE), str(tmp_path / "report"))
+    op_dir = tmp_path / "report" / "op"
+    expected_error = _as_set(monitor.compute_forbidden_tuples(StreamReporter.ERROR_THRESHOLD))
+    expected_bug = _as_set(statistics.bug_monitors["op"].compute_forbidden_tuples(StreamReporter.BUG_THRESHOLD))
+    if len(expected_error) > 0:
+        assert _read_csv(os.path.join(op_dir, "error_monitors_forbidden_tuples.csv")) == expected_error
+    if len(expected_bug) > 0:
+        assert _read_csv(os.path.join(op_dir, "bug_monitors_forbidden_tuples.csv")) == expected_bug
@@ -0,0 +1,168 @@
+import pickle
+import random
+from typing import Any
+
+import pytest
+
+from src.factor import AbstractFactor, ArrayFactor, ObjectFactor
+from src.rest import RestOp, PathParam, QueryParam, HeaderParam, BodyParam, ContentType
+from src.swagger import ParserV3
+
+SPEC = """
+openapi: 3.0.0
+info: {title: t, version: "1"}
+servers: [{url: "http://127.0.0.1:8080/api/"}]
+paths:
+  /users/{userId}/items/{itemId}:
+    put:
+      parameters:
+        - {name: userId, in: path, required: true, schema: {type: integer}}
+        - {name: itemId, in: path, required: true, schema: {type: string}}
+        - {name: limit, in: query, schema: {type: integer}}
+        - {name: X-Trace, in: header, schema: {type: string}}
+      requestBody:
+        content:
+          application/json:
+            schema:
+              type: object
+              properties:
+                name: {type: string}
+                address: {type: object, properties: {city: {type: string}, zip: {type: string}}}
+                tags: {type: array, items: {type: string}}
+                lines: {type: array, items: {type: object, properties: {sku: {type: string}, qty: {type: integer}}}}
+      responses:
+        "200": {description: ok}
+  /orders/:
+    get:
+      parameters:
+        - {name: status, in: query, schema: {type: string}}
+      responses:
+        "200": {description: ok}
+"""
+
+
+def walk_assemble(op: RestOp, values: dict[str, Any], content_type=None):
+    """the request of a case built by walking the factor trees, as WeightAlgorithm.assemble did before RequestTemplate"""
+    def get_value_by_factor(_f):
+        if isinstance(_f, ArrayFactor):
+            if _f.global_name in values.keys():
+                return values[_f.global_name]
+            item = get_value_by_factor(_f.item)
+            return [item] if item is not None else []
+        elif isinstance(_f, ObjectFactor):
+            if _f.global_name in values.keys():
+                return values[_f.global_name]
+            obj = {}
+            for fp in _f.properties:
+                val = get_value_by_factor(fp)
+                if val is not None:
+                    obj[fp.name] = val
+            return obj
+        return values[_f.global_name] if values.get(_f.global_name, None) not in ("__null__", None) else None
+
+    path = ""
+    for e in op.path.elements:
+        path += "/"
+        for t in e.tokens:
+            if not t.is_parameter:
+                path += t.name
+                continue
+            p = next((p for p in op.parameters if isinstance(p, PathParam) and p.factor.name == t.name), None)
+            value = values.get(p.factor.global_name, "__null__")
+            if value is None or not str(value).strip() or value == "__null__":
+                value = "1"
+            path += str(value)
+    if op.path.end_with_slash:
+        path += "/"
+    uri = f"{op._host.strip('/')}/{path.lstrip('/')}"
+
+    query_pairs, header_pairs, body = {}, {}, None
+    for p in op.parameters:
+        value = get_value_by_factor(p.factor)
+        if value is None:
+            continue
+        if isinstance(p, QueryParam):
+            query_pairs[p.factor.name] = value
+        elif isinstance(p, HeaderParam):
+            header_pairs[p.factor.name] = value
+        elif isinstance(p, BodyParam):
+            body = value
+            if content_type is None:
+                content_type = p.content_type
+    return uri, query_pairs, header_pairs, content_type, body
+
+
+def _factors(factor: AbstractFactor) -> list[AbstractFactor]:
+    if isinstance(factor, ArrayFactor):
+        return [factor] + _factors(factor.item)
+    if isinstance(factor, ObjectFactor):
+        return [factor] + [f for p in factor.properties for f in _factors(p)]
+    return [factor]
+
+
+@pytest.fixture(scope="module")
+def operations(tmp_path_factory) -> dict[str, RestOp]:
+    spec_file = tmp_path_factory.mktemp("spec") / "spec.yaml"
+    spec_file.write_text(SPEC)
+    return {op.id: op for op in ParserV3(str(spec_file), None).extract()}
+
+
+def _random_values(rnd: random.Random, op: RestOp) -> dict[str, Any]:
+    values = {}
+    for p in op.parameters:
+        for f in _factors(p.factor):
+            if isinstance(f, (ArrayFactor, ObjectFactor)):
+                # the value of an array or an object may be given as a whole, e.g. a resource bound to it
+                if rnd.random() < 0.15:
+                    values[f.global_name] = rnd.choice([{"raw": 1}, [1, 2], None])
+                continue
+            if isinstance(p, PathParam):
+                choices = ["", "  ", None, "__null__", 0, 42, "abc"]
+            else:
+                choices = [None, "__null__", "", 0, 7, "text"]
+            if rnd.random() < 0.9:
+                values[f.global_name] = rnd.choice(choices)
+    return values
+
+
+@pytest.mark.parametrize("seed", range(100))
+def test_template_fills_the_same_requests(operations, seed):
+    rnd = random.Random(seed)
+    for op in operations.values():
+        values = _random_values(rnd, op)
+        content_type = rnd.choice([None, ContentType.FORM])
+        assert op.template.fill(values, content_type) == walk_assemble(op, values, content_type)
+
+
+def test_blank_path_params(operations):
+    op = operations["put:/users/{userId}/items/{itemId}"]
+    for blank in ("", "  ", None, "__null__"):
+        url, *_ = op.template.fill({"userId": blank, "itemId": 5})
+        assert url == "http://127.0.0.1:8080/api/users/1/items/5"
+    assert op.template.url({}) == "http://127.0.0.1:8080/api/users/1/items/1"
+    assert operations["get:/orders/"].template.url({}) == "http://127.0.0.1:8080/api/orders/"
+
+
+def test_nested_body(operations):
+    op = operations["put:/users/{userId}/items/{itemId}"]
+    values = {"userId": 3, "itemId": "x", "limit": "__null__", "X-Trace": "t",
+              "body.name": "n", "body.address.city": "c", "body.tags._item": "a",
+              "body.lines._item.sku": "s", "body.lines._item.qty": None}
+    url, query, headers, content_type, body = op.template.fill(values)
+    assert (url, query, headers, content_type) == ("http://127.0.0.1:8080/api/users/3/items/x", {}, {"X-Trace": "t"}, ContentType.JSON)
+    assert body == {"name": "n", "address": {"city": "c"}, "tags": ["a"], "lines": [{"sku": "s"}]}
+
+    # a value given to an object replaces its properties
+    _, _, _, _, body = op.template.fill(dict(values, **{"body.address": {"id": 9}}))
+    assert body["address"] == {"id": 9}
+    # the given content type overrides the one of the body parameter
+    assert op.template.fill(values, ContentType.FORM)[3] == ContentType.FORM
+
+
+def test_template_rebuilt_after_pickling(operations):
+    op = operations["put:/users/{userId}/items/{itemId}"]
+    values = {"userId": 1, "itemId": "i", "body.name": "n"}
+    expected = op.template.fill(values)
+    copy = pickle.loads(pickle.dumps(op))
+    assert "template" not in copy.__dict__
+    assert copy.template.fill(values) == expected
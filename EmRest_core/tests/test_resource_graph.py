@@ -0,0 +1,62 @@
+import pytest
+
+from src.manager import Manager
+
+SPEC = """
+openapi: 3.0.0
+info: {title: t, version: "1"}
+servers: [{url: "http://127.0.0.1:8080/api/"}]
+paths:
+  /users:
+    post:
+      requestBody:
+        content:
+          application/json:
+            schema: {type: object, properties: {name: {type: string}}}
+      responses:
+        "201":
+          description: created
+          content:
+            application/json:
+              schema: {type: object, properties: {name: {type: string}}}
+  /orders:
+    get:
+      parameters:
+        - {name: id, in: query, schema: {type: integer}}
+      responses:
+        "200": {description: ok}
+"""
+
+
+@pytest.fixture
+def manager(tmp_path) -> Manager:
+    spec_file = tmp_path / "spec.yaml"
+    spec_file.write_text(SPEC)
+    return Manager.from_spec(str(spec_file))
+
+
+def _sources(manager: Manager) -> list[tuple]:
+    found = manager.get_binding_sources("/orders", {"id": ["id"]}, {"id": lambda v: isinstance(v, int)}, consumer_id="get:/orders")
+    return [(node, path) for node, path, _ in found["id"]]
+
+
+def test_undocumented_fields_make_a_producer(manager):
+    # the schema of /users only documents a name
+    assert "/users" not in manager.graph.producers_of("get:/orders")
+
+    manager.add_resources("/users", [{"name": "a"}])
+    assert "/users" not in manager.graph.producers_of("get:/orders")
+    assert _sources(manager) == []
+
+    # the id stored by /users is not in its schema
+    manager.add_resources("/users", [{"id": 5, "name": "b"}])
+    assert "/users" in manager.graph.producers_of("get:/orders")
+    assert "get:/orders" in manager.graph.consumers["/users"]
+    assert _sources(manager) == [("/users", ("id",))]
+
+
+def test_same_sources_as_a_full_search(manager):
+    manager.add_resources("/users", [{"id": 5, "name": "b", "owner": {"id": 1}}])
+    restricted = _sources(manager)
+    manager.restrict_bindings = False
+    assert sorted(restricted) == sorted(_sources(manager))